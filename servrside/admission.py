@@ -0,0 +1,176 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default upstream model used by every tutor for answers, topics and quizzes
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class AdmissionRejected(Exception):
+    """Raised when an LLM-bound request cannot be admitted in time"""
+
+    def __init__(self, model, veda, reason, retry_after):
+        super().__init__(f"{model} is busy for {veda} ({reason})")
+        self.model = model
+        self.veda = veda
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ModelLimiter:
+    """Concurrency and token-bucket limiter for one upstream model with a bounded, per-veda fair wait queue"""
+
+    def __init__(self, model, max_concurrent=8, rate_per_minute=300, burst=None, max_queue=32, max_wait=10.0):
+        self.model = model
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.rate = max(float(rate_per_minute), 1.0) / 60.0
+        self.burst = float(burst or self.max_concurrent)
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = float(max_wait)
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._in_flight = {}
+        self._waiting = {}
+        self._avg_latency = 2.0
+
+        self.admitted = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        """Top up the token bucket for the time elapsed since the last refill"""
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def _active_vedas(self, veda):
+        active = {v for v, n in self._in_flight.items() if n} | {v for v, n in self._waiting.items() if n}
+        active.add(veda)
+        return len(active)
+
+    def _concurrency_share(self, veda):
+        """Each active veda may hold at most an equal share of the concurrency slots"""
+        return max(1, math.ceil(self.max_concurrent / self._active_vedas(veda)))
+
+    def _queue_share(self, veda):
+        return max(1, math.ceil(self.max_queue / self._active_vedas(veda))) if self.max_queue else 0
+
+    def _can_start(self, veda):
+        return (
+            sum(self._in_flight.values()) < self.max_concurrent
+            and self._in_flight.get(veda, 0) < self._concurrency_share(veda)
+            and self._tokens >= 1
+        )
+
+    def _retry_after(self):
+        """Rough number of seconds until a new request is likely to be admitted"""
+        token_wait = max(0.0, 1 - self._tokens) / self.rate
+        queued = sum(self._waiting.values()) + 1
+        slot_wait = self._avg_latency * queued / self.max_concurrent
+        return max(1, math.ceil(max(token_wait, slot_wait)))
+
+    def _reject(self, veda, reason):
+        self.rejected += 1
+        raise AdmissionRejected(self.model, veda, reason, self._retry_after())
+
+    def acquire(self, veda):
+        """Wait for a slot for `veda`, raising AdmissionRejected instead of queueing unboundedly"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+
+            if not self._can_start(veda):
+                # Fast reject when the shared queue or this veda's share of it is full
+                if sum(self._waiting.values()) >= self.max_queue:
+                    self._reject(veda, "queue full")
+                if self._waiting.get(veda, 0) >= self._queue_share(veda):
+                    self._reject(veda, "veda queue share exhausted")
+
+                deadline = now + self.max_wait
+                self._waiting[veda] = self._waiting.get(veda, 0) + 1
+                try:
+                    while not self._can_start(veda):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject(veda, "wait timeout")
+                        # Wake up at least when the next bucket token becomes available
+                        token_wait = max(0.0, 1 - self._tokens) / self.rate
+                        self._cond.wait(min(remaining, token_wait) if token_wait else remaining)
+                        self._refill(time.monotonic())
+                finally:
+                    self._waiting[veda] -= 1
+
+            self._tokens -= 1
+            self._in_flight[veda] = self._in_flight.get(veda, 0) + 1
+            self.admitted += 1
+            return time.monotonic()
+
+    def release(self, veda, started_at):
+        """Give the slot back and wake up waiters"""
+        with self._cond:
+            self._in_flight[veda] -= 1
+            # Exponentially weighted service time keeps Retry-After estimates realistic
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * (time.monotonic() - started_at)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'model': self.model,
+                'max_concurrent': self.max_concurrent,
+                'in_flight': {v: n for v, n in self._in_flight.items() if n},
+                'waiting': {v: n for v, n in self._waiting.items() if n},
+                'tokens_available': round(self._tokens, 2),
+                'avg_latency_seconds': round(self._avg_latency, 3),
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _model_setting(model, name, default):
+    """Read LLM_<NAME>_<MODEL> first, then LLM_<NAME>, then the default"""
+    model_key = model.upper().replace('-', '_').replace('.', '_')
+    value = os.getenv(f"LLM_{name}_{model_key}", os.getenv(f"LLM_{name}"))
+    return default if value in (None, '') else value
+
+
+def get_limiter(model=DEFAULT_MODEL):
+    """Return the shared limiter for an upstream model, configured from the environment"""
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = ModelLimiter(
+                model,
+                max_concurrent=int(_model_setting(model, 'MAX_CONCURRENT', 8)),
+                rate_per_minute=float(_model_setting(model, 'RATE_PER_MINUTE', 300)),
+                burst=float(_model_setting(model, 'BURST', 0)) or None,
+                max_queue=int(_model_setting(model, 'MAX_QUEUE', 32)),
+                max_wait=float(_model_setting(model, 'MAX_WAIT_SECONDS', 10))
+            )
+        return _limiters[model]
+
+
+@contextmanager
+def admit(veda, model=DEFAULT_MODEL):
+    """Hold one upstream slot for `veda` for the duration of the block"""
+    limiter = get_limiter(model)
+    started_at = limiter.acquire(veda)
+    try:
+        yield
+    finally:
+        limiter.release(veda, started_at)
+
+
+def stats():
+    """Snapshot of every limiter that has been used so far"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.model: limiter.stats() for limiter in limiters}
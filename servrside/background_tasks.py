@@ -0,0 +1,289 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import admission
+import usage_ledger
+
+log = logging.getLogger(__name__)
+
+# Shared pool for work that should not block a request (topic extraction, ...)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Lazily create the shared background executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('BACKGROUND_WORKERS', 4)),
+                thread_name_prefix='veda-background'
+            )
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Run `fn` on the shared background executor"""
+    return get_executor().submit(fn, *args, **kwargs)
+
+
+class TopicTracker:
+    """Keeps each session's discussed topics up to date in the background after every answer"""
+
+    def __init__(self, veda, extract_fn, max_topics=5):
+        self.veda = veda
+        self.extract_fn = extract_fn
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._topics = {}
+        self._pending = {}
+        self._generation = {}
+        self._applied = {}
+
+    def refresh(self, session_id, conversation_history):
+        """Schedule topic extraction for the latest state of a conversation"""
+        snapshot = list(conversation_history)
+        with self._lock:
+            generation = self._generation.get(session_id, 0) + 1
+            self._generation[session_id] = generation
+            self._pending[session_id] = submit(self._extract, session_id, snapshot, generation)
+
+    def _extract(self, session_id, snapshot, generation):
+        try:
+            # Background calls share the upstream limiter with foreground requests
+            with admission.admit(self.veda), usage_ledger.attribute(session_id):
+                topics = self.extract_fn(snapshot)
+        except admission.AdmissionRejected:
+            return None
+        except Exception as e:
+            log.error("Error extracting topics in background: %s", e)
+            return None
+
+        with self._lock:
+            # Ignore results that finished after a newer extraction already landed
+            if generation < self._applied.get(session_id, 0) or not topics:
+                return self._topics.get(session_id)
+            self._applied[session_id] = generation
+            # Newest topics first, then previously discussed ones still worth quizzing on
+            merged = list(dict.fromkeys(list(topics) + self._topics.get(session_id, [])))
+            self._topics[session_id] = merged[:self.max_topics]
+            return self._topics[session_id]
+
+    def pending(self, session_id):
+        """Future of the session's latest extraction, or None"""
+        with self._lock:
+            return self._pending.get(session_id)
+
+    def get(self, session_id, timeout=10.0):
+        """Latest topics for a session, waiting up to `timeout` for an in-flight extraction"""
+        with self._lock:
+            future = self._pending.get(session_id)
+        if future is not None and not future.done() and timeout:
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                pass
+        with self._lock:
+            return list(self._topics.get(session_id, []))
+
+    def forget(self, session_id):
+        """Drop everything tracked for a session"""
+        with self._lock:
+            future = self._pending.pop(session_id, None)
+            if future is not None:
+                future.cancel()
+            for table in (self._topics, self._generation, self._applied):
+                table.pop(session_id, None)
+
+
+class QuizPrefetcher:
+    """Speculatively generates a session's next quiz in the background shortly before it is due"""
+
+    def __init__(self, veda, topic_tracker, generate_fn, idle_timeout=None):
+        self.veda = veda
+        self.topic_tracker = topic_tracker
+        self.generate_fn = generate_fn
+        self.idle_timeout = float(idle_timeout or os.getenv('QUIZ_PREFETCH_IDLE_SECONDS', 300))
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._sweeper = None
+
+    def touch(self, session_id):
+        """Record activity so the session's pending quiz is not treated as idle"""
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None:
+                job['last_seen'] = time.monotonic()
+
+    def start(self, session_id, conversation_history):
+        """Begin generating the next quiz for a session, replacing any earlier speculative one"""
+        snapshot = list(conversation_history)
+        job = {'last_seen': time.monotonic(), 'cancelled': False, 'future': Future()}
+        with self._lock:
+            previous = self._jobs.get(session_id)
+            if previous is not None:
+                self._cancel(previous)
+            self._jobs[session_id] = job
+        # Generation starts once the topic extraction scheduled by the same answer is done; waiting for
+        # it inside a pool worker could occupy every worker while the extraction itself sits in the queue
+        extraction = self.topic_tracker.pending(session_id)
+        if extraction is None:
+            self._schedule(session_id, snapshot, job)
+        else:
+            extraction.add_done_callback(lambda _: self._schedule(session_id, snapshot, job))
+        self._ensure_sweeper()
+
+    def _schedule(self, session_id, snapshot, job):
+        if job['cancelled']:
+            return
+        try:
+            submit(self._run, session_id, snapshot, job)
+        except RuntimeError:  # the pool is shutting down
+            job['future'].cancel()
+
+    def _run(self, session_id, snapshot, job):
+        future = job['future']
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self._generate(session_id, snapshot, job))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _generate(self, session_id, snapshot, job):
+        topics = self.topic_tracker.get(session_id, timeout=0)
+        if job['cancelled'] or not topics:
+            return None
+        try:
+            with admission.admit(self.veda), usage_ledger.attribute(session_id):
+                quiz = self.generate_fn(topics, snapshot)
+        except admission.AdmissionRejected:
+            return None
+        except Exception as e:
+            log.error("Error pre-generating quiz: %s", e)
+            return None
+        if job['cancelled'] or not quiz:
+            return None
+        return {'quiz': quiz, 'topics': topics}
+
+    def take(self, session_id, timeout=30.0):
+        """Hand out the prepared quiz (waiting for one still in progress), or None"""
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is None or job['cancelled']:
+            return None
+        try:
+            return job['future'].result(timeout=timeout)
+        except Exception:
+            return None
+
+    def forget(self, session_id):
+        """Cancel and drop the pending quiz of a session"""
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+            if job is not None:
+                self._cancel(job)
+
+    def _cancel(self, job):
+        job['cancelled'] = True
+        job['future'].cancel()
+
+    def _ensure_sweeper(self):
+        with self._lock:
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(
+                    target=self._sweep_forever, name=f'{self.veda}-quiz-prefetch-sweeper', daemon=True
+                )
+                self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            self.cancel_idle()
+
+    def cancel_idle(self):
+        """Cancel and drop pending quizzes for sessions idle longer than the timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [sid for sid, job in self._jobs.items() if job['last_seen'] < cutoff]
+            for session_id in idle:
+                self._cancel(self._jobs.pop(session_id))
+        return len(idle)
+
+
+def _same_message(a, b):
+    return (a.get('timestamp'), a.get('sender'), a.get('text')) == (b.get('timestamp'), b.get('sender'), b.get('text'))
+
+
+class ConversationSummarizer:
+    """Folds the older turns of long conversations into one rolling summary message in the background"""
+
+    SENDER = 'summary'
+
+    def __init__(self, veda, conversations, summarize_fn, max_messages=None, keep_recent=None):
+        self.veda = veda
+        self.conversations = conversations
+        self.summarize_fn = summarize_fn
+        self.max_messages = int(max_messages or os.getenv('SUMMARIZE_AFTER_MESSAGES', 20))
+        self.keep_recent = int(keep_recent or os.getenv('SUMMARY_KEEP_RECENT', 8))
+        if not 1 <= self.keep_recent < self.max_messages:
+            raise ValueError(
+                f"SUMMARY_KEEP_RECENT ({self.keep_recent}) must be at least 1 and below "
+                f"SUMMARIZE_AFTER_MESSAGES ({self.max_messages})"
+            )
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.folds = 0
+
+    def maybe_fold(self, session_id, conversation_history):
+        """Schedule a fold when the conversation has grown past max_messages"""
+        if len(conversation_history) <= self.max_messages:
+            return False
+        with self._lock:
+            if session_id in self._pending:
+                return False
+            self._pending.add(session_id)
+        submit(self._fold, session_id, list(conversation_history))
+        return True
+
+    def _fold(self, session_id, snapshot):
+        try:
+            older = snapshot[:-self.keep_recent]
+            if not older:
+                return
+            previous = older[0]['text'] if older and older[0].get('sender') == self.SENDER else ''
+            turns = older[1:] if previous else older
+            try:
+                with admission.admit(self.veda), usage_ledger.attribute(session_id):
+                    summary = self.summarize_fn(previous, turns)
+            except admission.AdmissionRejected:
+                return
+            except Exception as e:
+                log.error("Error summarizing conversation: %s", e)
+                return
+            if summary and session_id in self.conversations:
+                # Counted once the update has landed; a Redis-backed update may run _replace more than once
+                if self.conversations.update(session_id, lambda history: self._replace(history, older, summary), default=list):
+                    with self._lock:
+                        self.folds += 1
+        finally:
+            with self._lock:
+                self._pending.discard(session_id)
+
+    def _replace(self, history, older, summary):
+        """Swap the folded messages for the summary, unless the history changed underneath"""
+        if not history or len(history) < len(older) or not (
+            _same_message(history[0], older[0]) and _same_message(history[len(older) - 1], older[-1])
+        ):
+            return history, False
+        message = {'timestamp': older[-1].get('timestamp'), 'sender': self.SENDER, 'text': summary}
+        return [message] + history[len(older):], True
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {'folds': self.folds, 'pending': pending, 'max_messages': self.max_messages, 'keep_recent': self.keep_recent}
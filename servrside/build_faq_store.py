@@ -0,0 +1,59 @@
+import argparse
+import importlib
+import json
+import os
+from datetime import datetime
+
+import faq_store
+
+# Build-time job: answer the canonical intro topics and FAQ list once through the full
+# RAG pipeline and store the results for instant serving.
+# Run from the servrside directory (like the apps): python build_faq_store.py
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for the intro topics and FAQ list")
+    parser.add_argument('--questions', default='faq_questions.json',
+                        help="JSON object mapping veda -> list of canonical questions")
+    parser.add_argument('--vedas', nargs='+', help="only rebuild these vedas")
+    parser.add_argument('--topk', type=int, default=5)
+    parser.add_argument('--output', default=faq_store.DEFAULT_PATH)
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+
+    # Keep entries of vedas that are not being rebuilt
+    store = {'version': 1, 'vedas': {}}
+    if os.path.exists(args.output):
+        with open(args.output, 'r', encoding='utf-8') as f:
+            store = json.load(f)
+
+    for veda in args.vedas or list(questions):
+        veda_app = importlib.import_module(f"{veda}_app")
+        veda_app.init()
+        prompt_version = str(veda_app.PROMPT_VERSION)
+        print(f"📚 Answering {len(questions.get(veda, []))} {veda} questions (prompt v{prompt_version})...")
+
+        answers = {}
+        for question in questions.get(veda, []):
+            answer, results = veda_app.rag_answer(question, topk=args.topk)
+            answers[faq_store.normalize_question(question)] = {
+                'question': question,
+                'answer': answer,
+                'verses': [verse for verse, _ in results]
+            }
+            print(f"  ✅ {question}")
+
+        # Answers for older prompt versions are stale, so only the current one is kept
+        store['vedas'][veda] = {prompt_version: answers}
+
+    store['generated_at'] = datetime.now().isoformat()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(store, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"✅ FAQ store saved to {args.output}: {faq_store.FaqStore(store).stats()}")
+
+
+if __name__ == '__main__':
+    main()
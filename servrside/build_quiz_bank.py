@@ -0,0 +1,92 @@
+import argparse
+import gzip
+import importlib
+import json
+from datetime import datetime
+
+import quiz_bank
+
+# Offline job: generate, validate and index a question bank per veda and topic.
+# Run from the servrside directory (like the apps): python build_quiz_bank.py --rounds 5
+
+DEFAULT_TOPICS = {
+    'rigveda': [
+        'Agni', 'fire rituals', 'Indra', 'creation myths', 'dharma', 'soma', 'hymns',
+        'cosmic order', 'Varuna', 'Ushas and the dawn', 'Purusha Sukta', 'rishis'
+    ],
+    'samaveda': [
+        'sacred chanting', 'melodies', 'soma rituals', 'udgitha', 'musical notation',
+        'Udgatri priests', 'sacrificial songs', 'ragas', 'breathing techniques'
+    ],
+    'yajurveda': [
+        'sacrificial rituals', 'mantras', 'fire ceremonies', 'ritual procedures', 'priests',
+        'altar construction', 'offerings', 'ceremonial implements', 'yajna'
+    ],
+    'atharvaveda': [
+        'healing spells', 'protective charms', 'medical knowledge', 'daily rituals',
+        'marriage customs', 'agricultural practices', 'magical formulas', 'remedies'
+    ]
+}
+
+
+def build_veda(veda, topics, rounds):
+    """Generate `rounds` quizzes per topic and index the valid, de-duplicated questions"""
+    veda_app = importlib.import_module(f"{veda}_app")
+    veda_app.init()
+    questions = []
+    index = {}
+    seen = set()
+
+    def add(topic, question):
+        key = " ".join(question.get('question', '').lower().split())
+        if not quiz_bank.validate_question(question) or key in seen:
+            return False
+        seen.add(key)
+        index.setdefault(quiz_bank.normalize_topic(topic), []).append(len(questions))
+        questions.append(quiz_bank.pack_question(question))
+        return True
+
+    # Hand-written fallback questions are general knowledge about the veda. Seeding them
+    # first also stops a failed generation (which returns them) from filing them under a topic.
+    for question in getattr(veda_app, 'FALLBACK_QUIZ', {}).get('questions', []):
+        add("overview", question)
+
+    for topic in topics:
+        added = 0
+        for _ in range(rounds):
+            quiz = veda_app.generate_mcq_quiz([topic], [], use_bank=False)
+            for question in (quiz or {}).get('questions', []):
+                added += add(topic, question)
+        print(f"  {veda} / {topic}: {added} new questions")
+
+    return {'questions': questions, 'topics': index}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed quiz bank")
+    parser.add_argument('--vedas', nargs='+', default=list(DEFAULT_TOPICS))
+    parser.add_argument('--rounds', type=int, default=5, help="quizzes generated per topic")
+    parser.add_argument('--topics-file', help="JSON object mapping veda -> list of extra topics")
+    parser.add_argument('--output', default=quiz_bank.DEFAULT_PATH)
+    args = parser.parse_args()
+
+    topics = {veda: list(DEFAULT_TOPICS.get(veda, [])) for veda in args.vedas}
+    if args.topics_file:
+        with open(args.topics_file, 'r', encoding='utf-8') as f:
+            for veda, extra in json.load(f).items():
+                if veda in topics:
+                    topics[veda].extend(t for t in extra if t not in topics[veda])
+
+    bank = {'version': 1, 'generated_at': datetime.now().isoformat(), 'vedas': {}}
+    for veda in args.vedas:
+        print(f"📚 Building {veda} question bank...")
+        bank['vedas'][veda] = build_veda(veda, topics[veda], args.rounds)
+
+    with gzip.open(args.output, 'wt', encoding='utf-8') as f:
+        json.dump(bank, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"✅ Quiz bank saved to {args.output}: {quiz_bank.QuizBank(bank).stats()}")
+
+
+if __name__ == '__main__':
+    main()
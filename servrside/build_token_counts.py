@@ -0,0 +1,51 @@
+import argparse
+import os
+import pickle
+
+import prompt_budget
+
+# Offline job: store the prompt token count of every verse in the verse stores, so the
+# tutors can budget the retrieved context without tokenizing at request time.
+# Run from the servrside directory (like the apps): python build_token_counts.py
+
+VEDAS = ['rigveda', 'samaveda', 'yajurveda', 'atharvaveda']
+
+
+def annotate(path):
+    """Recount the tokens of every verse in a *_meta.pkl file and rewrite it in place"""
+    with open(path, 'rb') as f:
+        verses = pickle.load(f)
+    counts = []
+    for verse in verses:
+        if isinstance(verse, dict):
+            verse['tokens'] = prompt_budget.count_tokens(prompt_budget.verse_text(verse))
+            counts.append(verse['tokens'])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(verses, f)
+    os.replace(tmp_path, path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute per-verse prompt token counts")
+    parser.add_argument('--vedas', nargs='+', default=VEDAS)
+    parser.add_argument('--meta-dir', default='./databse')
+    args = parser.parse_args()
+
+    tokenizer = prompt_budget.TOKENIZER if prompt_budget._get_encoding() else 'estimate'
+    for veda in args.vedas:
+        path = os.path.join(args.meta_dir, f"{veda}_meta.pkl")
+        if not os.path.exists(path):
+            print(f"⚠️ {path} not found, skipping {veda}")
+            continue
+        counts = annotate(path)
+        if counts:
+            print(
+                f"✅ {veda}: {len(counts)} verses, {sum(counts) / len(counts):.0f} tokens on average, "
+                f"longest {max(counts)} ({tokenizer})"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+# Built offline by build_faq_store.py
+DEFAULT_PATH = "./databse/faq_store.json"
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation insensitive lookup key"""
+    return re.sub(r"\s+", " ", (question or "").strip().lower()).rstrip(" ?!.")
+
+
+class FaqStore:
+    """Precomputed answers and verse lists keyed by veda, prompt version and question"""
+
+    def __init__(self, data=None):
+        self.entries = (data or {}).get('vedas', {})
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def lookup(self, veda, prompt_version, question):
+        """Stored {'answer', 'verses'} for a question, or None (also when built for another prompt version)"""
+        answers = self.entries.get(veda, {}).get(str(prompt_version), {})
+        return answers.get(normalize_question(question))
+
+    def stats(self):
+        return {
+            veda: {version: len(answers) for version, answers in versions.items()}
+            for veda, versions in self.entries.items()
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Shared store, loaded on first use from FAQ_STORE_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = FaqStore.load(os.getenv('FAQ_STORE_PATH', DEFAULT_PATH))
+            except Exception as e:
+                log.warning("Could not load FAQ store: %s", e)
+                _store = FaqStore()
+        return _store
+
+
+def lookup(veda, prompt_version, question):
+    return get_store().lookup(veda, prompt_version, question)
@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:application
+# Every setting can be overridden from the environment (or the .env file loaded by the apps).
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+
+# Conversations live in each worker's memory unless sessions are shared (Redis, SQLite) or carried by
+# stateless tokens; a follow-up reaching another worker would lose its history, so default to one worker then
+SHARED_SESSIONS = (
+    os.getenv('SESSION_BACKEND', 'memory') in ('redis', 'sqlite')
+    or os.getenv('STATELESS_SESSIONS', '').lower() in ('1', 'true', 'yes')
+)
+
+# Workers share the preloaded indexes copy-on-write
+workers = int(os.getenv('WEB_WORKERS', min(4, multiprocessing.cpu_count()) if SHARED_SESSIONS else 1))
+# Threads overlap the OpenAI round trips: enough for every admitted call (LLM_MAX_CONCURRENT) and every
+# queued one (LLM_MAX_QUEUE), so admission control, not the thread pool, decides who waits or gets a 429,
+# plus headroom so health checks, probes and static files never queue behind LLM calls
+threads = int(os.getenv('WEB_THREADS', int(os.getenv('LLM_MAX_CONCURRENT') or 8) + int(os.getenv('LLM_MAX_QUEUE') or 32) + 8))
+worker_class = 'gthread'
+preload_app = os.getenv('WEB_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# Answers wait on the LLM, so allow for slow upstream calls
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+
+# Recycle workers now and then; 0 disables
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 0))
+
+# The apps write their own sampled, structured access log (request_log.py); set WEB_ACCESS_LOG=- for gunicorn's as well
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    if workers > 1 and not SHARED_SESSIONS:
+        server.log.warning(
+            "%d workers with in-memory sessions: a follow-up or quiz request served by another worker "
+            "loses the conversation. Set SESSION_BACKEND=redis or sqlite, or STATELESS_SESSIONS=1", workers
+        )
+
+
+def post_fork(server, worker):
+    # Thread pools and the log writer thread do not survive fork; let each worker start its own
+    import background_tasks
+    import request_log
+    background_tasks._executor = None
+    request_log.restart_after_fork()
+    server.log.info("Worker %s ready", worker.pid)
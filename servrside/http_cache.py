@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from flask import abort, current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# How often a cached file's mtime is checked (and a missing file looked for again)
+FILE_CHECK_SECONDS = float(os.getenv('TEMPLATE_CHECK_SECONDS', 2))
+
+# Shared front-end assets; pages reference them as {{ asset:tutor.js }} and get a content-versioned URL
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_MAX_AGE = 365 * 24 * 3600
+_ASSET_PATTERN = re.compile(rb"\{\{ asset:([\w./-]+) \}\}")
+
+
+class CachedPayload:
+    """JSON body rebuilt only when its version changes or it is older than refresh_seconds"""
+
+    def __init__(self, build, version=None, refresh_seconds=60.0):
+        self.build = build
+        self.version = version or (lambda: None)
+        self.refresh_seconds = float(refresh_seconds)
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+        self._built_version = None
+        self._built_at = 0.0
+        self.builds = 0
+
+    def get(self):
+        """(body bytes, strong ETag) of the current payload"""
+        version = self.version()
+        with self._lock:
+            if (
+                self._body is None or version != self._built_version
+                or time.monotonic() - self._built_at > self.refresh_seconds
+            ):
+                body = json.dumps(self.build(), sort_keys=True, separators=(',', ':')).encode('utf-8')
+                if body != self._body:
+                    self._body = body
+                    self._etag = hashlib.sha1(body).hexdigest()
+                self._built_version = version
+                self._built_at = time.monotonic()
+                self.builds += 1
+            return self._body, self._etag
+
+
+def conditional_response(body, etag, max_age=0, mimetype='application/json', public=True):
+    """Response with ETag and Cache-Control that turns into a 304 when the client already has it"""
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = public
+    response.cache_control.max_age = int(max_age)
+    if not max_age:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def compress_variants(raw):
+    """Identity, gzip and (when available) brotli encodings of a body"""
+    variants = {'identity': raw, 'gzip': gzip.compress(raw, 9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(raw, quality=11)
+    return variants
+
+
+def choose_encoding(available):
+    """Best content coding the client accepts among `available`"""
+    offered = [encoding for encoding in ('br', 'gzip') if encoding in available]
+    return request.accept_encodings.best_match(offered) or 'identity'
+
+
+class CachedFile:
+    """File kept in memory precompressed, reloaded when its mtime (or a referenced asset) changes"""
+
+    def __init__(self, path, stamp_assets=False):
+        self.path = path
+        self.stamp_assets = stamp_assets
+        self.exists = False
+        self.mtime = None
+        # (variants, etag) replaced as one tuple, so readers never pair a body with another version's ETag
+        self._content = ({}, None)
+        self._raw = None
+        self._assets = []
+        self._assets_key = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _build(self):
+        body = self._raw
+        if self.stamp_assets:
+            self._assets = [name.decode('utf-8') for name in _ASSET_PATTERN.findall(body)]
+            self._assets_key = assets_key(self._assets)
+            body = _ASSET_PATTERN.sub(lambda m: asset_url(m.group(1).decode('utf-8')).encode('utf-8'), body)
+        self._content = (compress_variants(body), hashlib.sha1(body).hexdigest())
+
+    @property
+    def variants(self):
+        return self._content[0]
+
+    @property
+    def etag(self):
+        return self._content[1]
+
+    def snapshot(self):
+        """(variants, etag) of one version of the file, consistent even while it is being reloaded"""
+        return self._content
+
+    def refresh(self):
+        """Re-stat the file at most every FILE_CHECK_SECONDS; True if it exists"""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < FILE_CHECK_SECONDS:
+                return self.exists
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                self.exists, self.mtime, self._content = False, None, ({}, None)
+                return False
+            if mtime != self.mtime:
+                with open(self.path, 'rb') as f:
+                    self._raw = f.read()
+                self.mtime = mtime
+                self._build()
+            elif self.stamp_assets and self._assets_key != assets_key(self._assets):
+                # A referenced asset changed, so the page must point at its new version
+                self._build()
+            self.exists = True
+            return True
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def cached_file(*paths, stamp_assets=False):
+    """First of `paths` that exists, from the in-memory cache, or None
+
+    Only files that exist are cached, so requests for made-up paths cannot grow the cache.
+    """
+    for path in paths:
+        with _files_lock:
+            entry = _files.get(path)
+            if entry is None:
+                if not os.path.isfile(path):
+                    continue
+                entry = _files[path] = CachedFile(path, stamp_assets)
+        if entry.refresh():
+            return entry
+        with _files_lock:
+            # Deleted since it was cached
+            if _files.get(path) is entry:
+                del _files[path]
+    return None
+
+
+def cached_page(*paths):
+    """Like cached_file, with {{ asset:name }} references replaced by versioned asset URLs"""
+    return cached_file(*paths, stamp_assets=True)
+
+
+def static_file(filename):
+    path = os.path.normpath(os.path.join(STATIC_DIR, filename))
+    if not path.startswith(STATIC_DIR + os.sep):
+        return None
+    return cached_file(path)
+
+
+def asset_url(filename):
+    entry = static_file(filename)
+    return f"/static/{filename}?v={entry.etag[:12]}" if entry else f"/static/{filename}"
+
+
+def assets_key(names):
+    """Current versions of the named assets; a page is re-stamped when this changes"""
+    return [(name, getattr(static_file(name), 'etag', None)) for name in names]
+
+
+def file_response(entry, mimetype='text/html', max_age=0, immutable=False, content=None):
+    """Serve a cached file in the best accepted encoding with a strong ETag and conditional GET
+
+    `content` is a snapshot() the caller already based decisions on; by default one is taken here.
+    """
+    variants, etag = content or entry.snapshot()
+    if not variants:  # deleted since it was looked up
+        abort(404)
+    encoding = choose_encoding(variants)
+    response = current_app.response_class(variants[encoding], mimetype=mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different representation, so it gets its own strong ETag
+    response.set_etag(etag if encoding == 'identity' else f"{etag}-{encoding}")
+    response.cache_control.public = True
+    response.cache_control.max_age = int(max_age)
+    if immutable:
+        response.cache_control.immutable = True
+    elif not max_age:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def static_response(filename):
+    """Serve a shared asset; requests for the current ?v= version may be cached for a year"""
+    entry = static_file(filename)
+    if entry is None:
+        abort(404)
+    content = entry.snapshot()
+    # Only the exact version the URL names may be cached for a year
+    versioned = content[1] is not None and request.args.get('v') == content[1][:12]
+    return file_response(
+        entry,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        max_age=STATIC_MAX_AGE if versioned else 0,
+        immutable=versioned,
+        content=content
+    )
@@ -0,0 +1,150 @@
+import gzip
+import os
+import threading
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+import http_cache
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used instead
+    orjson = None
+
+# API responses are encoded with orjson when it is installed (FAST_JSON=0 turns it off) and
+# compressed for clients that accept it once they reach JSON_COMPRESS_MIN_BYTES
+FAST_JSON = os.getenv('FAST_JSON', '1').lower() in ('1', 'true', 'yes')
+JSON_COMPRESS_MIN_BYTES = int(os.getenv('JSON_COMPRESS_MIN_BYTES', 1024))
+# Responses are compressed per request, so cheaper levels than the precompressed pages
+GZIP_LEVEL = int(os.getenv('JSON_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('JSON_BROTLI_QUALITY', 5))
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+_lock = threading.Lock()
+_stats = {
+    'serialized': 0, 'serialize_seconds': 0.0, 'serialize_max_ms': 0.0,
+    'responses': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_out': 0, 'compress_seconds': 0.0,
+    'by_encoding': {}, 'by_encoder': {}
+}
+# Separators jsonify passes for compact output; orjson's own output is already compact
+_COMPACT_SEPARATORS = (',', ':')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson and times every serialization"""
+
+    # Verse texts are Devanagari; raw UTF-8 is half the size of \u escapes
+    ensure_ascii = False
+    # Clients do not depend on key order, and sorting costs time on every response
+    sort_keys = False
+
+    def _orjson_options(self, kwargs):
+        """orjson options equivalent to the stdlib `kwargs`, or None if orjson cannot honour them"""
+        options = _ORJSON_OPTIONS
+        for name, value in kwargs.items():
+            if name == 'separators' and tuple(value) == _COMPACT_SEPARATORS:
+                continue
+            if name == 'indent' and value == 2:  # jsonify in debug mode
+                options |= orjson.OPT_INDENT_2
+            elif name == 'sort_keys':
+                options |= orjson.OPT_SORT_KEYS if value else 0
+            elif name != 'ensure_ascii':  # orjson always writes raw UTF-8
+                return None
+        if self.sort_keys and 'sort_keys' not in kwargs:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        text = None
+        encoder = 'json'
+        # Options orjson has no equivalent for (e.g. other indents) go through the default encoder
+        options = self._orjson_options(kwargs) if FAST_JSON and orjson is not None else None
+        if options is not None:
+            try:
+                text = orjson.dumps(obj, default=self.default, option=options).decode('utf-8')
+                encoder = 'orjson'
+            except TypeError:
+                text = None
+        if text is None:
+            text = super().dumps(obj, **kwargs)
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _stats['serialized'] += 1
+            _stats['serialize_seconds'] += elapsed
+            _stats['serialize_max_ms'] = max(_stats['serialize_max_ms'], elapsed * 1000)
+            _stats['by_encoder'][encoder] = _stats['by_encoder'].get(encoder, 0) + 1
+        return text
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return http_cache.brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    """Compress a JSON response in the best encoding the client accepts, above the size threshold"""
+    if (
+        response.mimetype != 'application/json' or response.direct_passthrough
+        or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+        # Cached payloads carry a strong ETag that conditional requests compare against
+        or 'ETag' in response.headers
+    ):
+        return response
+    body = response.get_data()
+    with _lock:
+        _stats['responses'] += 1
+    if len(body) < JSON_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    available = ('gzip', 'br') if http_cache.brotli is not None else ('gzip',)
+    encoding = http_cache.choose_encoding(available)
+    if encoding == 'identity':
+        return response
+    started = time.perf_counter()
+    compressed = _compress(body, encoding)
+    elapsed = time.perf_counter() - started
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    with _lock:
+        _stats['compressed'] += 1
+        _stats['bytes_in'] += len(body)
+        _stats['bytes_out'] += len(compressed)
+        _stats['compress_seconds'] += elapsed
+        _stats['by_encoding'][encoding] = _stats['by_encoding'].get(encoding, 0) + 1
+    return response
+
+
+def install(app):
+    """Use the fast encoder for jsonify and compress the app's JSON responses"""
+    app.json = FastJSONProvider(app)
+    app.after_request(compress_response)
+    return app
+
+
+def stats():
+    """Encoder that serialized most responses (per-encoder counts in by_encoder), serialization time
+    and bytes saved by compression"""
+    with _lock:
+        s = dict(_stats, by_encoding=dict(_stats['by_encoding']), by_encoder=dict(_stats['by_encoder']))
+    return {
+        'encoder': max(s['by_encoder'], key=s['by_encoder'].get) if s['by_encoder'] else (
+            'orjson' if FAST_JSON and orjson is not None else 'json'),
+        'serialized': s['serialized'],
+        'by_encoder': s['by_encoder'],
+        'serialize_avg_ms': round(s['serialize_seconds'] * 1000 / s['serialized'], 3) if s['serialized'] else None,
+        'serialize_max_ms': round(s['serialize_max_ms'], 3),
+        'compress_min_bytes': JSON_COMPRESS_MIN_BYTES,
+        'responses': s['responses'],
+        'compressed': s['compressed'],
+        'by_encoding': s['by_encoding'],
+        'bytes_in': s['bytes_in'],
+        'bytes_out': s['bytes_out'],
+        'bytes_saved': s['bytes_in'] - s['bytes_out'],
+        'compression_ratio': round(s['bytes_out'] / s['bytes_in'], 3) if s['bytes_in'] else None,
+        'compress_avg_ms': round(s['compress_seconds'] * 1000 / s['compressed'], 3) if s['compressed'] else None
+    }
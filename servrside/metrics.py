@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+import usage_ledger
+
+# In-process metrics rendered in the Prometheus text format on /metrics. Each worker process
+# keeps its own series, so scrape every worker (or run a single one) rather than a load balancer.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        key = tuple(str(label) for label in labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Bucketed observations (seconds) per label set"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labelvalues):
+        key = tuple(str(label) for label in labelvalues)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['buckets'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series['buckets']):
+                    cumulative += count
+                    le = (('le', _number(bound)),)
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'veda_stage_duration_seconds',
+    'Duration of RAG pipeline stages (embed, search, prompt_build, completion, topic_extraction, quiz_generation, summary)',
+    ('veda', 'stage')
+)
+CACHE_HITS = Counter('veda_cache_hits_total', 'Answers, quizzes and topics served without an upstream call', ('veda', 'cache'))
+FALLBACKS = Counter('veda_fallbacks_total', 'Canned or degraded results used after a failed stage', ('veda', 'stage'))
+ERRORS = Counter('veda_errors_total', 'Exceptions raised inside a pipeline stage', ('veda', 'stage'))
+UPSTREAM_TOKENS = Counter('veda_upstream_tokens_total', 'OpenAI tokens used, from the usage of each response', ('veda', 'call', 'kind'))
+
+
+@contextmanager
+def stage(veda, name):
+    """Time a pipeline stage; exceptions are counted as errors of that stage and re-raised"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(veda, name)
+        raise
+    finally:
+        observe(veda, name, time.perf_counter() - started)
+
+
+def observe(veda, name, seconds):
+    """Record a stage that was timed by hand (e.g. one that cannot be wrapped in a block)"""
+    STAGE_SECONDS.observe(seconds, veda, name)
+    # Stages run on the request thread are also reported back to the client (Server-Timing)
+    if has_request_context():
+        g.setdefault('stage_timings', []).append((name, seconds))
+
+
+def request_timings():
+    """Seconds spent per stage in the current request, in the order the stages first ran"""
+    totals = {}
+    for name, seconds in g.get('stage_timings', []):
+        totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+def server_timing(timings):
+    """Server-Timing header value for {stage: seconds}"""
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def cache_hit(veda, cache):
+    CACHE_HITS.inc(veda, cache)
+
+
+def fallback(veda, name):
+    FALLBACKS.inc(veda, name)
+
+
+def record_usage(veda, call, response):
+    """Count the prompt and completion tokens reported by an OpenAI response and charge them to the session"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+    if prompt_tokens:
+        UPSTREAM_TOKENS.inc(veda, call, 'prompt', amount=prompt_tokens)
+    if completion_tokens:
+        UPSTREAM_TOKENS.inc(veda, call, 'completion', amount=completion_tokens)
+    usage_ledger.record(veda, call, getattr(response, 'model', None), prompt_tokens, completion_tokens)
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
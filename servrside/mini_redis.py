@@ -0,0 +1,264 @@
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+from redis_sessions import RespError, read_reply
+
+# In-process stand-in for a Redis server, covering the commands the session store uses.
+# Useful for tests and local multi-worker runs without a real Redis:
+#   python mini_redis.py --port 6379
+
+
+def _encode(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RespError):
+        return b"-%s\r\n" % str(reply).encode('utf-8')
+    if isinstance(reply, bool) or isinstance(reply, int):
+        return b":%d\r\n" % int(reply)
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode('utf-8')
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    raise TypeError(f"Cannot encode {type(reply)}")
+
+
+class MiniRedis:
+    """Thread-safe keyspace with strings, lists, lazy expiry and WATCH/MULTI/EXEC transactions"""
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        # Version of every key ever written, for WATCH (kept after deletion so a recreated key differs)
+        self._versions = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def _changed(self, key):
+        self._clock += 1
+        self._versions[key] = self._clock
+
+    def _alive(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            self._changed(key)
+        return key in self._data
+
+    def _list(self, key):
+        if not self._alive(key):
+            return []
+        value = self._data[key]
+        if not isinstance(value, list):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, args):
+        with self._lock:
+            return self._dispatch(args)
+
+    def _dispatch(self, args):
+        name = args[0].decode('utf-8').upper()
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except RespError as e:
+            return e
+        except (TypeError, ValueError) as e:
+            return RespError(f"ERR {e}")
+
+    def versions(self, keys):
+        """Current versions of `keys`, to WATCH them"""
+        with self._lock:
+            for key in keys:
+                self._alive(key)
+            return {key: self._versions.get(key, 0) for key in keys}
+
+    def transaction(self, commands, watched):
+        """Run queued commands atomically, or return None if a watched key changed since WATCH"""
+        with self._lock:
+            for key in watched:
+                self._alive(key)
+            if any(self._versions.get(key, 0) != version for key, version in watched.items()):
+                return None
+            return [self._dispatch(command) for command in commands]
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_flushdb(self):
+        for key in self._data:
+            self._changed(key)
+        self._data.clear()
+        self._expires.clear()
+        return "OK"
+
+    def cmd_get(self, key):
+        if not self._alive(key):
+            return None
+        value = self._data[key]
+        if isinstance(value, list):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_set(self, key, value, *options):
+        self._data[key] = value
+        self._expires.pop(key, None)
+        self._changed(key)
+        options = [o.decode('utf-8').upper() for o in options]
+        if 'EX' in options:
+            self._expires[key] = time.monotonic() + int(options[options.index('EX') + 1])
+        return "OK"
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                self._changed(key)
+                removed += 1
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._alive(key))
+
+    def cmd_expire(self, key, seconds):
+        if not self._alive(key):
+            return 0
+        self._expires[key] = time.monotonic() + int(seconds)
+        self._changed(key)
+        return 1
+
+    def cmd_rpush(self, key, *values):
+        items = self._list(key)
+        items.extend(values)
+        self._data[key] = items
+        self._changed(key)
+        return len(items)
+
+    def cmd_llen(self, key):
+        return len(self._list(key))
+
+    def _range(self, items, start, stop):
+        start, stop = int(start), int(stop)
+        n = len(items)
+        start = max(start + n if start < 0 else start, 0)
+        stop = stop + n if stop < 0 else min(stop, n - 1)
+        return start, stop
+
+    def cmd_lrange(self, key, start, stop):
+        items = self._list(key)
+        start, stop = self._range(items, start, stop)
+        return items[start:stop + 1] if start <= stop else []
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self._list(key)
+        if items:
+            start, stop = self._range(items, start, stop)
+            items[:] = items[start:stop + 1] if start <= stop else []
+            self._changed(key)
+            if not items:
+                self.cmd_del(key)
+        return "OK"
+
+    def cmd_scan(self, cursor, *options):
+        options = [o.decode('utf-8') for o in options]
+        pattern = options[options.index('MATCH') + 1] if 'MATCH' in options else '*'
+        keys = [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key.decode('utf-8'), pattern)]
+        return [b"0", keys]
+
+
+_NOT_HANDLED = object()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Pipelined replies are written one by one; without this each round trip waits on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        # WATCHed key versions and the MULTI queue belong to the connection
+        self.watched = {}
+        self.queued = None
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            reply = self._transactional(command[0].decode('utf-8').upper(), command)
+            if reply is _NOT_HANDLED:
+                reply = self.server.keyspace.execute(command)
+            self.wfile.write(_encode(reply))
+
+    def _transactional(self, name, command):
+        keyspace = self.server.keyspace
+        if name == 'WATCH':
+            if self.queued is not None:
+                return RespError("ERR WATCH inside MULTI is not allowed")
+            self.watched.update(keyspace.versions(command[1:]))
+            return "OK"
+        if name == 'UNWATCH':
+            self.watched = {}
+            return "OK"
+        if name == 'MULTI':
+            if self.queued is not None:
+                return RespError("ERR MULTI calls can not be nested")
+            self.queued = []
+            return "OK"
+        if name in ('EXEC', 'DISCARD'):
+            if self.queued is None:
+                return RespError(f"ERR {name} without MULTI")
+            queued, watched = self.queued, self.watched
+            self.queued, self.watched = None, {}
+            return keyspace.transaction(queued, watched) if name == 'EXEC' else "OK"
+        if self.queued is not None:
+            self.queued.append(command)
+            return "QUEUED"
+        return _NOT_HANDLED
+
+
+class MiniRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.keyspace = MiniRedis()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+
+def start_in_background(host='127.0.0.1', port=0):
+    """Start a stand-in server on a daemon thread and return it (see .url)"""
+    server = MiniRedisServer(host, port)
+    threading.Thread(target=server.serve_forever, name='mini-redis', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stand-in Redis-protocol server for local runs and tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    server = MiniRedisServer(args.host, args.port)
+    print(f"🧪 Stand-in Redis server listening on {server.url}")
+    server.serve_forever()
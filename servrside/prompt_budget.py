@@ -0,0 +1,94 @@
+import os
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts are then estimated from the UTF-8 length
+    tiktoken = None
+
+# Retrieved verses are fitted into PROMPT_CONTEXT_TOKENS, best first, and at most MAX_TOPK are ever retrieved
+PROMPT_CONTEXT_TOKENS = int(os.getenv('PROMPT_CONTEXT_TOKENS', 1500))
+MAX_TOPK = int(os.getenv('MAX_TOPK', 10))
+DEFAULT_TOPK = 5
+# A verse that does not fit is cut to the remaining budget only if at least this much is left
+MIN_VERSE_TOKENS = int(os.getenv('MIN_VERSE_TOKENS', 64))
+# Reference label and newline in front of every verse in the context
+VERSE_OVERHEAD_TOKENS = 8
+TOKENIZER = 'o200k_base'  # gpt-4o family
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER)
+        except Exception:  # e.g. no network to fetch the BPE file; fall back to estimates
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Romanized Sanskrit runs close to 3 bytes per token, Devanagari about one token per character
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+def truncate(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    data = text.encode('utf-8')[:max_tokens * 3]
+    return data.decode('utf-8', errors='ignore')
+
+
+def verse_text(verse):
+    """The text of a verse that goes into the prompt"""
+    return verse.get('text_sa', verse.get('text', ''))
+
+
+def ensure_token_counts(verses):
+    """Add a 'tokens' count to verses that were stored without one (see build_token_counts.py)"""
+    missing = 0
+    for verse in verses:
+        if isinstance(verse, dict) and 'tokens' not in verse:
+            verse['tokens'] = count_tokens(verse_text(verse))
+            missing += 1
+    return missing
+
+
+def cap_topk(topk):
+    """Client-supplied topk as an int between 1 and MAX_TOPK"""
+    try:
+        topk = int(topk)
+    except (TypeError, ValueError):
+        topk = DEFAULT_TOPK
+    return max(1, min(topk, MAX_TOPK))
+
+
+def fit(results, budget=None):
+    """(verse, score, prompt text) for the best-ranked results that fit the token budget
+
+    Results are taken in rank order. A verse that does not fit is cut to the remaining budget when
+    at least MIN_VERSE_TOKENS are left, and that ends the context; otherwise it is dropped and a
+    shorter, lower-ranked verse may still take its place. The best verse is always kept.
+    """
+    remaining = PROMPT_CONTEXT_TOKENS if budget is None else budget
+    fitted = []
+    for verse, score in results:
+        text = verse_text(verse)
+        tokens = verse.get('tokens')
+        if tokens is None:
+            tokens = count_tokens(text)
+        cost = tokens + VERSE_OVERHEAD_TOKENS
+        if cost <= remaining:
+            fitted.append((verse, score, text))
+            remaining -= cost
+            continue
+        available = remaining - VERSE_OVERHEAD_TOKENS
+        if available >= MIN_VERSE_TOKENS or not fitted:
+            fitted.append((verse, score, truncate(text, max(available, MIN_VERSE_TOKENS)) + ' …'))
+            break
+    return fitted
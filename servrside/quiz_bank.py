@@ -0,0 +1,152 @@
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+# Compact, gzipped JSON produced offline by build_quiz_bank.py
+DEFAULT_PATH = "./databse/quiz_bank.json.gz"
+
+OPTION_KEYS = ("A", "B", "C", "D")
+
+_STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'into', 'its', 'their', 'about', 'of', 'in', 'on', 'to',
+    'veda', 'vedas', 'vedic', 'rigveda', 'samaveda', 'yajurveda', 'atharvaveda', 'general'
+}
+
+
+def keywords(text):
+    """Significant, roughly singularised words of a topic string"""
+    words = set()
+    for word in re.findall(r"[a-z]+", text.lower()):
+        if len(word) < 3 or word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+def normalize_topic(topic):
+    return " ".join(sorted(keywords(topic)))
+
+
+def pack_question(question):
+    """Question dict -> compact [question, [A, B, C, D], correct, explanation] row"""
+    return [
+        question['question'].strip(),
+        [question['options'][key].strip() for key in OPTION_KEYS],
+        question['correct_answer'],
+        question.get('explanation', '').strip()
+    ]
+
+
+def unpack_question(row):
+    text, options, correct, explanation = row
+    return {
+        'question': text,
+        'options': dict(zip(OPTION_KEYS, options)),
+        'correct_answer': correct,
+        'explanation': explanation
+    }
+
+
+def validate_question(question):
+    """True if a generated question is well formed enough to be banked"""
+    if not isinstance(question, dict):
+        return False
+    options = question.get('options')
+    if not isinstance(question.get('question'), str) or not question['question'].strip():
+        return False
+    if not isinstance(options, dict) or set(options) != set(OPTION_KEYS):
+        return False
+    texts = [options[key].strip().lower() for key in OPTION_KEYS if isinstance(options[key], str)]
+    if len(texts) != 4 or not all(texts) or len(set(texts)) != 4:
+        return False
+    return question.get('correct_answer') in OPTION_KEYS
+
+
+class QuizBank:
+    """Precomputed questions per veda and topic with a keyword index for local quiz assembly"""
+
+    def __init__(self, data=None):
+        self.questions = {}
+        self.topics = {}
+        self.keyword_index = {}
+        for veda, entry in ((data or {}).get('vedas') or {}).items():
+            self.questions[veda] = entry['questions']
+            self.topics[veda] = entry['topics']
+            index = self.keyword_index[veda] = {}
+            for topic in entry['topics']:
+                for word in topic.split():
+                    index.setdefault(word, set()).add(topic)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def covers(self, veda, topic):
+        return bool(self._pool(veda, topic))
+
+    def _pool(self, veda, topic):
+        """Question ids whose banked topic shares a keyword with `topic`"""
+        index = self.keyword_index.get(veda, {})
+        ids = set()
+        for word in keywords(topic):
+            for banked_topic in index.get(word, ()):
+                ids.update(self.topics[veda][banked_topic])
+        return ids
+
+    def sample(self, veda, topics, count=3, rng=random):
+        """Assemble a quiz from the bank, or None when the topics are not covered well enough"""
+        pools = [sorted(pool) for pool in (self._pool(veda, topic) for topic in topics) if pool]
+        if len(set().union(*pools) if pools else ()) < count:
+            return None
+
+        # Draw round-robin over the covered topics so the quiz spans what was discussed
+        for pool in pools:
+            rng.shuffle(pool)
+        chosen = []
+        while len(chosen) < count:
+            for pool in pools:
+                while pool and pool[-1] in chosen:
+                    pool.pop()
+                if pool and len(chosen) < count:
+                    chosen.append(pool.pop())
+
+        return {'questions': [unpack_question(self.questions[veda][i]) for i in chosen]}
+
+    def stats(self):
+        return {
+            veda: {'questions': len(self.questions[veda]), 'topics': len(self.topics[veda])}
+            for veda in self.questions
+        }
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_bank():
+    """Shared bank, loaded on first use from QUIZ_BANK_PATH"""
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            try:
+                _bank = QuizBank.load(os.getenv('QUIZ_BANK_PATH', DEFAULT_PATH))
+            except Exception as e:
+                log.warning("Could not load quiz bank: %s", e)
+                _bank = QuizBank()
+        return _bank
+
+
+def sample(veda, topics, count=3):
+    """Quiz for `topics` from the shared bank, or None if the LLM is needed"""
+    return get_bank().sample(veda, topics, count=count)
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+# A worker is ready when its loaded tutors answer a local retrieval self-test within the latency
+# SLO. Nothing here calls OpenAI. Only tutors named as required are warmed by the probe and kept
+# loaded; otherwise tutors stay lazily loaded and unloadable under the memory budget.
+READY_SLO_MS = float(os.getenv('READY_SLO_MS', 50))
+READY_CACHE_SECONDS = float(os.getenv('READY_CACHE_SECONDS', 30))
+
+
+def self_test(module, probe):
+    """Search the tutor's index with a stored probe vector and read the verse it returns"""
+    index, verses = module.index, module.verses
+    if index is None or verses is None:
+        return {'ok': False, 'error': 'not loaded'}
+    started = time.perf_counter()
+    D, I = index.search(probe, 1)
+    best = int(I[0][0])
+    verse = verses[best] if 0 <= best < len(verses) else None
+    latency_ms = (time.perf_counter() - started) * 1000
+    ok = verse is not None
+    return {
+        'ok': ok and latency_ms <= READY_SLO_MS,
+        'latency_ms': round(latency_ms, 3),
+        'slo_ms': READY_SLO_MS,
+        'error': None if ok else 'probe search returned no verse'
+    }
+
+
+class ReadinessProbe:
+    """Cached per-tutor self-tests for load balancer readiness checks"""
+
+    def __init__(self, loader, vedas=None, cache_seconds=READY_CACHE_SECONDS):
+        """`vedas` are required tutors; None means whichever tutors happen to be loaded"""
+        self.loader = loader
+        self.vedas = list(vedas) if vedas else None
+        self.cache_seconds = float(cache_seconds)
+        if self.vedas:
+            # Readiness must not flap because the memory budget unloaded an idle required tutor
+            loader.pin(self.vedas)
+        self._lock = threading.Lock()
+        self._probes = {}
+        self._results = {}
+
+    def _probe(self, veda, module):
+        """The first stored vector of the index, kept as the tutor's probe"""
+        probe = self._probes.get(veda)
+        if probe is None or probe[0] is not module.index:
+            probe = self._probes[veda] = (module.index, module.index.reconstruct(0).reshape(1, -1))
+        return probe[1]
+
+    def _test(self, veda):
+        module = self.loader.peek(veda)
+        if module is None:
+            return {'ok': False, 'error': f"not loaded ({self.loader.status()['vedas'][veda]['state']})"}
+        try:
+            return self_test(module, self._probe(veda, module))
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def check(self):
+        """Readiness of the required (or loaded) tutors, re-testing results older than cache_seconds or a loader change"""
+        now = time.monotonic()
+        if self.vedas:
+            required = self.vedas
+            # A required tutor that is not loaded (never warmed, or reloading failed) is loaded in the
+            # background, so the worker becomes ready without waiting for a user request
+            self.loader.warm([veda for veda in required if self.loader.peek(veda) is None])
+        else:
+            required = [veda for veda in self.loader.vedas if self.loader.peek(veda) is not None]
+        with self._lock:
+            vedas = {}
+            for veda in required:
+                cached = self._results.get(veda)
+                if cached is None or cached['version'] != self.loader.version or now - cached['at'] > self.cache_seconds:
+                    cached = self._results[veda] = dict(self._test(veda), version=self.loader.version, at=now)
+                vedas[veda] = {key: value for key, value in cached.items() if key not in ('version', 'at')}
+                vedas[veda]['checked_seconds_ago'] = round(now - cached['at'], 1)
+        return {'ready': all(result['ok'] for result in vedas.values()), 'vedas': vedas}
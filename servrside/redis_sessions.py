@@ -0,0 +1,373 @@
+import json
+import os
+import random
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+# Commands that leave the same state when applied twice; only pipelines made of these are resent
+# after a connection fails mid-request, since the server may already have executed them
+IDEMPOTENT_COMMANDS = frozenset({
+    'GET', 'LRANGE', 'LLEN', 'EXISTS', 'SCAN', 'PING', 'EXPIRE', 'SET', 'DEL', 'WATCH', 'UNWATCH'
+})
+
+
+def encode_command(*args):
+    """Encode one command as a RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(reader):
+    """Parse one RESP reply from a buffered binary reader"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode('utf-8')
+    if kind == b'-':
+        return RespError(rest.decode('utf-8'))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unknown reply type {kind!r}")
+
+
+class RespClient:
+    """Minimal Redis-protocol client with per-thread connections and pipelining"""
+
+    def __init__(self, url="redis://localhost:6379/0", timeout=5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.timeout = timeout
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections must not be shared with forked worker processes
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and not self._usable(conn):
+            self._discard()
+            conn = None
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self._local.conn = (sock, sock.makefile('rb'))
+            setup = []
+            if self.password:
+                setup.append(('AUTH', self.password))
+            if self.db:
+                setup.append(('SELECT', self.db))
+            if setup:
+                self._send(conn, setup)
+        return conn
+
+    @staticmethod
+    def _usable(conn):
+        """False if the server closed an idle connection (or sent something unrequested)"""
+        sock, _ = conn
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _discard(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[0].close()
+            except OSError:
+                pass
+
+    def _send(self, conn, commands):
+        sock, reader = conn
+        sock.sendall(b"".join(encode_command(*command) for command in commands))
+        replies = [read_reply(reader) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    @contextmanager
+    def pinned(self):
+        """Send every pipeline of this thread inside the block on one connection (e.g. WATCH ... EXEC)
+
+        A failure inside the block is raised instead of reconnecting, since connection state such as
+        WATCHed keys would be lost on a new connection.
+        """
+        self._local.pinned = self._connection()
+        try:
+            yield
+        finally:
+            self._local.pinned = None
+
+    def pipeline(self, commands):
+        """Send several commands in one round trip and return their replies
+
+        A connection that fails mid-request is dropped; the commands are sent once more on a fresh
+        connection only if they are all idempotent, otherwise the error is raised to the caller.
+        """
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is not None:
+            try:
+                return self._send(pinned, commands)
+            except (OSError, ConnectionError):
+                self._discard()
+                raise
+        try:
+            conn = self._connection()
+        except OSError:
+            # Nothing was sent yet (e.g. the server is restarting), so one more try is safe
+            conn = self._connection()
+        try:
+            return self._send(conn, commands)
+        except (OSError, ConnectionError):
+            self._discard()
+            if not all(str(command[0]).upper() in IDEMPOTENT_COMMANDS for command in commands):
+                raise
+            return self._send(self._connection(), commands)
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+
+# Optimistic update() transactions retried before giving up on a contended session
+UPDATE_ATTEMPTS = 10
+
+# Messages with exactly these fields are stored as compact [timestamp, sender, text] arrays
+_MESSAGE_FIELDS = ('timestamp', 'sender', 'text')
+
+
+def pack_message(message):
+    if isinstance(message, dict) and tuple(message) == _MESSAGE_FIELDS:
+        message = [message[field] for field in _MESSAGE_FIELDS]
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def unpack_message(data):
+    message = json.loads(data)
+    if isinstance(message, list) and len(message) == len(_MESSAGE_FIELDS):
+        return dict(zip(_MESSAGE_FIELDS, message))
+    return message
+
+
+class RedisSessionStore(MutableMapping):
+    """Session store shared by all worker processes through a Redis-protocol server"""
+
+    def __init__(self, name, client, max_messages=200, ttl_seconds=6 * 3600, prefix='vedas'):
+        self.name = name
+        self.client = client
+        self.max_messages = max_messages
+        self.ttl_seconds = int(ttl_seconds) if ttl_seconds else 0
+        self.prefix = prefix
+        self.on_evict = None
+        self._stats = {'reads': 0, 'writes': 0, 'round_trips': 0, 'update_conflicts': 0, 'expired': 0}
+        # Redis expires sessions on its own; this process only knows when it last saw each one, and
+        # hands sessions unseen for ttl_seconds to on_evict so their in-process state is released
+        self._seen = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _touch(self, session_id):
+        if not self.ttl_seconds:
+            return
+        now = time.monotonic()
+        expired = []
+        with self._seen_lock:
+            self._seen[session_id] = now
+            self._seen.move_to_end(session_id)
+            if now - self._last_sweep > min(60.0, self.ttl_seconds / 10):
+                self._last_sweep = now
+                while self._seen:
+                    oldest, seen_at = next(iter(self._seen.items()))
+                    if now - seen_at <= self.ttl_seconds:
+                        break
+                    del self._seen[oldest]
+                    expired.append(oldest)
+        if expired:
+            self._stats['expired'] += len(expired)
+            if self.on_evict:
+                for expired_id in expired:
+                    self.on_evict(expired_id)
+
+    def _keys(self, session_id):
+        base = f"{self.prefix}:{self.name}"
+        return f"{base}:m:{session_id}", f"{base}:v:{session_id}"
+
+    def _expire(self, key):
+        return [('EXPIRE', key, self.ttl_seconds)] if self.ttl_seconds else []
+
+    def _pipeline(self, commands):
+        self._stats['round_trips'] += 1
+        return self.client.pipeline(commands)
+
+    def _read_commands(self, session_id):
+        messages_key, value_key = self._keys(session_id)
+        return [('GET', value_key), ('LRANGE', messages_key, -self.max_messages if self.max_messages else 0, -1)]
+
+    @staticmethod
+    def _decode(value, history):
+        if value is not None:
+            return json.loads(value)
+        if history:
+            return [unpack_message(item) for item in history]
+        raise KeyError
+
+    def __getitem__(self, session_id):
+        self._touch(session_id)
+        messages_key, value_key = self._keys(session_id)
+        # Value, history and TTL refresh in a single round trip
+        replies = self._pipeline(
+            self._read_commands(session_id) + self._expire(messages_key) + self._expire(value_key)
+        )
+        self._stats['reads'] += 1
+        try:
+            return self._decode(replies[0], replies[1])
+        except KeyError:
+            raise KeyError(session_id) from None
+
+    def __setitem__(self, session_id, value):
+        self._touch(session_id)
+        self._pipeline(self._write_commands(session_id, value))
+        self._stats['writes'] += 1
+
+    def _write_commands(self, session_id, value):
+        messages_key, value_key = self._keys(session_id)
+        commands = [('DEL', messages_key, value_key)]
+        if isinstance(value, list):
+            if self.max_messages:
+                value = value[-self.max_messages:]
+            if value:
+                commands.append(('RPUSH', messages_key, *[pack_message(m) for m in value]))
+                commands += self._expire(messages_key)
+        else:
+            body = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+            commands.append(('SET', value_key, body, 'EX', self.ttl_seconds) if self.ttl_seconds else ('SET', value_key, body))
+        return commands
+
+    def __delitem__(self, session_id):
+        with self._seen_lock:
+            self._seen.pop(session_id, None)
+        if not self._pipeline([('DEL', *self._keys(session_id))])[0]:
+            raise KeyError(session_id)
+
+    def __contains__(self, session_id):
+        self._touch(session_id)
+        return self._pipeline([('EXISTS', *self._keys(session_id))])[0] > 0
+
+    def __iter__(self):
+        seen = set()
+        cursor = '0'
+        pattern = f"{self.prefix}:{self.name}:*"
+        while True:
+            cursor, keys = self._pipeline([('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)])[0]
+            cursor = cursor.decode('utf-8')
+            for key in keys:
+                session_id = key.decode('utf-8').split(':', 3)[3]
+                if session_id not in seen:
+                    seen.add(session_id)
+                    yield session_id
+            if cursor == '0':
+                return
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def extend(self, session_id, messages):
+        """Append messages, trim to max_messages and refresh the TTL in one round trip"""
+        self._touch(session_id)
+        messages_key, _ = self._keys(session_id)
+        commands = [('RPUSH', messages_key, *[pack_message(m) for m in messages])]
+        if self.max_messages:
+            commands.append(('LTRIM', messages_key, -self.max_messages, -1))
+        self._pipeline(commands + self._expire(messages_key))
+        self._stats['writes'] += 1
+
+    def update(self, session_id, fn, default=None):
+        """Atomic read-modify-write of a session value across workers
+
+        Optimistic: the keys are WATCHed while `fn` runs and the write is a MULTI/EXEC transaction,
+        which the server refuses if another client changed the session meanwhile; `fn` is then rerun
+        on the fresh value. WATCH and EXEC go over one pinned connection: if it fails before the
+        transaction is sent the update starts over, after that the error is raised (it may have applied).
+        """
+        self._touch(session_id)
+        keys = self._keys(session_id)
+        for attempt in range(UPDATE_ATTEMPTS):
+            if attempt:
+                # Back off a little so contending workers do not keep invalidating each other
+                time.sleep(random.uniform(0, 0.002 * attempt))
+            with self.client.pinned():
+                try:
+                    replies = self._pipeline([('WATCH', *keys)] + self._read_commands(session_id))
+                except (OSError, ConnectionError):
+                    continue
+                try:
+                    current = self._decode(replies[1], replies[2])
+                except KeyError:
+                    current = default() if default else None
+                try:
+                    value, result = fn(current)
+                except Exception:
+                    self._pipeline([('UNWATCH',)])
+                    raise
+                replies = self._pipeline([('MULTI',)] + self._write_commands(session_id, value) + [('EXEC',)])
+            if replies[-1] is not None:
+                for reply in replies[-1]:
+                    if isinstance(reply, RespError):
+                        raise reply
+                self._stats['writes'] += 1
+                return result
+            self._stats['update_conflicts'] += 1
+        raise RespError(f"update of session {session_id} kept conflicting after {UPDATE_ATTEMPTS} attempts")
+
+    # The server owns memory limits and expiry, so there is nothing to evict locally
+    def oldest(self):
+        return None
+
+    def evict(self, session_id):
+        return False
+
+    def memory_bytes(self):
+        return 0
+
+    def stats(self):
+        return dict(
+            self._stats,
+            backend={'type': 'redis', 'host': self.client.host, 'port': self.client.port, 'db': self.client.db},
+            max_messages=self.max_messages,
+            ttl_seconds=self.ttl_seconds
+        )
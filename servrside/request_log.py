@@ -0,0 +1,155 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Log records are handed to a queue and written to stdout by a listener thread, so request
+# threads never block on the terminal or a log pipe. LOG_FORMAT=text gives one readable line per record.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+# Share of successful requests that get an access log line; errors and slow requests are always logged
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+LOG_SLOW_MS = float(os.getenv('LOG_SLOW_MS', 2000))
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+access_log = logging.getLogger('vedas.access')
+
+_lock = threading.Lock()
+_listener = None
+_queue = None
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def current_request_id():
+    if has_request_context():
+        return g.get('request_id')
+    return None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the ID of the request being handled on this thread"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id() or '-'
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Render message and traceback on the calling thread; only plain values cross the queue
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        if getattr(record, 'request_id', '-') != '-':
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _output_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'text':
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue, _output_handler(), respect_handler_level=False)
+    _listener.start()
+
+
+def setup():
+    """Route the root logger through a non-blocking queue; safe to call more than once"""
+    global _queue
+    with _lock:
+        if _queue is not None:
+            return
+        _queue = queue.SimpleQueue()
+        handler = _QueueHandler(_queue)
+        handler.addFilter(RequestIdFilter())
+        root = logging.getLogger()
+        root.handlers[:] = [handler]
+        root.setLevel(LOG_LEVEL)
+        _start_listener()
+        atexit.register(lambda: _listener and _listener.stop())
+
+
+def restart_after_fork():
+    """The listener thread does not survive fork; a forked worker starts its own"""
+    with _lock:
+        if _queue is not None:
+            _start_listener()
+
+
+def _start_request():
+    g.log_started = time.perf_counter()
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex[:16]
+
+
+def _log_request(response):
+    started = g.get('log_started')
+    if started is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    duration_ms = (time.perf_counter() - started) * 1000
+    status = response.status_code
+    if status >= 400 or duration_ms >= LOG_SLOW_MS or random.random() < LOG_SAMPLE_RATE:
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        access_log.log(level, '%s %s %s', request.method, request.path, status, extra={
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(duration_ms, 1),
+            'bytes': response.calculate_content_length(),
+            'sampled': status < 400 and duration_ms < LOG_SLOW_MS,
+        })
+    return response
+
+
+def install(app):
+    """Structured logging plus a request ID and a sampled access log line for every request of `app`"""
+    setup()
+    app.before_request(_start_request)
+    app.after_request(_log_request)
+    return app
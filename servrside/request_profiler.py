@@ -0,0 +1,153 @@
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+import background_tasks
+import request_log
+
+log = logging.getLogger(__name__)
+
+# Production requests are profiled when they send X-Profile: <PROFILE_TOKEN> (or ?profile=<PROFILE_TOKEN>)
+# and, if PROFILE_SAMPLE_RATE > 0, for that share of API requests. Without a token and a rate nothing is profiled.
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# 'pstats' writes cProfile stats (snakeviz, pstats); 'collapsed' writes sampled stacks for flamegraph.pl / speedscope
+PROFILE_FORMAT = os.getenv('PROFILE_FORMAT', 'pstats').lower()
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_PATH_PREFIX = os.getenv('PROFILE_PATH_PREFIX', '/api/')
+
+PROFILE_HEADER = 'X-Profile'
+
+# cProfile can only be active once per process, so profiled requests run one at a time
+_active = threading.Lock()
+
+
+class StackSampler:
+    """Samples one thread's stack every interval and counts the collapsed stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _requested():
+    supplied = request.headers.get(PROFILE_HEADER) or request.args.get('profile')
+    return bool(PROFILE_TOKEN and supplied and hmac.compare_digest(supplied, PROFILE_TOKEN))
+
+
+def _start_profile():
+    if not request.path.startswith(PROFILE_PATH_PREFIX):
+        return
+    requested = _requested()
+    if not requested and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        return
+    if not _active.acquire(blocking=False):
+        return
+    if PROFILE_FORMAT == 'collapsed':
+        profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler (e.g. a debugger) already holds the hook
+            _active.release()
+            return
+    g.profile = {'profiler': profiler, 'started': time.perf_counter(), 'requested': requested}
+
+
+def _file_name(duration_ms):
+    path = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+    extension = 'collapsed' if PROFILE_FORMAT == 'collapsed' else 'prof'
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return f"{stamp}-{path}-{request_log.current_request_id() or os.getpid()}-{duration_ms:.0f}ms.{extension}"
+
+
+def _write(profiler, file_name):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, file_name)
+        if isinstance(profiler, StackSampler):
+            with open(path, 'w') as f:
+                f.write(profiler.collapsed())
+        else:
+            profiler.dump_stats(path)
+        log.info("Wrote request profile %s", path)
+    except Exception:
+        log.exception("Could not write request profile %s", file_name)
+
+
+def _halt(profiler):
+    try:
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+    finally:
+        _active.release()
+
+
+def _stop_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profiler = profile['profiler']
+    _halt(profiler)
+    file_name = _file_name((time.perf_counter() - profile['started']) * 1000)
+    # Writing the file is left to a background thread; the client learns its name right away
+    background_tasks.submit(_write, profiler, file_name)
+    if profile['requested']:
+        response.headers['X-Profile-File'] = file_name
+    return response
+
+
+def _abandon_profile(exc):
+    # after_request is skipped when a request fails before a response exists
+    profile = g.pop('profile', None)
+    if profile is not None:
+        _halt(profile['profiler'])
+
+
+def install(app):
+    """Profile guarded or sampled requests of `app`; a no-op unless PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set"""
+    if not PROFILE_TOKEN and not PROFILE_SAMPLE_RATE:
+        return app
+    # Outermost hooks, so the profile covers the other request hooks (logging, compression) as well
+    app.before_request_funcs.setdefault(None, []).insert(0, _start_profile)
+    app.after_request_funcs.setdefault(None, []).insert(0, _stop_profile)
+    app.teardown_request(_abandon_profile)
+    return app
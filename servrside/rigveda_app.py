@@ -1,14 +1,26 @@
 from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
-import faiss
 import numpy as np
 import pickle
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import logging
+import time
 from datetime import datetime
 import uuid
+import background_tasks
+import quiz_bank
+import faq_store
+import http_cache
+import json_responses
+import metrics
+import prompt_budget
+import request_log
+import session_store
+import startup_profile
+
+log = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -16,38 +28,71 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+request_log.install(app)
+json_responses.install(app)
 
-# Initialize OpenAI client
-client = OpenAI()
+# OpenAI client, created by init()
+client = None
 
 # Global variables for loaded data
 index = None
 verses = None
 
-# In-memory conversation storage (in production, use a proper database)
-conversations = {}
-user_quiz_states = {}
+# Bounded session storage (message caps, idle TTL and LRU eviction under a memory budget),
+# optionally persisted (SESSION_BACKEND=sqlite) or shared between workers (SESSION_BACKEND=redis)
+conversations = session_store.create_store('rigveda', 'conversations')
+user_quiz_states = session_store.create_store('rigveda', 'quiz_states')
+
+# Bump when the tutor prompt changes so precomputed FAQ answers are rebuilt
+PROMPT_VERSION = "1"
 
 def load_data():
     """Load the FAISS index and verses metadata"""
     global index, verses
     try:
+        with startup_profile.phase('imports faiss', 'rigveda'):
+            import faiss
         # Adjust paths according to your file structure
-        index = faiss.read_index("./databse/rigveda.index")
-        with open("./databse/rigveda_meta.pkl", "rb") as f:
-            verses = pickle.load(f)
-        print("✅ Index and metadata loaded successfully")
+        with startup_profile.phase('index read', 'rigveda'):
+            index = faiss.read_index("./databse/rigveda.index")
+        with startup_profile.phase('metadata load', 'rigveda'):
+            with open("./databse/rigveda_meta.pkl", "rb") as f:
+                verses = pickle.load(f)
+            # Token counts normally come with the verse store (build_token_counts.py)
+            prompt_budget.ensure_token_counts(verses)
+        log.info("Index and metadata loaded successfully")
         return True
     except Exception as e:
-        print(f"❌ Error loading data: {e}")
+        log.error("Error loading data: %s", e)
+        return False
+
+def init():
+    """Create the OpenAI client and load the index; nothing heavy happens at import time"""
+    global client
+    if client is None:
+        with startup_profile.phase('imports openai', 'rigveda'):
+            from openai import OpenAI
+        with startup_profile.phase('client setup', 'rigveda'):
+            client = OpenAI()
+    if index is None and not load_data():
+        log.warning("Could not load data files. Make sure rigveda.index and rigveda_meta.pkl exist in ./database/ directory")
         return False
+    return True
+
+def unload_data():
+    """Release the FAISS index and verses metadata (load_data() brings them back)"""
+    global index, verses
+    index = None
+    verses = None
 
 def embed(texts):
     """Create embeddings using OpenAI"""
-    response = client.embeddings.create(
-        model="text-embedding-3-large",
-        input=texts
-    )
+    with metrics.stage('rigveda', 'embed'):
+        response = client.embeddings.create(
+            model="text-embedding-3-large",
+            input=texts
+        )
+    metrics.record_usage('rigveda', 'embed', response)
     return np.array([d.embedding for d in response.data], dtype="float32")
 
 def search(query, topk=5):
@@ -55,10 +100,16 @@ def search(query, topk=5):
     if index is None or verses is None:
         raise Exception("Index not loaded")
     
+    # Hard cap, whatever the client asked for: prompt size (and latency) grows with every verse
+    topk = prompt_budget.cap_topk(topk)
     q = embed([query])
-    D, I = index.search(q, topk)
+    with metrics.stage('rigveda', 'search'):
+        D, I = index.search(q, topk)
     return [(verses[i], float(D[0][j])) for j, i in enumerate(I[0])]
 
+# Prompt labels per message sender (older turns are folded into a 'summary' message)
+SPEAKERS = {'user': 'User', 'summary': 'Summary of earlier conversation'}
+
 def extract_topics_from_conversation(conversation_history):
     """Extract main topics discussed in the conversation using GPT"""
     if not conversation_history or len(conversation_history) < 2:
@@ -67,7 +118,7 @@ def extract_topics_from_conversation(conversation_history):
     # Get recent conversation for topic extraction
     recent_messages = conversation_history[-6:]  # Last 6 messages
     context = "\n".join([
-        f"{'User' if msg['sender'] == 'user' else 'Tutor'}: {msg['text']}" 
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" 
         for msg in recent_messages
     ])
     
@@ -84,26 +135,39 @@ Agni, fire rituals, Indra, creation myths, dharma, soma, hymns, cosmic order
 Topics discussed:"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": topic_extraction_prompt}],
-            max_tokens=100,
-            temperature=0.3
-        )
+        with metrics.stage('rigveda', 'topic_extraction'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": topic_extraction_prompt}],
+                max_tokens=100,
+                temperature=0.3
+            )
+        metrics.record_usage('rigveda', 'topics', response)
         
         topics_text = response.choices[0].message.content.strip()
         topics = [topic.strip() for topic in topics_text.split(',') if topic.strip()]
         return topics[:5]  # Max 5 topics
         
     except Exception as e:
-        print(f"Error extracting topics: {e}")
+        log.error("Error extracting topics: %s", e)
+        metrics.fallback('rigveda', 'topic_extraction')
         return []
 
-def generate_mcq_quiz(topics, conversation_context):
+# Topics are kept fresh per session in the background after each answer
+topic_tracker = background_tasks.TopicTracker('rigveda', extract_topics_from_conversation)
+
+def generate_mcq_quiz(topics, conversation_context, use_bank=True):
     """Generate MCQ quiz based on discussed topics"""
     if not topics:
         return None
     
+    # Serve from the precomputed question bank when it covers these topics
+    if use_bank:
+        bank_quiz = quiz_bank.sample('rigveda', topics)
+        if bank_quiz:
+            metrics.cache_hit('rigveda', 'quiz_bank')
+            return bank_quiz
+    
     topics_str = ", ".join(topics)
     
     quiz_prompt = f"""
@@ -139,12 +203,14 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
 """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": quiz_prompt}],
-            temperature=0.7,
-            max_tokens=800
-        )
+        with metrics.stage('rigveda', 'quiz_generation'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": quiz_prompt}],
+                temperature=0.7,
+                max_tokens=800
+            )
+        metrics.record_usage('rigveda', 'quiz', response)
         
         quiz_text = response.choices[0].message.content.strip()
         # Remove potential markdown formatting
@@ -157,66 +223,85 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
         return quiz_data
         
     except Exception as e:
-        print(f"Error generating quiz: {e}")
+        log.error("Error generating quiz: %s", e)
+        metrics.fallback('rigveda', 'quiz_generation')
         return None
 
-def should_trigger_quiz(session_id):
-    """Check if quiz should be triggered based on conversation count"""
-    if session_id not in user_quiz_states:
-        user_quiz_states[session_id] = {
-            'message_count': 0,
-            'last_quiz_at': 0,
-            'quiz_frequency': 3  # Every 3 meaningful exchanges (reduced from 4)
-        }
-    
-    state = user_quiz_states[session_id]
-    state['message_count'] += 1
-    
-    # Trigger quiz every 3 meaningful exchanges
-    if state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']:
-        state['last_quiz_at'] = state['message_count']
-        return True
-    
-    return False
+# The next quiz is prepared in the background one exchange before it is due
+quiz_prefetcher = background_tasks.QuizPrefetcher(topic_tracker.veda, topic_tracker, generate_mcq_quiz)
+
+def forget_session(session_id):
+    """Drop background state of a session evicted from the conversation store"""
+    topic_tracker.forget(session_id)
+    quiz_prefetcher.forget(session_id)
 
-def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None):
-    """Get answer using RAG with conversation tracking"""
+conversations.on_evict = forget_session
+
+def summarize_conversation(previous_summary, messages):
+    """Fold older messages into the rolling summary of a long conversation"""
+    transcript = "\n".join(
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" for msg in messages
+    )
     
-    if is_intro:
-        # Special introduction message
-        intro_response = """
-🕉️ **Namaste and welcome, dear seeker of wisdom!** 🕉️
+    summary_prompt = f"""
+Update the running summary of this Rigveda tutoring conversation.
 
-I am your passionate Rigveda tutor, and I'm absolutely thrilled that you've chosen to embark on this incredible journey into the world's oldest sacred text! The Rigveda is like a magnificent treasure chest filled with 3,500-year-old wisdom, beautiful hymns, and profound insights about life, nature, and the divine.
+Summary so far:
+{previous_summary or "(none)"}
 
-Think of me as your friendly guide who will help you understand these ancient Sanskrit verses in the simplest way possible - whether you're 8 or 80 years old! 
+New messages:
+{transcript}
 
-**What would you love to explore today?** Here are some fascinating topics we could dive into:
+Write the updated summary in at most 120 words. Keep the topics, deities, concepts and verses discussed and any questions the student still has.
 
-🔥 **Fire & Agni** - Learn about the sacred fire god who connects earth and heaven
-⚡ **Indra the Mighty** - Discover the thunder god who defeats demons and brings rain  
-🌙 **Soma & Sacred Rituals** - Understand the mysterious divine drink and ceremonies
-🌍 **Creation Stories** - Explore how the universe began according to Rigvedic seers
-🎵 **Hymns & Poetry** - Appreciate the beautiful language and metaphors
-⚖️ **Dharma & Ethics** - Learn about righteous living and moral principles
+Updated summary:"""
+    
+    with metrics.stage('rigveda', 'summary'):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": summary_prompt}],
+            max_tokens=220,
+            temperature=0.2
+        )
+    metrics.record_usage('rigveda', 'summary', response)
+    return response.choices[0].message.content.strip()
 
-Just click on any topic above, or feel free to ask me anything that sparks your curiosity! I love questions like "Why is fire so important?" or "What makes Rigveda special?" - no question is too simple or too complex!
+# Long conversations keep a constant size: older turns are summarized in the background
+conversation_summarizer = background_tasks.ConversationSummarizer('rigveda', conversations, summarize_conversation)
 
-**What shall we discover together today?** 🌟
-"""
-        return intro_response, [], False
+def should_trigger_quiz(session_id, state=None):
+    """Check if quiz should be triggered based on conversation count (or on `state` carried by a session token)"""
+    def advance(state):
+        state['message_count'] += 1
+        
+        # Trigger quiz every 3 meaningful exchanges
+        triggered = state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']
+        if triggered:
+            state['last_quiz_at'] = state['message_count']
+        return state, triggered
     
-    # Initialize conversation tracking
-    if session_id and session_id not in conversations:
-        conversations[session_id] = []
+    if state is not None:
+        return advance(state)[1]
     
+    # Atomic read-modify-write, so concurrent requests of one session cannot lose a count
+    return user_quiz_states.update(session_id, advance, default=lambda: {
+        'message_count': 0,
+        'last_quiz_at': 0,
+        'quiz_frequency': 3  # Every 3 meaningful exchanges (reduced from 4)
+    })
+
+def rag_answer(query, topk=5, model="gpt-4o-mini"):
+    """Retrieve relevant verses and generate the tutor's answer"""
     # 1. Retrieve relevant verses
     results = search(query, topk=topk)
+    prompt_started = time.perf_counter()
     
-    # 2. Create context
+    # 2. Create context, best verses first within the prompt token budget
+    fitted = prompt_budget.fit(results)
+    results = [(r, score) for r, score, _ in fitted]
     context = "\n".join([
-        f"RV {r['mandala']}.{r['sukta']}.{r['verse']}: {r['text_sa']}"
-        for r, _ in results
+        f"RV {r['mandala']}.{r['sukta']}.{r['verse']}: {text}"
+        for r, _, text in fitted
     ])
     
     # 3. Create engaging tutor prompt
@@ -252,66 +337,116 @@ Relevant Rigvedic Verses:
 Provide your enthusiastic, educational response:
 """
     
+    metrics.observe('rigveda', 'prompt_build', time.perf_counter() - prompt_started)
+    
     # 4. Get response from OpenAI
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
+    with metrics.stage('rigveda', 'completion'):
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+    metrics.record_usage('rigveda', 'answer', response)
     
     answer = response.choices[0].message.content
     
+    return answer, results
+
+def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None, with_scores=False):
+    """Get answer using RAG with conversation tracking (verses as (verse, FAISS distance) pairs if with_scores)"""
+    
+    if is_intro:
+        # Special introduction message
+        intro_response = """
+🕉️ **Namaste and welcome, dear seeker of wisdom!** 🕉️
+
+I am your passionate Rigveda tutor, and I'm absolutely thrilled that you've chosen to embark on this incredible journey into the world's oldest sacred text! The Rigveda is like a magnificent treasure chest filled with 3,500-year-old wisdom, beautiful hymns, and profound insights about life, nature, and the divine.
+
+Think of me as your friendly guide who will help you understand these ancient Sanskrit verses in the simplest way possible - whether you're 8 or 80 years old! 
+
+**What would you love to explore today?** Here are some fascinating topics we could dive into:
+
+🔥 **Fire & Agni** - Learn about the sacred fire god who connects earth and heaven
+⚡ **Indra the Mighty** - Discover the thunder god who defeats demons and brings rain  
+🌙 **Soma & Sacred Rituals** - Understand the mysterious divine drink and ceremonies
+🌍 **Creation Stories** - Explore how the universe began according to Rigvedic seers
+🎵 **Hymns & Poetry** - Appreciate the beautiful language and metaphors
+⚖️ **Dharma & Ethics** - Learn about righteous living and moral principles
+
+Just click on any topic above, or feel free to ask me anything that sparks your curiosity! I love questions like "Why is fire so important?" or "What makes Rigveda special?" - no question is too simple or too complex!
+
+**What shall we discover together today?** 🌟
+"""
+        return intro_response, [], False
+    
+    # Initialize conversation tracking
+    if session_id and session_id not in conversations:
+        conversations[session_id] = []
+    
+    # Canonical intro/FAQ questions are answered from the offline-built store
+    cached = faq_store.lookup('rigveda', PROMPT_VERSION, query)
+    if cached:
+        metrics.cache_hit('rigveda', 'faq')
+        answer, results = cached['answer'], [(v, None) for v in cached['verses']]
+    else:
+        answer, results = rag_answer(query, topk=topk, model=model)
+    
     # 5. Track conversation and check for quiz trigger
     quiz_triggered = False
     if session_id:
         # Add to conversation history
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'user',
-            'text': query
-        })
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'bot',
-            'text': answer
-        })
+        conversations.extend(session_id, [
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'user',
+                'text': query
+            },
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'bot',
+                'text': answer
+            }
+        ])
+        
+        # Refresh the session's topics and fold older turns off the request path
+        history = conversations[session_id]
+        topic_tracker.refresh(session_id, history)
+        conversation_summarizer.maybe_fold(session_id, history)
         
         # Check if quiz should be triggered
         quiz_triggered = should_trigger_quiz(session_id)
+        
+        # Start preparing the quiz when the session is one exchange away from it
+        state = user_quiz_states[session_id]
+        if state['message_count'] - state['last_quiz_at'] == state['quiz_frequency'] - 1:
+            quiz_prefetcher.start(session_id, history)
+        else:
+            quiz_prefetcher.touch(session_id)
     
-    return answer, [r for r, _ in results], quiz_triggered
-
-# Load data when the app starts
-if not load_data():
-    print("Warning: Could not load data files. Make sure rigveda.index and rigveda_meta.pkl exist in ./database/ directory")
+    return answer, (results if with_scores else [r for r, _ in results]), quiz_triggered
 
 @app.route('/')
 def home():
     """Serve the frontend"""
-    try:
-        # Try to serve from templates/rigveda/ directory
-        with open('templates/rigveda/index.html', 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        try:
-            # Fallback to templates/ directory
-            with open('templates/index.html', 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            return """
-            <h1>🔥 Rigveda Chatbot Backend with Quiz Feature</h1>
-            <p>Backend is running! Please create the frontend file at:</p>
-            <ul>
-                <li><code>templates/rigveda/index.html</code> - Recommended location</li>
-                <li><code>templates/index.html</code> - Fallback location</li>
-            </ul>
-            <p>API endpoints:</p>
-            <ul>
-                <li>POST /api/rigveda/ask - For chat functionality</li>
-                <li>POST /api/rigveda/generate-quiz - For quiz generation</li>
-                <li>POST /api/rigveda/submit-quiz - For quiz submission</li>
-                <li>GET /api/health - Health check</li>
-            </ul>
-            """
+    # Try templates/rigveda/ first, then the templates/ directory (kept in memory, precompressed)
+    page = http_cache.cached_page('templates/rigveda/index.html', 'templates/index.html')
+    if page:
+        return http_cache.file_response(page)
+    
+    return """
+    <h1>🔥 Rigveda Chatbot Backend with Quiz Feature</h1>
+    <p>Backend is running! Please create the frontend file at:</p>
+    <ul>
+        <li><code>templates/rigveda/index.html</code> - Recommended location</li>
+        <li><code>templates/index.html</code> - Fallback location</li>
+    </ul>
+    <p>API endpoints:</p>
+    <ul>
+        <li>POST /api/rigveda/ask - For chat functionality</li>
+        <li>POST /api/rigveda/generate-quiz - For quiz generation</li>
+        <li>POST /api/rigveda/submit-quiz - For quiz submission</li>
+        <li>GET /api/health - Health check</li>
+    </ul>
+    """
 
 # Fixed API endpoints to match the main platform expectations
 @app.route('/api/rigveda/ask', methods=['POST'])
@@ -322,7 +457,7 @@ def api_ask():
         query = data.get('query', '').strip()
         topk = data.get('topk', 5)
         is_intro = data.get('is_intro', False)
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
         if not query and not is_intro:
             return jsonify({'error': 'Query is required'}), 400
@@ -354,7 +489,7 @@ def api_ask():
         })
         
     except Exception as e:
-        print(f"Error in API: {e}")
+        log.exception("Error in API: %s", e)
         return jsonify({'error': 'Internal server error occurred'}), 500
 
 @app.route('/api/rigveda/generate-quiz', methods=['POST'])
@@ -362,13 +497,22 @@ def api_generate_quiz():
     """API endpoint for generating quiz"""
     try:
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
         if session_id not in conversations:
             return jsonify({'error': 'No conversation history found'}), 400
         
-        # Extract topics from conversation
-        topics = extract_topics_from_conversation(conversations[session_id])
+        # Serve the quiz prepared ahead of time when there is one
+        prepared = quiz_prefetcher.take(session_id)
+        if prepared:
+            return jsonify({
+                'quiz': prepared['quiz'],
+                'topics': prepared['topics'],
+                'session_id': session_id
+            })
+        
+        # Use the topics extracted in the background, extracting now only if there are none yet
+        topics = topic_tracker.get(session_id) or extract_topics_from_conversation(conversations[session_id])
         
         if not topics:
             return jsonify({'error': 'No topics found in conversation'}), 400
@@ -386,7 +530,7 @@ def api_generate_quiz():
         })
         
     except Exception as e:
-        print(f"Error generating quiz: {e}")
+        log.exception("Error generating quiz: %s", e)
         return jsonify({'error': 'Failed to generate quiz'}), 500
 
 @app.route('/api/rigveda/submit-quiz', methods=['POST'])
@@ -394,7 +538,7 @@ def api_submit_quiz():
     """API endpoint for submitting quiz answers"""
     try:
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         answers = data.get('answers', {})
         quiz_questions = data.get('quiz_questions', [])
         
@@ -442,7 +586,7 @@ def api_submit_quiz():
         })
         
     except Exception as e:
-        print(f"Error submitting quiz: {e}")
+        log.exception("Error submitting quiz: %s", e)
         return jsonify({'error': 'Failed to submit quiz'}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -458,6 +602,7 @@ def health_check():
     return jsonify(status)
 
 if __name__ == '__main__':
+    init()
     print("🚀 Starting Rigveda Chatbot Server with Quiz Feature...")
     print("📚 Make sure your database files are in ./database/ directory")
     print("🌐 Frontend will be available at http://localhost:5001")
@@ -1,14 +1,26 @@
 from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
-import faiss
 import numpy as np
 import pickle
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import logging
+import time
 from datetime import datetime
 import uuid
+import background_tasks
+import quiz_bank
+import faq_store
+import http_cache
+import json_responses
+import metrics
+import prompt_budget
+import request_log
+import session_store
+import startup_profile
+
+log = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -16,17 +28,23 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+request_log.install(app)
+json_responses.install(app)
 
-# Initialize OpenAI client
-client = OpenAI()
+# OpenAI client, created by init()
+client = None
 
 # Global variables for loaded data
 index = None
 verses = None
 
-# In-memory conversation storage (in production, use a proper database)
-conversations = {}
-user_quiz_states = {}
+# Bounded session storage (message caps, idle TTL and LRU eviction under a memory budget),
+# optionally persisted (SESSION_BACKEND=sqlite) or shared between workers (SESSION_BACKEND=redis)
+conversations = session_store.create_store('samaveda', 'conversations')
+user_quiz_states = session_store.create_store('samaveda', 'quiz_states')
+
+# Bump when the tutor prompt changes so precomputed FAQ answers are rebuilt
+PROMPT_VERSION = "1"
 
 def load_data():
     """Load the FAISS index and verses metadata"""
@@ -43,30 +61,58 @@ def load_data():
         for index_path, meta_path in possible_paths:
             try:
                 if os.path.exists(index_path) and os.path.exists(meta_path):
-                    index = faiss.read_index(index_path)
-                    with open(meta_path, "rb") as f:
-                        verses = pickle.load(f)
-                    print(f"✅ Samaveda index and metadata loaded successfully from {index_path}")
+                    with startup_profile.phase('imports faiss', 'samaveda'):
+                        import faiss
+                    with startup_profile.phase('index read', 'samaveda'):
+                        index = faiss.read_index(index_path)
+                    with startup_profile.phase('metadata load', 'samaveda'):
+                        with open(meta_path, "rb") as f:
+                            verses = pickle.load(f)
+                        # Token counts normally come with the verse store (build_token_counts.py)
+                        prompt_budget.ensure_token_counts(verses)
+                    log.info("Samaveda index and metadata loaded successfully from %s", index_path)
                     return True
             except Exception as e:
                 continue
         
-        print("⚠ Could not find database files in any expected location")
+        log.warning("Could not find database files in any expected location")
         return False
     except Exception as e:
-        print(f"⚠ Error loading data: {e}")
+        log.error("Error loading data: %s", e)
+        return False
+
+def init():
+    """Create the OpenAI client and load the index; nothing heavy happens at import time"""
+    global client
+    if client is None:
+        with startup_profile.phase('imports openai', 'samaveda'):
+            from openai import OpenAI
+        with startup_profile.phase('client setup', 'samaveda'):
+            client = OpenAI()
+    if index is None and not load_data():
+        log.warning("Could not load data files. App will run with limited functionality.")
         return False
+    return True
+
+def unload_data():
+    """Release the FAISS index and verses metadata (load_data() brings them back)"""
+    global index, verses
+    index = None
+    verses = None
 
 def embed(texts):
     """Create embeddings using OpenAI"""
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=texts
-        )
+        with metrics.stage('samaveda', 'embed'):
+            response = client.embeddings.create(
+                model="text-embedding-3-large",
+                input=texts
+            )
+        metrics.record_usage('samaveda', 'embed', response)
         return np.array([d.embedding for d in response.data], dtype="float32")
     except Exception as e:
-        print(f"Error creating embeddings: {e}")
+        log.error("Error creating embeddings: %s", e)
+        metrics.fallback('samaveda', 'embed')
         # Fallback with dummy embeddings for testing
         return np.random.rand(len(texts) if isinstance(texts, list) else 1, 3072).astype("float32")
 
@@ -75,10 +121,16 @@ def search(query, topk=5):
     if index is None or verses is None:
         raise Exception("Index not loaded")
     
+    # Hard cap, whatever the client asked for: prompt size (and latency) grows with every verse
+    topk = prompt_budget.cap_topk(topk)
     q = embed([query])
-    D, I = index.search(q, topk)
+    with metrics.stage('samaveda', 'search'):
+        D, I = index.search(q, topk)
     return [(verses[i], float(D[0][j])) for j, i in enumerate(I[0])]
 
+# Prompt labels per message sender (older turns are folded into a 'summary' message)
+SPEAKERS = {'user': 'User', 'summary': 'Summary of earlier conversation'}
+
 def extract_topics_from_conversation(conversation_history):
     """Extract main topics discussed in the conversation using GPT"""
     if not conversation_history or len(conversation_history) < 2:
@@ -87,7 +139,7 @@ def extract_topics_from_conversation(conversation_history):
     # Get recent conversation for topic extraction
     recent_messages = conversation_history[-8:]  # Last 8 messages for better context
     context = "\n".join([
-        f"{'User' if msg['sender'] == 'user' else 'Tutor'}: {msg['text']}" 
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" 
         for msg in recent_messages
     ])
     
@@ -106,12 +158,14 @@ If no specific topics are clear, use: sacred chanting, musical notation, soma ri
 Topics discussed:"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": topic_extraction_prompt}],
-            max_tokens=100,
-            temperature=0.3
-        )
+        with metrics.stage('samaveda', 'topic_extraction'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": topic_extraction_prompt}],
+                max_tokens=100,
+                temperature=0.3
+            )
+        metrics.record_usage('samaveda', 'topics', response)
         
         topics_text = response.choices[0].message.content.strip()
         topics = [topic.strip() for topic in topics_text.split(',') if topic.strip()]
@@ -123,14 +177,64 @@ Topics discussed:"""
         return topics[:5]  # Max 5 topics
         
     except Exception as e:
-        print(f"Error extracting topics: {e}")
+        log.error("Error extracting topics: %s", e)
+        metrics.fallback('samaveda', 'topic_extraction')
         return ["sacred chanting", "musical notation", "soma rituals"]  # Return default topics on error
 
-def generate_mcq_quiz(topics, conversation_context):
+# Hand-written quiz used when generation fails (also seeds the offline quiz bank)
+FALLBACK_QUIZ = {
+    "questions": [
+        {
+            "question": "What is the primary focus of Samaveda?",
+            "options": {
+                "A": "Historical narratives",
+                "B": "Musical chants and melodies for rituals",
+                "C": "Philosophical discussions",
+                "D": "Legal codes"
+            },
+            "correct_answer": "B",
+            "explanation": "Samaveda primarily contains musical chants and melodies derived from Rigveda verses for use in sacrificial rituals."
+        },
+        {
+            "question": "What does 'Udgitha' refer to in Samaveda?",
+            "options": {
+                "A": "A type of musical instrument",
+                "B": "The loudly sung portions of chants",
+                "C": "Temple architecture",
+                "D": "Written musical notation"
+            },
+            "correct_answer": "B",
+            "explanation": "Udgitha refers to the loudly sung portions of Samavedic chants, particularly the sacred 'OM' sound."
+        },
+        {
+            "question": "Who were the Udgatri priests?",
+            "options": {
+                "A": "Temple builders",
+                "B": "Fire altar constructors",
+                "C": "The singing priests who performed Samavedic chants",
+                "D": "Manuscript writers"
+            },
+            "correct_answer": "C",
+            "explanation": "Udgatri priests were the specialized singing priests responsible for performing the melodious chants of Samaveda during rituals."
+        }
+    ]
+}
+
+# Topics are kept fresh per session in the background after each answer
+topic_tracker = background_tasks.TopicTracker('samaveda', extract_topics_from_conversation)
+
+def generate_mcq_quiz(topics, conversation_context, use_bank=True):
     """Generate MCQ quiz based on discussed topics"""
     if not topics:
         topics = ["sacred chanting", "musical notation", "soma rituals"]
     
+    # Serve from the precomputed question bank when it covers these topics
+    if use_bank:
+        bank_quiz = quiz_bank.sample('samaveda', topics)
+        if bank_quiz:
+            metrics.cache_hit('samaveda', 'quiz_bank')
+            return bank_quiz
+    
     topics_str = ", ".join(topics)
     
     quiz_prompt = f"""
@@ -189,12 +293,14 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
 """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": quiz_prompt}],
-            temperature=0.7,
-            max_tokens=1200
-        )
+        with metrics.stage('samaveda', 'quiz_generation'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": quiz_prompt}],
+                temperature=0.7,
+                max_tokens=1200
+            )
+        metrics.record_usage('samaveda', 'quiz', response)
         
         quiz_text = response.choices[0].message.content.strip()
         
@@ -222,97 +328,76 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
         return quiz_data
         
     except Exception as e:
-        print(f"Error generating quiz: {e}")
+        log.error("Error generating quiz: %s", e)
+        metrics.fallback('samaveda', 'quiz_generation')
         # Return a fallback quiz
-        return {
-            "questions": [
-                {
-                    "question": "What is the primary focus of Samaveda?",
-                    "options": {
-                        "A": "Historical narratives",
-                        "B": "Musical chants and melodies for rituals",
-                        "C": "Philosophical discussions",
-                        "D": "Legal codes"
-                    },
-                    "correct_answer": "B",
-                    "explanation": "Samaveda primarily contains musical chants and melodies derived from Rigveda verses for use in sacrificial rituals."
-                },
-                {
-                    "question": "What does 'Udgitha' refer to in Samaveda?",
-                    "options": {
-                        "A": "A type of musical instrument",
-                        "B": "The loudly sung portions of chants",
-                        "C": "Temple architecture",
-                        "D": "Written musical notation"
-                    },
-                    "correct_answer": "B",
-                    "explanation": "Udgitha refers to the loudly sung portions of Samavedic chants, particularly the sacred 'OM' sound."
-                },
-                {
-                    "question": "Who were the Udgatri priests?",
-                    "options": {
-                        "A": "Temple builders",
-                        "B": "Fire altar constructors",
-                        "C": "The singing priests who performed Samavedic chants",
-                        "D": "Manuscript writers"
-                    },
-                    "correct_answer": "C",
-                    "explanation": "Udgatri priests were the specialized singing priests responsible for performing the melodious chants of Samaveda during rituals."
-                }
-            ]
-        }
+        return FALLBACK_QUIZ
 
-def should_trigger_quiz(session_id):
-    """Check if quiz should be triggered based on conversation count"""
-    if session_id not in user_quiz_states:
-        user_quiz_states[session_id] = {
-            'message_count': 0,
-            'last_quiz_at': 0,
-            'quiz_frequency': 3  # Every 3 meaningful exchanges (matching Yajurveda)
-        }
-    
-    state = user_quiz_states[session_id]
-    state['message_count'] += 1
-    
-    # Trigger quiz every 3 meaningful exchanges
-    if state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']:
-        state['last_quiz_at'] = state['message_count']
-        return True
-    
-    return False
+# The next quiz is prepared in the background one exchange before it is due
+quiz_prefetcher = background_tasks.QuizPrefetcher(topic_tracker.veda, topic_tracker, generate_mcq_quiz)
 
-def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None):
-    """Get answer using RAG with conversation tracking"""
-    
-    if is_intro:
-        # Special introduction message for Samaveda
-        intro_response = """
-🎵 **Namaste and welcome, dear music lover and seeker of sacred sounds!** 🎵
+def forget_session(session_id):
+    """Drop background state of a session evicted from the conversation store"""
+    topic_tracker.forget(session_id)
+    quiz_prefetcher.forget(session_id)
 
-I am your passionate Samaveda tutor, and I'm absolutely delighted that you've chosen to explore the most melodious of all Vedas! The Samaveda is like a divine symphony hall where ancient priests transformed Rigvedic verses into beautiful chants and melodies that could touch the very heavens.
+conversations.on_evict = forget_session
 
-Think of me as your musical guide who will help you understand these sacred songs, their rhythms, and their spiritual power - whether you're interested in music, spirituality, or ancient Indian culture!
+def summarize_conversation(previous_summary, messages):
+    """Fold older messages into the rolling summary of a long conversation"""
+    transcript = "\n".join(
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" for msg in messages
+    )
+    
+    summary_prompt = f"""
+Update the running summary of this Samaveda tutoring conversation.
 
-**What musical journey shall we embark on today?** Here are some fascinating topics we could explore:
+Summary so far:
+{previous_summary or "(none)"}
 
-🎶 **Sacred Chanting** - Learn about the art of Vedic singing and vocal techniques
-🎼 **Musical Notation** - Discover how ancient melodies were preserved and transmitted  
-🔥 **Soma Rituals** - Understand the ceremonial context of Samaveda chants
-🎵 **Udgitha Practice** - Explore the most sacred of all chants: "OM"
-👨‍🎤 **Priest Traditions** - Meet the Udgatri priests, the ancient chanters
-🎹 **Melody Patterns** - Learn about ragas and musical structures in Samaveda
-🎭 **Ritual Performance** - Discover how chants were used in sacrificial ceremonies
+New messages:
+{transcript}
 
-Just click on any topic above, or ask me anything that sparks your musical curiosity! I love questions like "How did ancient priests learn melodies?" or "What makes Samaveda different from other Vedas?" - no question is too simple or too complex!
+Write the updated summary in at most 120 words. Keep the topics, deities, concepts and verses discussed and any questions the student still has.
 
-**What sacred music shall we discover together today?** 🌟
-"""
-        return intro_response, [], False
+Updated summary:"""
     
-    # Initialize conversation tracking
-    if session_id and session_id not in conversations:
-        conversations[session_id] = []
+    with metrics.stage('samaveda', 'summary'):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": summary_prompt}],
+            max_tokens=220,
+            temperature=0.2
+        )
+    metrics.record_usage('samaveda', 'summary', response)
+    return response.choices[0].message.content.strip()
+
+# Long conversations keep a constant size: older turns are summarized in the background
+conversation_summarizer = background_tasks.ConversationSummarizer('samaveda', conversations, summarize_conversation)
+
+def should_trigger_quiz(session_id, state=None):
+    """Check if quiz should be triggered based on conversation count (or on `state` carried by a session token)"""
+    def advance(state):
+        state['message_count'] += 1
+        
+        # Trigger quiz every 3 meaningful exchanges
+        triggered = state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']
+        if triggered:
+            state['last_quiz_at'] = state['message_count']
+        return state, triggered
+    
+    if state is not None:
+        return advance(state)[1]
     
+    # Atomic read-modify-write, so concurrent requests of one session cannot lose a count
+    return user_quiz_states.update(session_id, advance, default=lambda: {
+        'message_count': 0,
+        'last_quiz_at': 0,
+        'quiz_frequency': 3  # Every 3 meaningful exchanges (matching Yajurveda)
+    })
+
+def rag_answer(query, topk=5, model="gpt-4o-mini"):
+    """Retrieve relevant verses and generate the tutor's answer"""
     # Handle case when database is not loaded
     if index is None or verses is None:
         # Provide a general response without database search
@@ -322,16 +407,20 @@ Just click on any topic above, or ask me anything that sparks your musical curio
         # 1. Retrieve relevant verses
         try:
             results = search(query, topk=topk)
-            # 2. Create context
+            # 2. Create context, best verses first within the prompt token budget
+            fitted = prompt_budget.fit(results)
+            results = [(r, score) for r, score, _ in fitted]
             context = "\n".join([
-                f"SV {r.get('book', '?')}.{r.get('chapter', '?')}.{r.get('verse', '?')}: {r.get('text_sa', r.get('text', ''))}"
-                for r, _ in results
+                f"SV {r.get('book', '?')}.{r.get('chapter', '?')}.{r.get('verse', '?')}: {text}"
+                for r, _, text in fitted
             ])
         except Exception as e:
-            print(f"Search error: {e}")
+            log.error("Search error: %s", e)
+            metrics.fallback('samaveda', 'search')
             results = []
             context = "General Samaveda knowledge (database search unavailable)"
     
+    prompt_started = time.perf_counter()
     # 3. Create engaging tutor prompt for Samaveda
     prompt = f"""
 You are a passionate and enthusiastic Samaveda tutor who absolutely loves teaching about sacred music and chanting traditions. Your goal is to make Samavedic knowledge accessible and exciting for everyone - from music enthusiasts to spiritual seekers.
@@ -365,15 +454,20 @@ Relevant Context:
 Provide your enthusiastic, musical response:
 """
     
+    metrics.observe('samaveda', 'prompt_build', time.perf_counter() - prompt_started)
+    
     # 4. Get response from OpenAI
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with metrics.stage('samaveda', 'completion'):
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        metrics.record_usage('samaveda', 'answer', response)
         answer = response.choices[0].message.content
     except Exception as e:
-        print(f"OpenAI API error: {e}")
+        log.error("OpenAI API error: %s", e)
+        metrics.fallback('samaveda', 'completion')
         # Fallback response
         answer = f"""
 I understand you're asking about "{query}" in relation to Samaveda! While I'm experiencing some technical difficulties accessing my full knowledge base, I can share that Samaveda is fundamentally about sacred music and chanting traditions.
@@ -386,30 +480,82 @@ The Samaveda contains beautiful melodies and chants derived from Rigvedic verses
 • Who were the Udgatri priests?
 """
     
+    return answer, results
+
+def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None, with_scores=False):
+    """Get answer using RAG with conversation tracking (verses as (verse, FAISS distance) pairs if with_scores)"""
+    
+    if is_intro:
+        # Special introduction message for Samaveda
+        intro_response = """
+🎵 **Namaste and welcome, dear music lover and seeker of sacred sounds!** 🎵
+
+I am your passionate Samaveda tutor, and I'm absolutely delighted that you've chosen to explore the most melodious of all Vedas! The Samaveda is like a divine symphony hall where ancient priests transformed Rigvedic verses into beautiful chants and melodies that could touch the very heavens.
+
+Think of me as your musical guide who will help you understand these sacred songs, their rhythms, and their spiritual power - whether you're interested in music, spirituality, or ancient Indian culture!
+
+**What musical journey shall we embark on today?** Here are some fascinating topics we could explore:
+
+🎶 **Sacred Chanting** - Learn about the art of Vedic singing and vocal techniques
+🎼 **Musical Notation** - Discover how ancient melodies were preserved and transmitted  
+🔥 **Soma Rituals** - Understand the ceremonial context of Samaveda chants
+🎵 **Udgitha Practice** - Explore the most sacred of all chants: "OM"
+👨‍🎤 **Priest Traditions** - Meet the Udgatri priests, the ancient chanters
+🎹 **Melody Patterns** - Learn about ragas and musical structures in Samaveda
+🎭 **Ritual Performance** - Discover how chants were used in sacrificial ceremonies
+
+Just click on any topic above, or ask me anything that sparks your musical curiosity! I love questions like "How did ancient priests learn melodies?" or "What makes Samaveda different from other Vedas?" - no question is too simple or too complex!
+
+**What sacred music shall we discover together today?** 🌟
+"""
+        return intro_response, [], False
+    
+    # Initialize conversation tracking
+    if session_id and session_id not in conversations:
+        conversations[session_id] = []
+    
+    # Canonical intro/FAQ questions are answered from the offline-built store
+    cached = faq_store.lookup('samaveda', PROMPT_VERSION, query)
+    if cached:
+        metrics.cache_hit('samaveda', 'faq')
+        answer, results = cached['answer'], [(v, None) for v in cached['verses']]
+    else:
+        answer, results = rag_answer(query, topk=topk, model=model)
+    
     # 5. Track conversation and check for quiz trigger
     quiz_triggered = False
     if session_id:
         # Add to conversation history
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'user',
-            'text': query
-        })
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'bot',
-            'text': answer
-        })
+        conversations.extend(session_id, [
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'user',
+                'text': query
+            },
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'bot',
+                'text': answer
+            }
+        ])
+        
+        # Refresh the session's topics and fold older turns off the request path
+        history = conversations[session_id]
+        topic_tracker.refresh(session_id, history)
+        conversation_summarizer.maybe_fold(session_id, history)
         
         # Check if quiz should be triggered
         quiz_triggered = should_trigger_quiz(session_id)
+        
+        # Start preparing the quiz when the session is one exchange away from it
+        state = user_quiz_states[session_id]
+        if state['message_count'] - state['last_quiz_at'] == state['quiz_frequency'] - 1:
+            quiz_prefetcher.start(session_id, history)
+        else:
+            quiz_prefetcher.touch(session_id)
     
     # Return results (handle case when results might not exist)
-    return answer, [r for r, _ in results], quiz_triggered
-
-# Load data when the app starts
-if not load_data():
-    print("Warning: Could not load data files. App will run with limited functionality.")
+    return answer, (results if with_scores else [r for r, _ in results]), quiz_triggered
 
 @app.route('/')
 def home():
@@ -424,14 +570,10 @@ def home():
             'index.html'
         ]
         
-        for html_path in possible_html_paths:
-            try:
-                if os.path.exists(html_path):
-                    with open(html_path, 'r', encoding='utf-8') as f:
-                        print(f"✅ Serving HTML from: {html_path}")
-                        return f.read()
-            except Exception as e:
-                continue
+        # Kept in memory precompressed; missing locations are only looked up again every few seconds
+        page = http_cache.cached_page(*possible_html_paths)
+        if page:
+            return http_cache.file_response(page)
                 
         raise FileNotFoundError("HTML file not found in any expected location")
         
@@ -470,9 +612,9 @@ def api_ask():
         query = data.get('query', '').strip()
         topk = data.get('topk', 5)
         is_intro = data.get('is_intro', False)
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
-        print(f"✅ Received request - Query: '{query}', Intro: {is_intro}, Session: {session_id}")
+        log.debug("Received request - Query: '%s', Intro: %s, Session: %s", query, is_intro, session_id)
         
         if not query and not is_intro:
             return jsonify({'error': 'Query is required'}), 400
@@ -501,30 +643,28 @@ def api_ask():
         })
         
     except Exception as e:
-        print(f"❌ Error in API: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in API: %s", e)
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/api/samaveda/generate-quiz', methods=['POST'])
 def api_generate_quiz():
     """API endpoint for generating quiz - Fixed to match Yajurveda pattern"""
     try:
-        print("✅ Generate quiz endpoint called")
+        log.debug("Generate quiz endpoint called")
         
         # Validate request
         if not request.json:
             return jsonify({'error': 'No JSON data provided'}), 400
         
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
-        print(f"🎯 Generating quiz for session: {session_id}")
-        print(f"📊 Available sessions: {list(conversations.keys())}")
+        log.debug("Generating quiz for session: %s", session_id)
+        log.debug("Sessions in memory: %s", len(conversations))
         
         # Check if session exists, if not create default
         if session_id not in conversations:
-            print("⚠ Creating default conversation for quiz")
+            log.debug("Creating default conversation for quiz")
             conversations[session_id] = [
                 {
                     'timestamp': datetime.now().isoformat(),
@@ -539,23 +679,33 @@ def api_generate_quiz():
             ]
         
         conversation_history = conversations[session_id]
-        print(f"💬 Conversation length: {len(conversation_history)}")
+        log.debug("Conversation length: %s", len(conversation_history))
+        
+        # Serve the quiz prepared ahead of time when there is one
+        prepared = quiz_prefetcher.take(session_id)
+        if prepared:
+            log.debug("Serving pre-generated quiz")
+            return jsonify({
+                'quiz': prepared['quiz'],
+                'topics': prepared['topics'],
+                'session_id': session_id
+            })
         
-        # Extract topics from conversation
-        topics = extract_topics_from_conversation(conversation_history)
-        print(f"🏷️ Extracted topics: {topics}")
+        # Use the topics extracted in the background, extracting now only if there are none yet
+        topics = topic_tracker.get(session_id) or extract_topics_from_conversation(conversation_history)
+        log.debug("Extracted topics: %s", topics)
         
         if not topics:
             topics = ["sacred chanting", "musical notation", "soma rituals"]
         
         # Generate quiz
-        print("🎵 Generating quiz...")
+        log.debug("Generating quiz...")
         quiz_data = generate_mcq_quiz(topics, conversation_history)
         
         if not quiz_data:
             return jsonify({'error': 'Failed to generate quiz'}), 500
         
-        print(f"🎉 Quiz successfully created with {len(quiz_data.get('questions', []))} questions")
+        log.debug("Quiz successfully created with %s questions", len(quiz_data.get('questions', [])))
         
         return jsonify({
             'quiz': quiz_data,
@@ -564,23 +714,21 @@ def api_generate_quiz():
         })
         
     except Exception as e:
-        print(f"💥 Error generating quiz: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error generating quiz: %s", e)
         return jsonify({'error': f'Failed to generate quiz: {str(e)}'}), 500
 
 @app.route('/api/samaveda/submit-quiz', methods=['POST'])
 def api_submit_quiz():
     """API endpoint for submitting quiz answers - Fixed to match Yajurveda pattern"""
     try:
-        print("✅ Submit quiz endpoint called")
+        log.debug("Submit quiz endpoint called")
         
         # Validate request has JSON data
         if not request.json:
             return jsonify({'error': 'No JSON data provided'}), 400
         
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         answers = data.get('answers', {})
         quiz_questions = data.get('quiz_questions', [])
         
@@ -594,9 +742,9 @@ def api_submit_quiz():
         if not isinstance(answers, dict):
             return jsonify({'error': 'Answers must be a dictionary'}), 400
         
-        print(f"📝 Processing quiz submission for session: {session_id}")
-        print(f"❓ Number of questions: {len(quiz_questions)}")
-        print(f"✏️ Number of answers: {len(answers)}")
+        log.debug("Processing quiz submission for session: %s", session_id)
+        log.debug("Number of questions: %s", len(quiz_questions))
+        log.debug("Number of answers: %s", len(answers))
         
         # Calculate score
         correct_count = 0
@@ -640,7 +788,7 @@ def api_submit_quiz():
         else:
             feedback = "🎼 Every great musician starts with practice! Let's continue our melodious journey together!"
         
-        print(f"🏆 Quiz completed: {correct_count}/{total_questions} ({score_percentage:.1f}%)")
+        log.debug("Quiz completed: %s/%s (%.1f%%)", correct_count, total_questions, score_percentage)
         
         return jsonify({
             'score': correct_count,
@@ -652,9 +800,7 @@ def api_submit_quiz():
         })
         
     except Exception as e:
-        print(f"❌ Error submitting quiz: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error submitting quiz: %s", e)
         return jsonify({'error': f'Failed to submit quiz: {str(e)}'}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -675,15 +821,11 @@ def health_check():
             'GET /api/health'
         ]
     }
-    print(f"🩺 Health check: {status['status']}")
+    log.debug("Health check: %s", status['status'])
     return jsonify(status)
 
-# Route debugging function
-@app.before_request
-def log_request_info():
-    print(f"🌐 {request.method} {request.path}")
-
 if __name__ == '__main__':
+    init()
     print("🚀 Starting Enhanced Samaveda Chatbot Server with Quiz Feature...")
     print("🎵 Make sure your database files are in ./database/ directory")
     print("🌐 Frontend will be available at http://localhost:5000")
@@ -0,0 +1,707 @@
+import atexit
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+log = logging.getLogger(__name__)
+
+# Defaults, overridable through the environment
+DEFAULT_MAX_MESSAGES = int(os.getenv('SESSION_MAX_MESSAGES', 200))
+DEFAULT_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', 6 * 3600))
+DEFAULT_MEMORY_BUDGET_MB = float(os.getenv('SESSION_MEMORY_BUDGET_MB', 256))
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', './databse/sessions.db')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+DEFAULT_SHARDS = int(os.getenv('SESSION_STORE_SHARDS', 16))
+
+# Signs server-issued session ids and stateless session tokens. Required in production: without it a
+# persistent or stateless setup keeps its secret in SESSION_SECRET_PATH (next to the session database),
+# so ids and tokens survive restarts and are shared by the workers of one host.
+SESSION_SECRET_PATH = os.getenv(
+    'SESSION_SECRET_PATH', os.path.join(os.path.dirname(SESSION_DB_PATH) or '.', 'session_secret')
+)
+
+
+def _load_secret():
+    secret = os.getenv('SESSION_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    stateless = os.getenv('STATELESS_SESSIONS', '').lower() in ('1', 'true', 'yes')
+    if SESSION_BACKEND == 'memory' and not stateless:
+        # Sessions die with the process anyway; a per-process secret loses nothing
+        return secrets.token_hex(32).encode('utf-8')
+    try:
+        os.makedirs(os.path.dirname(SESSION_SECRET_PATH) or '.', exist_ok=True)
+        # O_EXCL: when several workers start at once, exactly one of them writes the secret
+        fd = os.open(SESSION_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        raise RuntimeError(
+            f"SESSION_SECRET is not set and {SESSION_SECRET_PATH} cannot be created ({e}); "
+            f"set SESSION_SECRET for the {SESSION_BACKEND} session backend"
+        ) from e
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        log.warning("SESSION_SECRET is not set; generated one in %s", SESSION_SECRET_PATH)
+    for _ in range(50):
+        with open(SESSION_SECRET_PATH) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode('utf-8')
+        time.sleep(0.01)  # another worker is still writing it
+    raise RuntimeError(f"{SESSION_SECRET_PATH} is empty; set SESSION_SECRET or delete the file")
+
+
+SESSION_SECRET = _load_secret()
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}\.[A-Za-z0-9_-]{16}$")
+
+
+def _sign(raw):
+    digest = hmac.new(SESSION_SECRET, raw.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest)[:16].decode('ascii')
+
+
+def new_session_id():
+    """Fresh server-issued session id: random part plus a truncated HMAC"""
+    raw = secrets.token_urlsafe(18)
+    return f"{raw}.{_sign(raw)}"
+
+
+def resolve_session_id(candidate):
+    """The client's session id if this server issued it, otherwise a new one"""
+    if isinstance(candidate, str) and _SESSION_ID_PATTERN.match(candidate):
+        raw, signature = candidate.split('.')
+        if hmac.compare_digest(signature, _sign(raw)):
+            return candidate
+    return new_session_id()
+
+
+def _copy(value):
+    """Copy of a session value deep enough that callers cannot mutate the stored one"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+def approx_size(value):
+    """Cheap estimate of the memory held by a session value, in bytes"""
+    if isinstance(value, str):
+        # Non-ASCII text (Devanagari) is stored with two bytes per character
+        return 49 + len(value) * (1 if value.isascii() else 2)
+    if isinstance(value, dict):
+        return 64 + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(approx_size(v) for v in value)
+    return 32
+
+
+class _Shard:
+    """One lock-protected slice of a SessionStore, kept in least-recently-used order"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = OrderedDict()
+        self.touched = {}
+        self.sizes = {}
+        self.bytes = 0
+        self.last_sweep = time.monotonic()
+        self.stats = {'hits': 0, 'misses': 0, 'loaded': 0, 'expired': 0, 'evicted': 0, 'trimmed_messages': 0}
+
+    # All helpers below expect self.lock to be held
+
+    def touch(self, session_id, now):
+        self.touched[session_id] = now
+        self.data.move_to_end(session_id)
+
+    def resize(self, session_id):
+        size = approx_size(self.data[session_id])
+        self.bytes += size - self.sizes.get(session_id, 0)
+        self.sizes[session_id] = size
+
+    def drop(self, session_id, reason=None):
+        self.data.pop(session_id, None)
+        self.touched.pop(session_id, None)
+        self.bytes -= self.sizes.pop(session_id, 0)
+        if reason:
+            self.stats[reason] += 1
+        return session_id
+
+    def sweep(self, now, ttl_seconds):
+        """Drop idle sessions; entries are in LRU order so the scan stops at the first fresh one"""
+        expired = []
+        while self.data:
+            session_id = next(iter(self.data))
+            if now - self.touched[session_id] <= ttl_seconds:
+                break
+            expired.append(self.drop(session_id, 'expired'))
+        self.last_sweep = now
+        return expired
+
+
+class SessionStore(MutableMapping):
+    """Thread-safe, lock-striped session store with per-session message caps, idle TTL and LRU eviction"""
+
+    def __init__(self, name, max_messages=DEFAULT_MAX_MESSAGES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 backend=None, shards=DEFAULT_SHARDS):
+        self.name = name
+        self.backend = backend
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = None
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+
+        _budget.register(self)
+
+    def _shard(self, session_id):
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _is_expired(self, shard, session_id, now):
+        return self.ttl_seconds and now - shard.touched[session_id] > self.ttl_seconds
+
+    def _maybe_sweep(self, shard, now):
+        if self.ttl_seconds and now - shard.last_sweep > min(60.0, self.ttl_seconds / 10):
+            return shard.sweep(now, self.ttl_seconds)
+        return []
+
+    def _finish_write(self, expired):
+        """Work done after a write, outside the shard lock"""
+        self._notify(expired)
+        _budget.enforce()
+
+    def _notify(self, session_ids):
+        if self.on_evict:
+            for session_id in session_ids:
+                self.on_evict(session_id)
+
+    # -- mapping interface --
+
+    def __getitem__(self, session_id):
+        shard = self._shard(session_id)
+        now = time.monotonic()
+        expired = []
+        with shard.lock:
+            if session_id in shard.data:
+                if not self._is_expired(shard, session_id, now):
+                    shard.stats['hits'] += 1
+                    shard.touch(session_id, now)
+                    return shard.data[session_id]
+                expired.append(shard.drop(session_id, 'expired'))
+            shard.stats['misses'] += 1
+        self._notify(expired)
+        return self._load(shard, session_id)
+
+    def _load(self, shard, session_id):
+        """Read a session back from the persistent backend on first access"""
+        value = self.backend.load(self.name, session_id, self.max_messages) if self.backend else None
+        if value is None:
+            raise KeyError(session_id)
+        with shard.lock:
+            # Another thread may have created the session while we were reading
+            if session_id not in shard.data:
+                shard.data[session_id] = value
+                shard.stats['loaded'] += 1
+            shard.touch(session_id, time.monotonic())
+            shard.resize(session_id)
+            value = shard.data[session_id]
+        _budget.enforce()
+        return value
+
+    def __setitem__(self, session_id, value):
+        shard = self._shard(session_id)
+        with shard.lock:
+            expired = self._put(shard, session_id, value)
+        self._finish_write(expired)
+
+    def _put(self, shard, session_id, value):
+        """Store a value (call with the shard lock held)"""
+        now = time.monotonic()
+        if isinstance(value, list) and self.max_messages and len(value) > self.max_messages:
+            shard.stats['trimmed_messages'] += len(value) - self.max_messages
+            value = value[-self.max_messages:]
+        shard.data[session_id] = value
+        shard.touch(session_id, now)
+        shard.resize(session_id)
+        if self.backend:
+            self.backend.put(self.name, session_id, value)
+        return self._maybe_sweep(shard, now)
+
+    def __delitem__(self, session_id):
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id not in shard.data and not self.backend:
+                raise KeyError(session_id)
+            shard.drop(session_id)
+            if self.backend:
+                self.backend.delete(self.name, session_id)
+
+    def __contains__(self, session_id):
+        try:
+            self[session_id]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """Sessions currently held in memory (persisted sessions are loaded lazily)"""
+        session_ids = []
+        for shard in self._shards:
+            with shard.lock:
+                session_ids.extend(shard.data)
+        return iter(session_ids)
+
+    def __len__(self):
+        return sum(len(shard.data) for shard in self._shards)
+
+    # -- atomic session operations --
+
+    def extend(self, session_id, messages):
+        """Append messages to a session's history atomically, keeping only the newest max_messages"""
+        shard = self._shard(session_id)
+        now = time.monotonic()
+        with shard.lock:
+            history = shard.data.get(session_id)
+            if history is None:
+                history = shard.data[session_id] = []
+            history.extend(messages)
+            if self.backend:
+                self.backend.append(self.name, session_id, messages)
+            # Track the size incrementally instead of re-measuring the whole history
+            delta = sum(approx_size(m) + 8 for m in messages)
+            overflow = len(history) - self.max_messages if self.max_messages else 0
+            if overflow > 0:
+                delta -= sum(approx_size(m) + 8 for m in history[:overflow])
+                del history[:overflow]
+                shard.stats['trimmed_messages'] += overflow
+            shard.touch(session_id, now)
+            if session_id in shard.sizes:
+                shard.sizes[session_id] += delta
+                shard.bytes += delta
+            else:
+                shard.resize(session_id)
+            expired = self._maybe_sweep(shard, now)
+        self._finish_write(expired)
+        return history
+
+    def update(self, session_id, fn, default=None):
+        """Atomically replace a session's value with fn(current value) and return fn's second result
+
+        `fn` receives a private copy of the value (or default() for a new session) and
+        returns (new value, result).
+        """
+        # Expire or load the session first; that may take other locks, so not under ours
+        self.get(session_id)
+        shard = self._shard(session_id)
+        with shard.lock:
+            current = shard.data.get(session_id)
+            if current is None and default:
+                current = default()
+            value, result = fn(_copy(current))
+            expired = self._put(shard, session_id, value)
+        self._finish_write(expired)
+        return result
+
+    # -- memory budget hooks --
+
+    def oldest(self):
+        """(last touched, session id) of the least recently used session, or None"""
+        candidates = []
+        for shard in self._shards:
+            with shard.lock:
+                if shard.data:
+                    session_id = next(iter(shard.data))
+                    candidates.append((shard.touched[session_id], session_id))
+        return min(candidates) if candidates else None
+
+    def evict(self, session_id):
+        """Drop a session from memory (a persistent backend keeps it)"""
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id not in shard.data:
+                return False
+            shard.drop(session_id, 'evicted')
+        self._notify([session_id])
+        return True
+
+    def memory_bytes(self):
+        return sum(shard.bytes for shard in self._shards)
+
+    def stats(self):
+        totals = {}
+        for shard in self._shards:
+            with shard.lock:
+                for key, value in shard.stats.items():
+                    totals[key] = totals.get(key, 0) + value
+        return dict(
+            totals,
+            backend=self.backend.stats() if self.backend else None,
+            sessions=len(self),
+            shards=len(self._shards),
+            approx_bytes=self.memory_bytes(),
+            max_messages=self.max_messages,
+            ttl_seconds=self.ttl_seconds
+        )
+
+
+class SqliteBackend:
+    """Durable session storage in SQLite (WAL mode) written behind by a batching background thread"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS session_messages (
+            id INTEGER PRIMARY KEY,
+            store TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_session_messages ON session_messages (store, session_id, id);
+        CREATE TABLE IF NOT EXISTS session_values (
+            store TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            body TEXT NOT NULL,
+            PRIMARY KEY (store, session_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS session_touch (
+            store TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (store, session_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_session_touch_updated ON session_touch (updated);
+    """
+    # Sessions written before session_touch existed expire one TTL after the upgrade
+    BACKFILL = """
+        INSERT OR IGNORE INTO session_touch (store, session_id, updated)
+            SELECT DISTINCT store, session_id, :now FROM session_messages
+            UNION SELECT store, session_id, :now FROM session_values
+    """
+    EXPIRED = "SELECT store, session_id FROM session_touch WHERE updated < ?"
+
+    def __init__(self, path, batch_size=500, flush_interval=0.25, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_messages=DEFAULT_MAX_MESSAGES, write_attempts=3):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Rows are kept for ttl_seconds after a session's last write and max_messages per session
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.write_attempts = max(1, write_attempts)
+        self._written = 0
+        self._batches = 0
+        self._lost = 0
+        self._expired = 0
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            conn.execute(self.BACKFILL, {'now': time.time()})
+        self._reset()
+        atexit.register(self.close)
+
+    def _reset(self):
+        """(Re)create per-process state; also used after a fork"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        if os.getpid() != self._pid:
+            self._reset()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _ensure_writer(self):
+        if os.getpid() != self._pid:
+            self._reset()
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='session-sqlite-writer', daemon=True)
+                self._writer.start()
+
+    def _enqueue(self, op, store, session_id, payload=None):
+        self._ensure_writer()
+        with self._pending_lock:
+            key = (store, session_id)
+            self._pending[key] = self._pending.get(key, 0) + 1
+        self._queue.put((op, store, session_id, payload))
+
+    # -- write-behind API --
+
+    def append(self, store, session_id, messages):
+        self._enqueue('append', store, session_id, [json.dumps(m, ensure_ascii=False) for m in messages])
+
+    def put(self, store, session_id, value):
+        if isinstance(value, list):
+            self._enqueue('replace', store, session_id, [json.dumps(m, ensure_ascii=False) for m in value])
+        else:
+            self._enqueue('put', store, session_id, json.dumps(value, ensure_ascii=False))
+
+    def delete(self, store, session_id):
+        self._enqueue('delete', store, session_id)
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued so far has been written"""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._queue.put(('flush', None, None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive() and os.getpid() == self._pid:
+            self.flush()
+
+    def _run(self):
+        conn = self._connect()
+        prune_interval = min(60.0, self.ttl_seconds / 10) if self.ttl_seconds else None
+        next_prune = time.monotonic()
+        while True:
+            if prune_interval and time.monotonic() >= next_prune:
+                conn = self._prune(conn)
+                next_prune = time.monotonic() + prune_interval
+            try:
+                batch = [self._queue.get(timeout=prune_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            conn = self._commit(conn, batch)
+
+    def _reconnect(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        try:
+            return self._connect()
+        except sqlite3.Error as e:
+            log.error("Could not reopen session database %s: %s", self.path, e)
+            return conn
+
+    def _commit(self, conn, batch):
+        """Write a batch, retrying SQLite errors; a batch that keeps failing is dropped and counted as lost"""
+        ops = sum(1 for op, *_ in batch if op != 'flush')
+        try:
+            for attempt in range(1, self.write_attempts + 1):
+                try:
+                    self._write(conn, batch)
+                    self._batches += 1
+                    self._written += ops
+                    return conn
+                except sqlite3.Error as e:
+                    log.warning("Error writing sessions to SQLite (attempt %d of %d): %s", attempt, self.write_attempts, e)
+                    conn = self._reconnect(conn)
+                    if attempt < self.write_attempts:
+                        time.sleep(0.1 * 2 ** attempt)
+            log.error("Dropped %d session writes after %d failed attempts", ops, self.write_attempts)
+            self._lost += ops
+        except Exception:
+            log.exception("Dropped %d session writes", ops)
+            self._lost += ops
+        finally:
+            # Readers waiting in load() or flush() are released whether or not the batch landed
+            self._settle(batch)
+        return conn
+
+    def _settle(self, batch):
+        with self._pending_lock:
+            for op, store, session_id, _ in batch:
+                if op != 'flush':
+                    key = (store, session_id)
+                    self._pending[key] -= 1
+                    if not self._pending[key]:
+                        del self._pending[key]
+        for op, _, _, payload in batch:
+            if op == 'flush':
+                payload.set()
+
+    def _write(self, conn, batch):
+        now = time.time()
+        with conn:
+            for op, store, session_id, payload in batch:
+                if op == 'flush':
+                    continue
+                if op in ('replace', 'delete'):
+                    conn.execute("DELETE FROM session_messages WHERE store = ? AND session_id = ?", (store, session_id))
+                    conn.execute("DELETE FROM session_values WHERE store = ? AND session_id = ?", (store, session_id))
+                if op == 'delete':
+                    conn.execute("DELETE FROM session_touch WHERE store = ? AND session_id = ?", (store, session_id))
+                    continue
+                if op in ('append', 'replace'):
+                    conn.executemany(
+                        "INSERT INTO session_messages (store, session_id, body) VALUES (?, ?, ?)",
+                        [(store, session_id, body) for body in payload]
+                    )
+                elif op == 'put':
+                    conn.execute(
+                        "INSERT OR REPLACE INTO session_values (store, session_id, body) VALUES (?, ?, ?)",
+                        (store, session_id, payload)
+                    )
+                if op == 'append' and self.max_messages:
+                    # Keep the newest max_messages, like the in-memory history
+                    conn.execute(
+                        "DELETE FROM session_messages WHERE store = ? AND session_id = ? AND id <= ("
+                        "SELECT id FROM session_messages WHERE store = ? AND session_id = ? "
+                        "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                        (store, session_id, store, session_id, self.max_messages)
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO session_touch (store, session_id, updated) VALUES (?, ?, ?)",
+                    (store, session_id, now)
+                )
+
+    def _prune(self, conn):
+        """Delete the rows of sessions not written for ttl_seconds"""
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            with conn:
+                expired = conn.execute(self.EXPIRED, (cutoff,)).fetchall()
+                if expired:
+                    for table in ('session_messages', 'session_values', 'session_touch'):
+                        conn.executemany(f"DELETE FROM {table} WHERE store = ? AND session_id = ?", expired)
+            self._expired += len(expired)
+        except sqlite3.Error as e:
+            log.warning("Error expiring sessions in SQLite: %s", e)
+            conn = self._reconnect(conn)
+        return conn
+
+    # -- reads --
+
+    def load(self, store, session_id, limit=None):
+        """Stored value or newest `limit` messages of a session, or None if unknown"""
+        with self._pending_lock:
+            dirty = (store, session_id) in self._pending
+        if dirty:
+            # Read-your-writes for sessions evicted from memory before their writes landed
+            self.flush()
+        conn = self._reader()
+        row = conn.execute(
+            "SELECT body FROM session_values WHERE store = ? AND session_id = ?", (store, session_id)
+        ).fetchone()
+        if row:
+            return json.loads(row[0])
+        rows = conn.execute(
+            "SELECT body FROM session_messages WHERE store = ? AND session_id = ? ORDER BY id DESC LIMIT ?",
+            (store, session_id, limit or -1)
+        ).fetchall()
+        if not rows:
+            return None
+        return [json.loads(body) for (body,) in reversed(rows)]
+
+    def stats(self):
+        return {
+            'type': 'sqlite',
+            'path': self.path,
+            'queued': self._queue.qsize(),
+            'written_ops': self._written,
+            'lost_ops': self._lost,
+            'batches': self._batches,
+            'expired_sessions': self._expired,
+            'ttl_seconds': self.ttl_seconds,
+            'max_messages': self.max_messages
+        }
+
+
+class MemoryBudget:
+    """Process-wide memory budget shared by all session stores, enforced by global LRU eviction"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._stores = []
+        self._lock = threading.Lock()
+
+    def register(self, store):
+        with self._lock:
+            self._stores.append(store)
+
+    def used_bytes(self):
+        return sum(store.memory_bytes() for store in self._stores)
+
+    def enforce(self):
+        """Evict the least recently used session across all stores until under budget"""
+        if not self.max_bytes or self.used_bytes() <= self.max_bytes:
+            return
+        with self._lock:
+            while self.used_bytes() > self.max_bytes:
+                candidates = [(store.oldest(), store) for store in self._stores]
+                candidates = [(oldest, store) for oldest, store in candidates if oldest]
+                if not candidates:
+                    return
+                (_, session_id), store = min(candidates, key=lambda c: c[0][0])
+                store.evict(session_id)
+
+    def stats(self):
+        return {
+            'budget_bytes': self.max_bytes,
+            'used_bytes': self.used_bytes(),
+            'stores': {store.name: store.stats() for store in self._stores}
+        }
+
+
+_budget = MemoryBudget(int(DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024))
+
+
+_shared_stores = []
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Shared persistent backend selected by SESSION_BACKEND, or None for memory only"""
+    global _backend
+    with _backend_lock:
+        if _backend is None and SESSION_BACKEND == 'sqlite':
+            _backend = SqliteBackend(SESSION_DB_PATH)
+        return _backend
+
+
+def create_store(veda, kind):
+    """Session store for one veda app (`kind` is e.g. 'conversations' or 'quiz_states')"""
+    name = f"{veda}.{kind}"
+    if SESSION_BACKEND == 'redis':
+        # Shared between worker processes, so nothing is cached in this process
+        import redis_sessions
+        store = redis_sessions.RedisSessionStore(
+            name, redis_sessions.RespClient(REDIS_URL),
+            max_messages=DEFAULT_MAX_MESSAGES, ttl_seconds=DEFAULT_TTL_SECONDS
+        )
+        _shared_stores.append(store)
+        return store
+    return SessionStore(name, backend=get_backend())
+
+
+def stats():
+    """Memory budget and per-store statistics"""
+    result = _budget.stats()
+    result['stores'].update({store.name: store.stats() for store in _shared_stores})
+    return result
@@ -0,0 +1,114 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+import zlib
+
+from session_store import SESSION_SECRET
+
+# Optional stateless mode: the client carries its session in a signed token instead of
+# the server keeping it, so any worker can serve any request without a shared store.
+STATELESS_SESSIONS = os.getenv('STATELESS_SESSIONS', '').lower() in ('1', 'true', 'yes')
+MAX_TURNS = int(os.getenv('SESSION_TOKEN_TURNS', 6))
+MAX_TURN_CHARS = int(os.getenv('SESSION_TOKEN_TURN_CHARS', 300))
+MAX_AGE_SECONDS = int(os.getenv('SESSION_TOKEN_MAX_AGE', 7 * 24 * 3600))
+# Topics extracted when a quiz was triggered still serve the quiz after one more question
+TOPICS_MAX_AGE = 1
+
+_PREFIX = "v1"
+
+
+def enabled(data=None):
+    """True if this request should use a session token (globally enabled or sent by the client)"""
+    return STATELESS_SESSIONS or bool(data and data.get('session_token'))
+
+
+def new_state():
+    return {
+        'sid': secrets.token_urlsafe(12),
+        'quiz': {'message_count': 0, 'last_quiz_at': 0, 'quiz_frequency': 3},
+        'topics': [],
+        'topics_at': -1,
+        'turns': []
+    }
+
+
+def usage_id(state):
+    """Stable id of a token session for usage accounting and the session quota"""
+    # Tokens issued before 'sid' existed get one now; it travels in every token issued from here on
+    return 'token:' + state.setdefault('sid', secrets.token_urlsafe(12))
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(payload):
+    digest = hmac.new(SESSION_SECRET, f"{_PREFIX}.{payload}".encode('ascii'), hashlib.sha256).digest()
+    return _b64encode(digest[:16])
+
+
+def encode(state):
+    """Compact signed token: zlib-compressed JSON plus a truncated HMAC"""
+    state = dict(state, iat=int(time.time()))
+    raw = json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    payload = _b64encode(zlib.compress(raw, 9))
+    return f"{_PREFIX}.{payload}.{_signature(payload)}"
+
+
+def decode(token):
+    """State carried by a token, or None if it is missing, tampered with or too old"""
+    if not isinstance(token, str) or token.count('.') != 2:
+        return None
+    prefix, payload, signature = token.split('.')
+    if prefix != _PREFIX or not hmac.compare_digest(signature, _signature(payload)):
+        return None
+    try:
+        state = json.loads(zlib.decompress(_b64decode(payload)))
+    except (ValueError, zlib.error):
+        return None
+    if MAX_AGE_SECONDS and time.time() - state.get('iat', 0) > MAX_AGE_SECONDS:
+        return None
+    return state
+
+
+def summarize_turn(text):
+    """Short form of a message: markdown and follow-up questions removed, length capped"""
+    text = text.split('**Follow-up Questions:**')[0]
+    text = re.sub(r"[*_#>`]+", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= MAX_TURN_CHARS else text[:MAX_TURN_CHARS].rsplit(' ', 1)[0] + "…"
+
+
+def record_exchange(state, query, answer):
+    """Add one question/answer pair to the token's rolling history"""
+    state['turns'].extend([['user', summarize_turn(query)], ['bot', summarize_turn(answer)]])
+    del state['turns'][:-MAX_TURNS]
+
+
+def history(state):
+    """Token turns in the message format the tutors' topic and quiz prompts expect"""
+    return [{'sender': sender, 'text': text} for sender, text in state.get('turns', [])]
+
+
+def cached_topics(state):
+    """Topics extracted at most TOPICS_MAX_AGE exchanges ago, if any"""
+    if not state.get('topics'):
+        return None
+    age = state['quiz']['message_count'] - state.get('topics_at', -1)
+    if 0 <= age <= TOPICS_MAX_AGE:
+        return state['topics']
+    return None
+
+
+def remember_topics(state, topics):
+    state['topics'] = list(topics)[:5]
+    state['topics_at'] = state['quiz']['message_count']
@@ -0,0 +1,76 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Where cold start time goes: seconds per component (hub or tutor) and phase
+# (imports openai, imports faiss, client setup, index read, metadata load, ...). Measure the hub with:
+#   python startup_profile.py
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_phases = []
+# Set on threads reloading a tutor after an idle unload; that is not startup time
+_paused = threading.local()
+
+
+@contextmanager
+def paused():
+    """Do not record phases run by this thread inside the block"""
+    previous = getattr(_paused, 'active', False)
+    _paused.active = True
+    try:
+        yield
+    finally:
+        _paused.active = previous
+
+
+def record(name, component, seconds, ended=None):
+    if getattr(_paused, 'active', False):
+        return
+    with _lock:
+        _phases.append((component, name, seconds, (ended or time.perf_counter()) - _started))
+
+
+@contextmanager
+def phase(name, component='hub'):
+    """Time the enclosed block as one startup phase"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ended = time.perf_counter()
+        record(name, component, ended - started, ended)
+
+
+def report():
+    """Per-component and per-phase totals; phases of different tutors may overlap when initialised in parallel"""
+    with _lock:
+        phases = list(_phases)
+    components = {}
+    totals = {}
+    for component, name, seconds, _ in phases:
+        entry = components.setdefault(component, {})
+        entry[name] = round(entry.get(name, 0.0) + seconds, 4)
+        totals[name] = round(totals.get(name, 0.0) + seconds, 4)
+    return {
+        'components': components,
+        'phases': totals,
+        'wall_seconds': round(max((end for *_, end in phases), default=0.0), 4)
+    }
+
+
+def print_report():
+    data = report()
+    print("⏱️ Startup profile")
+    for component, phases in data['components'].items():
+        print(f"  {component}: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in phases.items()))
+    print("  total per phase: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in data['phases'].items()))
+    print(f"  wall clock until ready: {data['wall_seconds']:.3f}s")
+
+
+if __name__ == '__main__':
+    with phase('import hub'):
+        import vedas_main_app
+    with phase('init tutors'):
+        vedas_main_app.preload_vedas()
+    print_report()
@@ -0,0 +1,409 @@
+// Shared chat and quiz client for the tutor pages.
+// Each page defines window.TUTOR (API name, topics, texts and colours) before loading this file.
+const tutor = window.TUTOR;
+
+let isLoading = false;
+let conversationStarted = false;
+let sessionId = null;  // Issued by the server with the first reply
+let sessionToken = null;  // Signed session state, when the server runs stateless
+let currentQuiz = null;
+let userAnswers = {};
+
+// Auto-resize textarea
+document.getElementById('userInput').addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 120) + 'px';
+});
+
+// Send message on Enter (but allow Shift+Enter for new lines)
+document.getElementById('userInput').addEventListener('keydown', function(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+function apiUrl(action) {
+    return `/api/${tutor.veda}/${action}`;
+}
+
+// Initialize conversation with tutor introduction
+async function initializeConversation() {
+    if (conversationStarted) return;
+
+    setLoading(true);
+
+    try {
+        const response = await fetch(apiUrl('ask'), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                query: '',
+                is_intro: true,
+                session_id: sessionId,
+                session_token: sessionToken
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        const data = await response.json();
+        if (data.session_id) sessionId = data.session_id;
+        if (data.session_token) sessionToken = data.session_token;
+        addMessage(data.answer, 'bot', null, true);
+        conversationStarted = true;
+
+    } catch (error) {
+        console.error('Error:', error);
+        addMessage(tutor.welcomeFallback, 'bot', null, true);
+        conversationStarted = true;
+    } finally {
+        setLoading(false);
+    }
+}
+
+function handleTopicClick(label) {
+    const topic = tutor.topics.find(t => t.label === label);
+    const query = topic ? topic.query : `Tell me about ${label}${tutor.topicSuffix || ''}`;
+    document.getElementById('userInput').value = query;
+    sendMessage();
+}
+
+function askFollowUp(question) {
+    document.getElementById('userInput').value = question;
+    sendMessage();
+}
+
+async function sendMessage() {
+    if (isLoading) return;
+
+    const input = document.getElementById('userInput');
+    const query = input.value.trim();
+
+    if (!query) return;
+
+    // Clear input and show loading
+    input.value = '';
+    input.style.height = 'auto';
+    setLoading(true);
+
+    // Add user message
+    addMessage(query, 'user');
+
+    try {
+        const response = await fetch(apiUrl('ask'), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                query: query,
+                topk: 5,
+                session_id: sessionId,
+                session_token: sessionToken
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        const data = await response.json();
+        if (data.session_id) sessionId = data.session_id;
+        if (data.session_token) sessionToken = data.session_token;
+
+        // Add bot response
+        addMessage(data.answer, 'bot', data.verses);
+
+        // Check if quiz should be triggered
+        if (data.quiz_triggered) {
+            showQuizNotification();
+            setTimeout(() => generateQuiz(), 2000);
+        }
+
+    } catch (error) {
+        console.error('Error:', error);
+        addMessage(tutor.errorMessage, 'bot');
+    } finally {
+        setLoading(false);
+    }
+}
+
+function addMessage(text, sender, verses = null, isIntro = false) {
+    const messagesContainer = document.getElementById('chatMessages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${sender}-message`;
+
+    if (sender === 'user') {
+        messageDiv.innerHTML = `<div class="user-bubble">${escapeHtml(text)}</div>`;
+    } else {
+        let versesHtml = '';
+        if (verses && verses.length > 0) {
+            versesHtml = '<div style="margin-top: 15px; font-size: 0.9em; color: #666;">' +
+                verses.map(v =>
+                    `<div class="verse-reference">${tutor.verseReference(v)}</div>`
+                ).join('') + '</div>';
+        }
+
+        messageDiv.innerHTML = `
+            <div class="bot-bubble">
+                ${formatMessage(text, isIntro)}
+                ${versesHtml}
+            </div>
+        `;
+    }
+
+    messagesContainer.appendChild(messageDiv);
+    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+}
+
+function formatMessage(text, isIntro = false) {
+    let processedText = text;
+
+    if (isIntro) {
+        // Convert topic buttons to actual HTML buttons
+        tutor.topics.forEach(({ icon, label }) => {
+            const button = `<button class="example-query" onclick="handleTopicClick('${label.replace(/'/g, "\\'")}')">${icon} <strong>${label}</strong></button>`;
+            processedText = processedText.split(`${icon} **${label}**`).join(button);
+        });
+    }
+
+    // Handle follow-up questions format
+    const followUpRegex = /\*\*Follow-up Questions:\*\*\s*\n((?:• .+\?\s*\n?)+)/;
+    const followUpMatch = processedText.match(followUpRegex);
+
+    if (followUpMatch) {
+        const questionsText = followUpMatch[1];
+        const questions = questionsText.split('\n').filter(q => q.trim().startsWith('•'));
+
+        let buttonsHtml = '<div style="margin-top: 15px;"><strong>Follow-up Questions:</strong><br><div style="margin-top: 8px; display: flex; flex-wrap: wrap; gap: 8px;">';
+
+        questions.forEach(q => {
+            const questionText = q.replace('•', '').trim();
+            if (questionText) {
+                buttonsHtml += `<button class="example-query" onclick="askFollowUp('${questionText.replace(/'/g, "\\'")}')">• ${questionText}</button>`;
+            }
+        });
+
+        buttonsHtml += '</div></div>';
+        processedText = processedText.replace(followUpRegex, buttonsHtml);
+    }
+
+    // Convert markdown formatting to HTML
+    processedText = processedText
+        .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+        .replace(/\*(.*?)\*/g, '<em>$1</em>');
+    Object.entries(tutor.highlights).forEach(([emoji, style]) => {
+        processedText = processedText.split(emoji).join(`<span style="${style}">${emoji}</span>`);
+    });
+    return processedText
+        .replace(/\n\n/g, '<br><br>')
+        .replace(/\n/g, '<br>');
+}
+
+function setLoading(loading) {
+    isLoading = loading;
+    const sendButton = document.getElementById('sendButton');
+    const sendIcon = document.getElementById('sendIcon');
+
+    if (loading) {
+        sendIcon.innerHTML = '<div class="loading"></div>';
+        sendButton.disabled = true;
+    } else {
+        sendIcon.innerHTML = '➤';
+        sendButton.disabled = false;
+    }
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Quiz Functions
+function showQuizNotification() {
+    const quizContent = document.getElementById('quizContent');
+    quizContent.innerHTML = `
+        <div class="quiz-notification">
+            <h3>${tutor.quizNotification.title}</h3>
+            <p>${tutor.quizNotification.text}</p>
+        </div>
+    `;
+}
+
+async function generateQuiz() {
+    try {
+        const response = await fetch(apiUrl('generate-quiz'), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                session_id: sessionId,
+                session_token: sessionToken
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        const data = await response.json();
+        if (data.session_id) sessionId = data.session_id;
+        if (data.session_token) sessionToken = data.session_token;
+        currentQuiz = data.quiz;
+        userAnswers = {};
+        displayQuiz(data.quiz, data.topics);
+
+    } catch (error) {
+        console.error('Error generating quiz:', error);
+        const quizContent = document.getElementById('quizContent');
+        quizContent.innerHTML = `
+            <div class="quiz-waiting">
+                <p>${tutor.quizUnavailable}</p>
+            </div>
+        `;
+    }
+}
+
+function displayQuiz(quiz, topics) {
+    const quizContent = document.getElementById('quizContent');
+
+    let questionsHtml = quiz.questions.map((question, index) => `
+        <div class="quiz-question">
+            <div class="question-text">${index + 1}. ${question.question}</div>
+            ${Object.entries(question.options).map(([key, value]) => `
+                <button class="quiz-option" onclick="selectOption(${index}, '${key}', this)">
+                    <strong>${key}:</strong> ${value}
+                </button>
+            `).join('')}
+        </div>
+    `).join('');
+
+    quizContent.innerHTML = `
+        <div style="margin-bottom: 15px;">
+            <h3 style="color: ${tutor.accentColor}; margin-bottom: 5px;">${tutor.quizTopicsHeading}</h3>
+            <p style="font-size: 0.9em; color: #666;">${topics.join(', ')}</p>
+        </div>
+        ${questionsHtml}
+        <button class="quiz-submit-btn" onclick="submitQuiz()" disabled>
+            Submit Quiz 🎯
+        </button>
+    `;
+}
+
+function selectOption(questionIndex, option, buttonElement) {
+    // Clear previous selection for this question
+    const questionDiv = buttonElement.parentElement;
+    questionDiv.querySelectorAll('.quiz-option').forEach(btn => {
+        btn.classList.remove('selected');
+    });
+
+    // Mark current selection
+    buttonElement.classList.add('selected');
+    userAnswers[questionIndex.toString()] = option;
+
+    // Check if all questions are answered
+    const totalQuestions = currentQuiz ? currentQuiz.questions.length : 0;
+    const submitBtn = document.querySelector('.quiz-submit-btn');
+    if (Object.keys(userAnswers).length === totalQuestions) {
+        submitBtn.disabled = false;
+    }
+}
+
+async function submitQuiz() {
+    if (!currentQuiz) return;
+
+    try {
+        const response = await fetch(apiUrl('submit-quiz'), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                session_id: sessionId,
+                answers: userAnswers,
+                quiz_questions: currentQuiz.questions
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`Server error: ${response.status}`);
+        }
+
+        const data = await response.json();
+        if (data.session_id) sessionId = data.session_id;
+        if (data.session_token) sessionToken = data.session_token;
+        displayQuizResults(data);
+
+    } catch (error) {
+        console.error('Error submitting quiz:', error);
+        alert('Failed to submit quiz. Please try again.');
+    }
+}
+
+function displayQuizResults(results) {
+    const quizContent = document.getElementById('quizContent');
+
+    let resultsHtml = results.results.map((result, index) => {
+        const userAnswerText = currentQuiz.questions[index].options[result.user_answer] || 'No answer';
+        const correctAnswerText = currentQuiz.questions[index].options[result.correct_answer];
+
+        return `
+            <div class="quiz-question">
+                <div class="question-text">${index + 1}. ${result.question}</div>
+                <div style="margin: 10px 0;">
+                    <div style="color: ${result.is_correct ? '#27ae60' : '#e74c3c'}; font-weight: 600;">
+                        Your answer: ${result.user_answer}: ${userAnswerText}
+                        ${result.is_correct ? '✅' : '❌'}
+                    </div>
+                    ${!result.is_correct ? `
+                        <div style="color: #27ae60; font-weight: 600; margin-top: 5px;">
+                            Correct answer: ${result.correct_answer}: ${correctAnswerText} ✅
+                        </div>
+                    ` : ''}
+                </div>
+                <div class="explanation-text">
+                    💡 ${result.explanation}
+                </div>
+            </div>
+        `;
+    }).join('');
+
+    quizContent.innerHTML = `
+        <div class="quiz-results">
+            <div class="quiz-score">${results.score}/${results.total}</div>
+            <div class="quiz-feedback">${results.feedback}</div>
+            <div style="font-size: 1.1em; color: ${tutor.accentColor}; font-weight: 600;">
+                Score: ${Math.round(results.percentage)}%
+            </div>
+            <button class="new-quiz-btn" onclick="resetQuizArea()">
+                ${tutor.continueLabel}
+            </button>
+        </div>
+        ${resultsHtml}
+    `;
+}
+
+function resetQuizArea() {
+    const quizContent = document.getElementById('quizContent');
+    quizContent.innerHTML = `
+        <div class="quiz-waiting">
+            <p>${tutor.afterQuiz.title}</p>
+            <p style="margin-top: 10px; font-size: 0.9em;">${tutor.afterQuiz.text}</p>
+        </div>
+    `;
+    currentQuiz = null;
+    userAnswers = {};
+}
+
+// Initialize conversation when page loads
+window.addEventListener('load', () => {
+    initializeConversation();
+    document.getElementById('userInput').focus();
+});
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+import admission
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    limiter = admission.ModelLimiter('test', max_concurrent=1, max_queue=0)
+    started = limiter.acquire('rigveda')
+    with pytest.raises(admission.AdmissionRejected) as rejected:
+        limiter.acquire('rigveda')
+    assert rejected.value.reason == 'queue full'
+    assert rejected.value.retry_after >= 1
+    assert limiter.rejected == 1
+    limiter.release('rigveda', started)
+
+
+def test_empty_token_bucket_times_out():
+    limiter = admission.ModelLimiter('test', max_concurrent=4, rate_per_minute=1, burst=1, max_wait=0.05)
+    limiter.release('rigveda', limiter.acquire('rigveda'))
+    with pytest.raises(admission.AdmissionRejected) as rejected:
+        limiter.acquire('rigveda')
+    assert rejected.value.reason == 'wait timeout'
+
+
+def test_busy_veda_cannot_take_the_other_vedas_share():
+    limiter = admission.ModelLimiter('test', max_concurrent=2, rate_per_minute=6000, max_wait=2.0)
+    # Alone, rigveda may use both slots
+    first, second = limiter.acquire('rigveda'), limiter.acquire('rigveda')
+    admitted = []
+
+    def wait_for(veda):
+        admitted.append((veda, limiter.acquire(veda)))
+
+    samaveda = threading.Thread(target=wait_for, args=('samaveda',))
+    samaveda.start()
+    time.sleep(0.05)
+    rigveda = threading.Thread(target=wait_for, args=('rigveda',))
+    rigveda.start()
+    time.sleep(0.05)
+    # With samaveda waiting each veda is entitled to one slot, so the freed slot goes to samaveda
+    limiter.release('rigveda', first)
+    samaveda.join(timeout=1)
+    time.sleep(0.05)
+    assert [veda for veda, _ in admitted] == ['samaveda']
+    limiter.release('rigveda', second)
+    rigveda.join(timeout=1)
+    assert [veda for veda, _ in admitted] == ['samaveda', 'rigveda']
+    for veda, started in admitted:
+        limiter.release(veda, started)
+
+
+def test_each_veda_gets_a_share_of_the_queue():
+    limiter = admission.ModelLimiter('test', max_concurrent=1, rate_per_minute=6000, max_queue=2, max_wait=1.0)
+    started = limiter.acquire('samaveda')
+    waiter = threading.Thread(target=lambda: limiter.release('rigveda', limiter.acquire('rigveda')))
+    waiter.start()
+    time.sleep(0.05)
+    # rigveda already waits in its half of the queue; samaveda's half is still free
+    with pytest.raises(admission.AdmissionRejected) as rejected:
+        limiter.acquire('rigveda')
+    assert rejected.value.reason == 'veda queue share exhausted'
+    limiter.release('samaveda', started)
+    waiter.join(timeout=1)
+
+
+def test_slot_is_released_when_the_call_raises(monkeypatch):
+    limiter = admission.ModelLimiter('test-model', max_concurrent=1, burst=2, max_queue=0)
+    monkeypatch.setitem(admission._limiters, 'test-model', limiter)
+    with pytest.raises(ValueError):
+        with admission.admit('rigveda', model='test-model'):
+            raise ValueError('upstream failed')
+    assert limiter.stats()['in_flight'] == {}
+    with admission.admit('rigveda', model='test-model'):
+        pass
+    assert limiter.admitted == 2
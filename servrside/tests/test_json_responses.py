@@ -0,0 +1,55 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+orjson = pytest.importorskip('orjson')
+
+import json_responses
+
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    json_responses.install(app)
+
+    @app.route('/verse')
+    def verse():
+        return flask.jsonify({'text_sa': 'अग्निमीळे पुरोहितं', 'score': 0.5})
+
+    return app
+
+
+@pytest.fixture
+def orjson_calls(monkeypatch):
+    calls = []
+    real_dumps = orjson.dumps
+
+    def dumps(obj, **kwargs):
+        calls.append(obj)
+        return real_dumps(obj, **kwargs)
+
+    monkeypatch.setattr(orjson, 'dumps', dumps)
+    monkeypatch.setattr(json_responses, 'FAST_JSON', True)
+    return calls
+
+
+def test_jsonify_is_encoded_with_orjson(app, orjson_calls):
+    response = app.test_client().get('/verse')
+    assert response.get_json() == {'text_sa': 'अग्निमीळे पुरोहितं', 'score': 0.5}
+    assert orjson_calls == [{'text_sa': 'अग्निमीळे पुरोहितं', 'score': 0.5}]
+    # Compact, raw UTF-8 output like the stdlib encoder with ensure_ascii=False
+    assert response.get_data(as_text=True) == '{"text_sa":"अग्निमीळे पुरोहितं","score":0.5}\n'
+    assert json_responses.stats()['by_encoder'].get('orjson', 0) >= 1
+
+
+def test_debug_jsonify_is_indented_by_orjson(app, orjson_calls):
+    app.debug = True
+    response = app.test_client().get('/verse')
+    assert orjson_calls
+    assert response.get_data(as_text=True).startswith('{\n  "text_sa"')
+
+
+def test_options_without_orjson_equivalent_use_stdlib(app, orjson_calls):
+    with app.app_context():
+        text = app.json.dumps({'a': 1}, indent=4)
+    assert orjson_calls == []
+    assert text == '{\n    "a": 1\n}'
@@ -0,0 +1,81 @@
+import pytest
+
+import prompt_budget
+
+OVERHEAD = prompt_budget.VERSE_OVERHEAD_TOKENS
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Count with the byte-length estimate, as without tiktoken, so the numbers below are exact"""
+    monkeypatch.setattr(prompt_budget, '_encoding', False)
+    monkeypatch.setattr(prompt_budget, 'MIN_VERSE_TOKENS', 10)
+
+
+def verse(name, tokens, text=None):
+    return {'verse': name, 'text_sa': text if text is not None else name * 300, 'tokens': tokens}
+
+
+def names(fitted):
+    return [v['verse'] for v, _, _ in fitted]
+
+
+def test_no_results_fit_nothing():
+    assert prompt_budget.fit([], budget=100) == []
+
+
+def test_results_are_kept_in_rank_order_within_the_budget():
+    results = [(verse('a', 20), 0.9), (verse('b', 20), 0.8), (verse('c', 20), 0.7)]
+    fitted = prompt_budget.fit(results, budget=2 * (20 + OVERHEAD))
+    assert names(fitted) == ['a', 'b']
+    assert [score for _, score, _ in fitted] == [0.9, 0.8]
+    assert fitted[0][2] == results[0][0]['text_sa']
+
+
+def test_verse_over_the_remaining_budget_is_cut_and_ends_the_context():
+    results = [(verse('a', 20), 0.9), (verse('b', 100), 0.8), (verse('c', 5), 0.7)]
+    fitted = prompt_budget.fit(results, budget=(20 + OVERHEAD) + (30 + OVERHEAD))
+    assert names(fitted) == ['a', 'b']
+    text = fitted[1][2]
+    assert text.endswith(' …')
+    # The estimate keeps 3 bytes per token of the remaining 30
+    assert text[:-2] == 'b' * 90
+
+
+def test_verse_that_leaves_too_little_room_is_skipped_for_a_shorter_one():
+    results = [(verse('a', 20), 0.9), (verse('b', 100), 0.8), (verse('c', 3), 0.7)]
+    fitted = prompt_budget.fit(results, budget=(20 + OVERHEAD) + (5 + OVERHEAD))
+    assert names(fitted) == ['a', 'c']
+    assert not fitted[1][2].endswith(' …')
+
+
+def test_single_verse_over_the_budget_is_still_kept():
+    fitted = prompt_budget.fit([(verse('a', 500), 0.9)], budget=4)
+    assert names(fitted) == ['a']
+    # Never cut below MIN_VERSE_TOKENS, even when the budget is smaller
+    assert fitted[0][2] == 'a' * (3 * prompt_budget.MIN_VERSE_TOKENS) + ' …'
+
+
+def test_token_counts_are_estimated_without_tiktoken():
+    assert prompt_budget.count_tokens('abcdef') == 3
+    # Devanagari is 3 bytes per character in UTF-8
+    assert prompt_budget.count_tokens('अग्नि') == len('अग्नि'.encode('utf-8')) // 3 + 1
+    # Truncation never splits a multi-byte character
+    assert prompt_budget.truncate('अग्नि', 2) == 'अग'
+
+
+def test_missing_counts_are_filled_in():
+    verses = [{'text_sa': 'abcdef'}, {'text': 'abc', 'tokens': 7}, 'not a verse']
+    assert prompt_budget.ensure_token_counts(verses) == 1
+    assert verses[0]['tokens'] == 3
+    assert verses[1]['tokens'] == 7
+    fitted = prompt_budget.fit([({'verse': 'x', 'text_sa': 'abcdef'}, 1.0)], budget=100)
+    assert fitted[0][2] == 'abcdef'
+
+
+@pytest.mark.parametrize('topk, expected', [
+    (3, 3), ('4', 4), (0, 1), (-5, 1),
+    (10 ** 6, prompt_budget.MAX_TOPK), ('x', prompt_budget.DEFAULT_TOPK), (None, prompt_budget.DEFAULT_TOPK)
+])
+def test_cap_topk(topk, expected):
+    assert prompt_budget.cap_topk(topk) == expected
@@ -0,0 +1,152 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import mini_redis
+import redis_sessions
+
+
+@pytest.fixture
+def server():
+    server = mini_redis.start_in_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(server):
+    return redis_sessions.RedisSessionStore('test.conversations', redis_sessions.RespClient(server.url), max_messages=3)
+
+
+def message(n):
+    return {'timestamp': n, 'sender': 'user', 'text': f"question {n}"}
+
+
+def test_extend_trims_to_max_messages(store):
+    store.extend('s1', [message(1), message(2)])
+    store.extend('s1', [message(3), message(4)])
+    assert store['s1'] == [message(2), message(3), message(4)]
+
+
+def test_values_and_histories_expire(server):
+    store = redis_sessions.RedisSessionStore('test.quiz', redis_sessions.RespClient(server.url), ttl_seconds=1)
+    store.extend('history', [message(1)])
+    store['value'] = {'message_count': 1}
+    assert store['value'] == {'message_count': 1}
+    time.sleep(1.1)
+    assert 'history' not in store
+    with pytest.raises(KeyError):
+        store['value']
+
+
+def test_update_is_atomic_across_clients(server):
+    stores = [
+        redis_sessions.RedisSessionStore('test.quiz', redis_sessions.RespClient(server.url)) for _ in range(4)
+    ]
+
+    def advance(state):
+        state['message_count'] += 1
+        return state, state['message_count']
+
+    def work(store):
+        for _ in range(25):
+            store.update('s1', advance, default=lambda: {'message_count': 0})
+
+    threads = [threading.Thread(target=work, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stores[0]['s1'] == {'message_count': 100}
+
+
+def test_update_retries_after_a_concurrent_write(server, store):
+    other = redis_sessions.RedisSessionStore('test.conversations', redis_sessions.RespClient(server.url))
+    store['s1'] = {'count': 0}
+    calls = []
+
+    def bump(state):
+        calls.append(dict(state))
+        if len(calls) == 1:
+            other['s1'] = {'count': 10}
+        return {'count': state['count'] + 1}, None
+
+    store.update('s1', bump)
+    assert calls == [{'count': 0}, {'count': 10}]
+    assert store['s1'] == {'count': 11}
+    assert store.stats()['update_conflicts'] == 1
+
+
+def test_reconnects_after_the_server_closes_an_idle_connection(store):
+    store['s1'] = {'count': 1}
+    sock, _ = store.client._local.conn
+    sock.shutdown(socket.SHUT_RDWR)
+    store.extend('s2', [message(1)])
+    assert store['s1'] == {'count': 1}
+    assert store['s2'] == [message(1)]
+
+
+@pytest.fixture
+def dropping_server():
+    """Accepts connections, reads one request and closes without replying"""
+    listener = socket.create_server(('127.0.0.1', 0))
+    connections = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            connections.append(conn.recv(65536))
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    host, port = listener.getsockname()
+    yield f"redis://{host}:{port}/0", connections
+    listener.close()
+
+
+def test_non_idempotent_pipeline_is_not_resent(dropping_server):
+    url, connections = dropping_server
+    client = redis_sessions.RespClient(url, timeout=1)
+    with pytest.raises(ConnectionError):
+        client.pipeline([('RPUSH', 'k', 'a')])
+    time.sleep(0.05)
+    assert len(connections) == 1
+
+
+def test_idempotent_pipeline_is_resent_once(dropping_server):
+    url, connections = dropping_server
+    client = redis_sessions.RespClient(url, timeout=1)
+    with pytest.raises(ConnectionError):
+        client.pipeline([('GET', 'k')])
+    time.sleep(0.05)
+    assert len(connections) == 2
+
+
+def test_update_does_not_run_unwatched_after_a_reconnect(store):
+    store['s1'] = {'count': 0}
+
+    def bump(state):
+        # The connection drops between WATCH and EXEC
+        store.client._local.conn[0].shutdown(socket.SHUT_RDWR)
+        return {'count': state['count'] + 1}, None
+
+    with pytest.raises(OSError):
+        store.update('s1', bump)
+    assert store['s1'] == {'count': 0}
+
+
+def test_sessions_unseen_for_the_ttl_are_handed_to_on_evict(server):
+    store = redis_sessions.RedisSessionStore('test.conversations', redis_sessions.RespClient(server.url), ttl_seconds=1)
+    evicted = []
+    store.on_evict = evicted.append
+    store.extend('old', [message(1)])
+    time.sleep(1.1)
+    store.extend('new', [message(2)])
+    assert evicted == ['old']
+    assert store.stats()['expired'] == 1
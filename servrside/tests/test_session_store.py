@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+import session_store
+
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    """A private memory budget, so stores of one test do not evict those of another"""
+    budget = session_store.MemoryBudget(0)
+    monkeypatch.setattr(session_store, '_budget', budget)
+    return budget
+
+
+def message(n, text='question'):
+    return {'timestamp': n, 'sender': 'user', 'text': f"{text} {n}"}
+
+
+def test_extend_keeps_the_newest_max_messages():
+    store = session_store.SessionStore('test.conversations', max_messages=3)
+    store.extend('s1', [message(1), message(2)])
+    store.extend('s1', [message(3), message(4)])
+    assert store['s1'] == [message(2), message(3), message(4)]
+    assert store.stats()['trimmed_messages'] == 1
+
+
+def test_idle_sessions_expire_and_are_handed_to_on_evict():
+    store = session_store.SessionStore('test.conversations', ttl_seconds=0.05)
+    evicted = []
+    store.on_evict = evicted.append
+    store['s1'] = {'message_count': 1}
+    time.sleep(0.1)
+    with pytest.raises(KeyError):
+        store['s1']
+    assert evicted == ['s1']
+    assert store.stats()['expired'] == 1
+
+
+def test_update_is_atomic_and_returns_the_result():
+    store = session_store.SessionStore('test.quiz')
+
+    def advance(state):
+        state['message_count'] += 1
+        return state, state['message_count']
+
+    assert [store.update('s1', advance, default=lambda: {'message_count': 0}) for _ in range(3)] == [1, 2, 3]
+    assert store['s1'] == {'message_count': 3}
+
+
+def test_memory_budget_evicts_the_least_recently_used_session(budget):
+    conversations = session_store.SessionStore('test.conversations')
+    quizzes = session_store.SessionStore('test.quiz')
+    evicted = []
+    conversations.on_evict = evicted.append
+    quizzes.on_evict = evicted.append
+
+    conversations.extend('s1', [message(1, 'x' * 1000)])
+    quizzes['s2'] = {'text': 'y' * 1000}
+    budget.max_bytes = budget.used_bytes() + 500
+    conversations['s1']  # s1 is now more recently used than s2
+    conversations.extend('s3', [message(3, 'z' * 1000)])
+
+    assert evicted == ['s2']
+    assert budget.used_bytes() <= budget.max_bytes
+    assert 's2' not in quizzes
+    assert conversations.stats()['sessions'] == 2
+
+
+def test_sqlite_backend_round_trip(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    backend = session_store.SqliteBackend(path, flush_interval=0.01)
+    conversations = session_store.SessionStore('test.conversations', backend=backend)
+    quizzes = session_store.SessionStore('test.quiz', backend=backend)
+    conversations.extend('s1', [message(1), message(2)])
+    conversations.extend('s1', [message(3)])
+    quizzes['s1'] = {'message_count': 3}
+    assert backend.flush()
+    assert backend.stats()['written_ops'] == 3
+
+    # A fresh process reads the sessions back on first use
+    reopened = session_store.SqliteBackend(path)
+    assert session_store.SessionStore('test.conversations', backend=reopened)['s1'] == [message(1), message(2), message(3)]
+    assert session_store.SessionStore('test.quiz', backend=reopened)['s1'] == {'message_count': 3}
+
+
+def test_sqlite_backend_reads_its_own_pending_writes(tmp_path):
+    backend = session_store.SqliteBackend(str(tmp_path / 'sessions.db'), flush_interval=0.5)
+    store = session_store.SessionStore('test.conversations', backend=backend)
+    store.extend('s1', [message(1)])
+    # Evicted from memory before the write-behind thread wrote it: load() flushes first
+    assert store.evict('s1')
+    assert store['s1'] == [message(1)]
+
+
+def test_sqlite_backend_deletes(tmp_path):
+    backend = session_store.SqliteBackend(str(tmp_path / 'sessions.db'), flush_interval=0.01)
+    store = session_store.SessionStore('test.quiz', backend=backend)
+    store['s1'] = {'message_count': 1}
+    del store['s1']
+    assert backend.flush()
+    assert backend.load('test.quiz', 's1') is None
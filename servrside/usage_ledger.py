@@ -0,0 +1,205 @@
+import atexit
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# OpenAI usage of every response, aggregated by veda and call type (answer, topics, quiz, summary, embed)
+# and by session. Deltas are appended to USAGE_LOG_PATH every USAGE_FLUSH_SECONDS.
+USAGE_LOG_PATH = os.getenv('USAGE_LOG_PATH', './databse/usage.jsonl')
+USAGE_FLUSH_SECONDS = float(os.getenv('USAGE_FLUSH_SECONDS', 60))
+USAGE_MAX_SESSIONS = int(os.getenv('USAGE_MAX_SESSIONS', 10000))
+# Tokens a session may use before its LLM-bound requests are refused; 0 means no quota. Counted by
+# each worker process on its own, so it is a best-effort cap: N workers may let a session use up to N times it.
+SESSION_TOKEN_QUOTA = int(os.getenv('SESSION_TOKEN_QUOTA', 0))
+# /api/usage answers only requests that send X-Usage-Token: <USAGE_TOKEN> (or ?token=); unset hides it
+USAGE_TOKEN = os.getenv('USAGE_TOKEN', '')
+
+# USD per million (prompt, completion) tokens, matched by model name prefix; USAGE_PRICES (JSON) overrides
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'text-embedding-3-large': (0.13, 0.0),
+    'text-embedding-3-small': (0.02, 0.0),
+}
+PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv('USAGE_PRICES', '{}')).items()})
+
+# Session the current upstream call is made for; set by the request handler or background task
+_session = contextvars.ContextVar('usage_session', default=None)
+
+_lock = threading.Lock()
+_by_call = {}
+_by_session = OrderedDict()
+_pending = {}
+_flusher = None
+_flusher_pid = None
+
+
+class QuotaExceeded(Exception):
+    """Raised when a session has used up its token quota"""
+
+    def __init__(self, used, quota):
+        super().__init__(f"session used {used} of {quota} tokens")
+        self.used = used
+        self.quota = quota
+
+
+@contextmanager
+def attribute(session_id):
+    """Charge upstream calls made inside the block to `session_id`"""
+    token = _session.set(session_id)
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def price(model, prompt_tokens, completion_tokens):
+    """Cost in USD, or 0.0 for a model without a known price"""
+    for name in sorted(PRICES, key=len, reverse=True):
+        if (model or '').startswith(name):
+            prompt_price, completion_price = PRICES[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return 0.0
+
+
+def _new_totals():
+    return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0}
+
+
+def _add(totals, prompt_tokens, completion_tokens, cost):
+    totals['calls'] += 1
+    totals['prompt_tokens'] += prompt_tokens
+    totals['completion_tokens'] += completion_tokens
+    totals['cost_usd'] += cost
+
+
+def record(veda, call, model, prompt_tokens, completion_tokens):
+    """Account one upstream response to its veda, call type and the current session"""
+    cost = price(model, prompt_tokens, completion_tokens)
+    session_id = _session.get()
+    with _lock:
+        _add(_by_call.setdefault((veda, call), _new_totals()), prompt_tokens, completion_tokens, cost)
+        _add(_pending.setdefault((veda, call, _session_key(session_id)), _new_totals()), prompt_tokens, completion_tokens, cost)
+        if session_id:
+            totals = _by_session.get(session_id)
+            if totals is None:
+                totals = _by_session[session_id] = dict(_new_totals(), veda=veda)
+            _by_session.move_to_end(session_id)
+            _add(totals, prompt_tokens, completion_tokens, cost)
+            while len(_by_session) > USAGE_MAX_SESSIONS:
+                _by_session.popitem(last=False)
+    _ensure_flusher()
+
+
+def _session_key(session_id):
+    # Session ids are bearer credentials; reports and the usage log only carry a short hash
+    if not session_id:
+        return None
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:12]
+
+
+def session_tokens(session_id):
+    with _lock:
+        totals = _by_session.get(session_id)
+        return totals['prompt_tokens'] + totals['completion_tokens'] if totals else 0
+
+
+def check_quota(session_id):
+    """Raise QuotaExceeded if the session has used up SESSION_TOKEN_QUOTA"""
+    if SESSION_TOKEN_QUOTA and session_id:
+        used = session_tokens(session_id)
+        if used >= SESSION_TOKEN_QUOTA:
+            raise QuotaExceeded(used, SESSION_TOKEN_QUOTA)
+
+
+def report_allowed(supplied):
+    """True if `supplied` matches USAGE_TOKEN (never when it is unset)"""
+    return bool(USAGE_TOKEN and supplied and hmac.compare_digest(supplied, USAGE_TOKEN))
+
+
+def _rounded(totals):
+    return dict(totals, cost_usd=round(totals['cost_usd'], 6))
+
+
+def flush():
+    """Append the usage gathered since the last flush to USAGE_LOG_PATH"""
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+    now = time.time()
+    lines = [
+        json.dumps(dict(_rounded(totals), ts=now, pid=os.getpid(), veda=veda, call=call, session=session))
+        for (veda, call, session), totals in pending.items()
+    ]
+    try:
+        os.makedirs(os.path.dirname(USAGE_LOG_PATH) or '.', exist_ok=True)
+        with open(USAGE_LOG_PATH, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+    except OSError as e:
+        log.error("Could not write usage log %s: %s", USAGE_LOG_PATH, e)
+        # Keep the counts for the next attempt
+        with _lock:
+            for key, totals in pending.items():
+                merged = _pending.setdefault(key, _new_totals())
+                for field in merged:
+                    merged[field] += totals[field]
+        return 0
+    return len(lines)
+
+
+def _ensure_flusher():
+    # One flusher per process (a forked worker starts its own)
+    global _flusher, _flusher_pid
+    if not USAGE_FLUSH_SECONDS or (_flusher is not None and _flusher_pid == os.getpid()):
+        return
+    with _lock:
+        if _flusher is not None and _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        _flusher = threading.Thread(target=_flush_forever, name='usage-flusher', daemon=True)
+        _flusher.start()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(USAGE_FLUSH_SECONDS)
+        flush()
+
+
+atexit.register(flush)
+
+
+def report(session_id=None, top=10):
+    """Usage by veda and call type, the costliest sessions and, if given, one session's usage"""
+    with _lock:
+        by_call = [dict(_rounded(totals), veda=veda, call=call) for (veda, call), totals in _by_call.items()]
+        sessions = sorted(_by_session.items(), key=lambda item: item[1]['cost_usd'], reverse=True)[:top]
+        top_sessions = [dict(_rounded(totals), session=_session_key(sid)) for sid, totals in sessions]
+        session = _by_session.get(session_id) if session_id else None
+        session = _rounded(session) if session else None
+    total = _new_totals()
+    for row in by_call:
+        for field in total:
+            total[field] += row[field]
+    by_call.sort(key=lambda row: row['cost_usd'], reverse=True)
+    result = {
+        'total': _rounded(total),
+        'by_veda_call': by_call,
+        'top_sessions': top_sessions,
+        'session_token_quota': SESSION_TOKEN_QUOTA or None,
+        'tracked_sessions': len(_by_session),
+    }
+    if session_id:
+        result['session'] = session
+    return result
@@ -0,0 +1,222 @@
+import importlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+import background_tasks
+import startup_profile
+from session_store import approx_size
+
+
+log = logging.getLogger(__name__)
+
+def _data_bytes(module):
+    """Rough size of a tutor's FAISS index plus verses metadata"""
+    size = 0
+    index = getattr(module, 'index', None)
+    if index is not None and hasattr(index, 'ntotal'):
+        size += index.ntotal * index.d * 4
+    verses = getattr(module, 'verses', None)
+    if verses is not None:
+        size += approx_size(verses)
+    return size
+
+
+class VedaLoader:
+    """Loads tutor modules on first use, warms them in the background and unloads idle ones under a memory budget"""
+
+    def __init__(self, vedas, memory_budget_mb=None, idle_seconds=None):
+        self.vedas = list(vedas)
+        budget = memory_budget_mb if memory_budget_mb is not None else os.getenv('VEDA_MEMORY_BUDGET_MB', 0)
+        self.memory_budget = int(float(budget) * 1024 * 1024)
+        self.idle_seconds = float(idle_seconds or os.getenv('VEDA_IDLE_SECONDS', 600))
+        self._lock = threading.Lock()
+        self._veda_locks = {veda: threading.Lock() for veda in self.vedas}
+        self._available = {}
+        # Tutors the memory budget never unloads (e.g. the ones readiness depends on)
+        self.pinned = set()
+        self._entries = {
+            veda: {
+                'state': 'unloaded', 'module': None, 'bytes': 0, 'last_used': None, 'in_flight': 0,
+                'loads': 0, 'unloads': 0, 'load_seconds': None, 'error': None
+            }
+            for veda in self.vedas
+        }
+        self._sweeper = None
+        self._sweeper_pid = None
+        # Bumped on every state change, so cached status views know when to rebuild
+        self.version = 0
+
+    def available(self, veda):
+        """True if the tutor module exists, without importing it"""
+        if veda not in self._available:
+            self._available[veda] = veda in self._entries and importlib.util.find_spec(f"{veda}_app") is not None
+        return self._available[veda]
+
+    def peek(self, veda):
+        """The module if its index is loaded right now, without loading anything"""
+        entry = self._entries[veda]
+        return entry['module'] if entry['state'] == 'loaded' else None
+
+    def load(self, veda):
+        """Import the tutor (or reload its data after an unload) and return the module, or None"""
+        entry = self._entries[veda]
+        if entry['state'] in ('loaded', 'failed'):
+            return entry['module']
+
+        with self._veda_locks[veda]:
+            if entry['state'] in ('loaded', 'failed', 'unavailable'):
+                return entry['module']
+            module = entry['module']
+            with self._lock:
+                entry['state'] = 'loading'
+                self.version += 1
+            started = time.perf_counter()
+            try:
+                if module is None:
+                    with startup_profile.phase('module import', veda):
+                        module = importlib.import_module(f"{veda}_app")
+                    module.init()
+                else:
+                    # A reload after an idle unload is not part of the startup profile
+                    with startup_profile.paused():
+                        module.load_data()
+            except ImportError as e:
+                log.warning("Could not load %s_app.py - %s", veda, e)
+                with self._lock:
+                    entry.update(state='unavailable', error=str(e))
+                    self.version += 1
+                return None
+
+            loaded = getattr(module, 'index', None) is not None
+            size = _data_bytes(module) if loaded else 0
+            with self._lock:
+                entry.update(
+                    module=module,
+                    state='loaded' if loaded else 'failed',
+                    bytes=size,
+                    last_used=time.monotonic(),
+                    loads=entry['loads'] + 1,
+                    load_seconds=round(time.perf_counter() - started, 3),
+                    error=None if loaded else 'index or metadata missing'
+                )
+                self.version += 1
+
+        self._ensure_sweeper()
+        self.enforce(keep=veda)
+        return module
+
+    def acquire(self, veda):
+        """Loaded module for a request; pair with release() so it is not unloaded while in use"""
+        entry = self._entries[veda]
+        while True:
+            module = self.load(veda)
+            if module is None:
+                return None
+            self._ensure_sweeper()
+            with self._lock:
+                # The sweeper may have unloaded it in between; then load again
+                if entry['state'] in ('loaded', 'failed'):
+                    entry['in_flight'] += 1
+                    entry['last_used'] = time.monotonic()
+                    return module
+
+    def release(self, veda):
+        with self._lock:
+            entry = self._entries[veda]
+            entry['in_flight'] = max(0, entry['in_flight'] - 1)
+            entry['last_used'] = time.monotonic()
+
+    def pin(self, vedas):
+        """Keep these tutors loaded once they are: the memory budget never unloads them"""
+        with self._lock:
+            self.pinned.update(vedas)
+
+    def warm(self, vedas=None):
+        """Load tutors in the background so their first request does not pay for it"""
+        for veda in self.vedas if vedas is None else vedas:
+            if self._entries[veda]['state'] == 'unloaded' and self.available(veda):
+                background_tasks.submit(self.load, veda)
+
+    def memory_bytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def enforce(self, keep=None):
+        """Unload least recently used idle tutors while over the memory budget"""
+        unloaded = []
+        if not self.memory_budget:
+            return unloaded
+        while True:
+            with self._lock:
+                if self.memory_bytes() <= self.memory_budget:
+                    break
+                cutoff = time.monotonic() - self.idle_seconds
+                candidates = [
+                    (entry['last_used'] or 0, veda) for veda, entry in self._entries.items()
+                    if veda != keep and veda not in self.pinned and entry['state'] == 'loaded' and not entry['in_flight']
+                    and (entry['last_used'] or 0) <= cutoff
+                ]
+                if not candidates:
+                    break
+                veda = min(candidates)[1]
+            if self._unload(veda):
+                unloaded.append(veda)
+            else:
+                break
+        return unloaded
+
+    def _unload(self, veda):
+        entry = self._entries[veda]
+        with self._veda_locks[veda]:
+            with self._lock:
+                if entry['state'] != 'loaded' or entry['in_flight']:
+                    return False
+                entry.update(state='unloaded', bytes=0, unloads=entry['unloads'] + 1)
+                self.version += 1
+            entry['module'].unload_data()
+        log.info("Unloaded idle %s index to stay within the memory budget", veda)
+        return True
+
+    def _ensure_sweeper(self):
+        # Idle tutors must also be released when no further requests arrive; one sweeper per process
+        if not self.memory_budget:
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive() and self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            self._sweeper = threading.Thread(target=self._sweep_forever, name='veda-loader-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(max(1.0, self.idle_seconds / 4))
+            self.enforce()
+
+    def status(self):
+        """Loading state of every tutor, without loading any of them"""
+        now = time.monotonic()
+        with self._lock:
+            vedas = {
+                veda: {
+                    'state': entry['state'],
+                    'memory_mb': round(entry['bytes'] / (1024 * 1024), 1),
+                    'idle_seconds': round(now - entry['last_used'], 1) if entry['last_used'] else None,
+                    'in_flight': entry['in_flight'],
+                    'pinned': veda in self.pinned,
+                    'loads': entry['loads'],
+                    'unloads': entry['unloads'],
+                    'load_seconds': entry['load_seconds'],
+                    'error': entry['error']
+                }
+                for veda, entry in self._entries.items()
+            }
+            total = self.memory_bytes()
+        return {
+            'vedas': vedas,
+            'memory_mb': round(total / (1024 * 1024), 1),
+            'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 1) if self.memory_budget else None,
+            'idle_seconds': self.idle_seconds
+        }
@@ -1,63 +1,162 @@
-from flask import Flask, request, jsonify, render_template_string, redirect, url_for
+from flask import Flask, request, jsonify, render_template_string, redirect, url_for, g, has_request_context, abort
 from flask_cors import CORS
+import hmac
+import logging
 import os
-import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+import admission
+import faq_store
+import http_cache
+import json_responses
+import metrics
+import prompt_budget
+import readiness
+import request_log
+import request_profiler
+import session_store
+import session_token
+import startup_profile
+import usage_ledger
+import veda_loader
 
-# Initialize Flask app
-app = Flask(__name__)
+log = logging.getLogger(__name__)
+
+# Initialize Flask app (shared assets are served versioned by /static below)
+app = Flask(__name__, static_folder=None)
 CORS(app)
+request_log.install(app)
+json_responses.install(app)
+request_profiler.install(app)
+
+# Tutors served by the hub
+VEDAS = ['rigveda', 'samaveda', 'yajurveda', 'atharvaveda']
 
-# Dictionary to store loaded Veda apps
-veda_apps = {}
+# Clients may ask for a timings block and raw retrieval scores ("debug": true or ?debug=1). Off by default:
+# API_DEBUG=1 honours the flag for everyone (development), DEBUG_TOKEN only with X-Debug-Token: <DEBUG_TOKEN>
+API_DEBUG = os.getenv('API_DEBUG', '0').lower() in ('1', 'true', 'yes')
+DEBUG_TOKEN = os.getenv('DEBUG_TOKEN', '')
+API_PREFIXES = tuple(f'/api/{veda}/' for veda in VEDAS)
+
+# Tutors are imported on first use and their indexes unloaded when idle under VEDA_MEMORY_BUDGET_MB
+loader = veda_loader.VedaLoader(VEDAS)
 
 def load_veda_app(veda_name):
-    """Dynamically load a Veda app module"""
-    try:
-        if veda_name not in veda_apps:
-            module_name = f"{veda_name}_app"
-            veda_apps[veda_name] = importlib.import_module(module_name)
-        return veda_apps[veda_name]
-    except ImportError as e:
-        print(f"Warning: Could not load {veda_name}_app.py - {e}")
-        return None
+    """Load a Veda app module, holding it loaded until the current request ends"""
+    if has_request_context():
+        veda_app = loader.acquire(veda_name)
+        if veda_app:
+            g.setdefault('held_vedas', []).append(veda_name)
+        return veda_app
+    return loader.load(veda_name)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    """Per-stage durations of tutor API calls, for browser devtools and load tests"""
+    if request.path.startswith(API_PREFIXES) and 'request_started' in g:
+        timings = metrics.request_timings()
+        timings['total'] = time.perf_counter() - g.request_started
+        response.headers['Server-Timing'] = metrics.server_timing(timings)
+    return response
+
+def debug_requested(data):
+    flag = (data or {}).get('debug') or request.args.get('debug')
+    if str(flag).lower() not in ('1', 'true', 'yes'):
+        return False
+    if API_DEBUG:
+        return True
+    supplied = request.headers.get('X-Debug-Token')
+    return bool(DEBUG_TOKEN and supplied and hmac.compare_digest(supplied, DEBUG_TOKEN))
+
+def debug_timings():
+    """Stage durations so far in this request, in milliseconds"""
+    timings = metrics.request_timings()
+    timings['total'] = time.perf_counter() - g.request_started
+    return {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+
+@app.teardown_request
+def release_vedas(exc):
+    for veda_name in g.pop('held_vedas', []):
+        loader.release(veda_name)
+
+def preload_vedas(parallel=True):
+    """Initialise every tutor up front (indexes and verse stores included), e.g. in a WSGI master before it forks"""
+    if not parallel:
+        return {veda: loader.load(veda) is not None for veda in VEDAS}
+    # Index reads and client setup of different tutors overlap
+    with ThreadPoolExecutor(max_workers=len(VEDAS), thread_name_prefix='veda-init') as pool:
+        modules = dict(zip(VEDAS, pool.map(loader.load, VEDAS)))
+    return {veda: module is not None for veda, module in modules.items()}
+
+# VEDA_WARM=all (or a comma-separated list) loads tutors in the background at startup
+_warm = os.getenv('VEDA_WARM', '').strip()
+if _warm:
+    loader.warm(VEDAS if _warm == 'all' else [v.strip() for v in _warm.split(',') if v.strip() in VEDAS])
 
 @app.route('/')
 def home():
     """Serve the main Vedas selection page"""
-    try:
-        with open('templates/vedas_landing.html', 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        return """
-        <h1>🕉️ Vedic Wisdom Hub</h1>
-        <p>Welcome to the Vedic Learning Platform!</p>
-        <p>Please create <code>templates/vedas_landing.html</code> with the main landing page.</p>
-        <ul>
-            <li><a href="/rigveda">Rigveda Tutor</a></li>
-            <li><a href="/samaveda">Samaveda Tutor</a></li>
-            <li><a href="/yajurveda">Yajurveda Tutor</a></li>
-            <li><a href="/atharvaveda">Atharvaveda Tutor</a></li>
-        </ul>
-        """
+    page = http_cache.cached_file('templates/vedas_landing.html')
+    if page:
+        return http_cache.file_response(page)
+    
+    return """
+    <h1>🕉️ Vedic Wisdom Hub</h1>
+    <p>Welcome to the Vedic Learning Platform!</p>
+    <p>Please create <code>templates/vedas_landing.html</code> with the main landing page.</p>
+    <ul>
+        <li><a href="/rigveda">Rigveda Tutor</a></li>
+        <li><a href="/samaveda">Samaveda Tutor</a></li>
+        <li><a href="/yajurveda">Yajurveda Tutor</a></li>
+        <li><a href="/atharvaveda">Atharvaveda Tutor</a></li>
+    </ul>
+    """
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Shared tutor CSS/JS; the ?v= URLs stamped into the pages are cached as immutable"""
+    return http_cache.static_response(filename)
+
+def too_busy_response(rejection):
+    """Fast 429 for LLM-bound requests that could not be admitted"""
+    response = jsonify({
+        'error': 'The tutors are very busy right now. Please try again shortly.',
+        'details': rejection.reason,
+        'retry_after': rejection.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+def quota_exceeded_response(exceeded):
+    """403 for a session that has used up its token quota (it does not reset, so retrying cannot help)"""
+    return jsonify({
+        'error': 'This session has reached its usage limit. Please start a new session.',
+        'details': str(exceeded),
+        'used_tokens': exceeded.used,
+        'quota_tokens': exceeded.quota
+    }), 403
 
 def serve_veda_page(veda_name, icon):
     """Generic function to serve a Veda tutor page"""
-    try:
-        # Try enhanced version first, then fallback to basic
-        try:
-            with open(f'templates/{veda_name}/enhanced_index.html', 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            with open(f'templates/{veda_name}/index.html', 'r', encoding='utf-8') as f:
-                return f.read()
-    except FileNotFoundError:
-        return f"""
-        <h1>{icon} {veda_name.title()} Tutor</h1>
-        <p>{veda_name.title()} tutor files not found!</p>
-        <p>Please create the {veda_name.title()} tutor files in <code>templates/{veda_name}/</code></p>
-        <p>Expected files: <code>index.html</code> or <code>enhanced_index.html</code></p>
-        <p><a href="/">← Back to Vedas Hub</a></p>
-        """
+    # The student will ask something soon; load the tutor meanwhile
+    loader.warm([veda_name])
+    # Try enhanced version first, then fallback to basic (both cached in memory, missing files included)
+    page = http_cache.cached_page(f'templates/{veda_name}/enhanced_index.html', f'templates/{veda_name}/index.html')
+    if page:
+        return http_cache.file_response(page)
+    
+    return f"""
+    <h1>{icon} {veda_name.title()} Tutor</h1>
+    <p>{veda_name.title()} tutor files not found!</p>
+    <p>Please create the {veda_name.title()} tutor files in <code>templates/{veda_name}/</code></p>
+    <p>Expected files: <code>index.html</code> or <code>enhanced_index.html</code></p>
+    <p><a href="/">← Back to Vedas Hub</a></p>
+    """
 
 @app.route('/rigveda')
 def rigveda_tutor():
@@ -79,6 +178,35 @@ def atharvaveda_tutor():
     """Serve the Atharvaveda tutor page"""
     return serve_veda_page('atharvaveda', '🌿')
 
+def generate_quiz_from_token(veda_name, veda_app, data):
+    """Quiz for a stateless session, using the history and topics carried by its token"""
+    state = session_token.decode(data.get('session_token'))
+    if not state or not state['turns']:
+        return jsonify({'error': 'No conversation history found'}), 400
+    
+    history = session_token.history(state)
+    topics = session_token.cached_topics(state)
+    if topics:
+        metrics.cache_hit(veda_name, 'topics')
+    usage_id = session_token.usage_id(state)
+    usage_ledger.check_quota(usage_id)
+    with admission.admit(veda_name), usage_ledger.attribute(usage_id):
+        if not topics:
+            topics = veda_app.extract_topics_from_conversation(history)
+        if not topics:
+            return jsonify({'error': 'No topics found in conversation'}), 400
+        
+        quiz_data = veda_app.generate_mcq_quiz(topics, history)
+    if not quiz_data:
+        return jsonify({'error': 'Failed to generate quiz'}), 500
+    
+    session_token.remember_topics(state, topics)
+    return jsonify({
+        'quiz': quiz_data,
+        'topics': topics,
+        'session_token': session_token.encode(state)
+    })
+
 def create_api_routes(veda_name):
     """Create API routes for a specific Veda"""
     
@@ -95,20 +223,52 @@ def create_api_routes(veda_name):
         try:
             data = request.json
             query = data.get('query', '').strip()
-            topk = data.get('topk', 5)
+            topk = prompt_budget.cap_topk(data.get('topk', 5))
             is_intro = data.get('is_intro', False)
-            session_id = data.get('session_id', 'default')
+            debug = debug_requested(data)
+            
+            # Stateless mode: the session travels in a signed token, nothing is kept server-side
+            token_state = None
+            if session_token.enabled(data):
+                token_state = session_token.decode(data.get('session_token')) or session_token.new_state()
+                session_id = None
+                # Token sessions are charged to the id signed into the token, so they share the quota rules
+                usage_id = session_token.usage_id(token_state)
+            else:
+                session_id = session_store.resolve_session_id(data.get('session_id'))
+                usage_id = session_id
             
             # Call the ask function from the specific Veda app
-            answer, relevant_verses, quiz_triggered = veda_app.ask(
-                query, topk=topk, is_intro=is_intro, session_id=session_id
-            )
+            if is_intro or faq_store.lookup(veda_name, veda_app.PROMPT_VERSION, query):
+                # The intro message and precomputed FAQ answers cost nothing upstream, so they stay on the fast lane
+                answer, relevant_verses, quiz_triggered = veda_app.ask(
+                    query, topk=topk, is_intro=is_intro, session_id=session_id, with_scores=True
+                )
+            else:
+                usage_ledger.check_quota(usage_id)
+                with admission.admit(veda_name), usage_ledger.attribute(usage_id):
+                    answer, relevant_verses, quiz_triggered = veda_app.ask(
+                        query, topk=topk, is_intro=is_intro, session_id=session_id, with_scores=True
+                    )
+            
+            if token_state is not None and not is_intro:
+                session_token.record_exchange(token_state, query, answer)
+                quiz_triggered = veda_app.should_trigger_quiz(None, state=token_state['quiz'])
+                if quiz_triggered:
+                    # The page asks for the quiz next; extract the topics now so they travel in the token
+                    # and the quiz request needs one upstream call less (the stateful path uses its TopicTracker)
+                    with admission.admit(veda_name), usage_ledger.attribute(usage_id):
+                        topics = veda_app.extract_topics_from_conversation(session_token.history(token_state))
+                    if topics:
+                        session_token.remember_topics(token_state, topics)
             
             # Format verse information
             verses_info = []
+            scores = []
             if relevant_verses:
-                for v in relevant_verses:
+                for v, score in relevant_verses:
                     if isinstance(v, dict):
+                        scores.append(score)
                         verses_info.append({
                             'mandala': v.get('mandala', ''),
                             'sukta': v.get('sukta', ''),
@@ -116,17 +276,29 @@ def create_api_routes(veda_name):
                             'text_sa': v.get('text_sa', '')
                         })
             
-            return jsonify({
+            response = {
                 'answer': answer,
                 'verses': verses_info,
                 'query': query,
                 'is_intro': is_intro,
-                'quiz_triggered': quiz_triggered,
-                'session_id': session_id
-            })
+                'quiz_triggered': quiz_triggered
+            }
+            if token_state is not None:
+                response['session_token'] = session_token.encode(token_state)
+            else:
+                response['session_id'] = session_id
+            if debug:
+                # Raw FAISS distances of the returned verses (None for precomputed FAQ answers)
+                response['scores'] = scores
+                response['timings'] = debug_timings()
+            return jsonify(response)
             
+        except admission.AdmissionRejected as e:
+            return too_busy_response(e)
+        except usage_ledger.QuotaExceeded as e:
+            return quota_exceeded_response(e)
         except Exception as e:
-            print(f"Error in {veda_name} API: {e}")
+            log.exception("Error in %s API: %s", veda_name, e)
             return jsonify({
                 'error': f'{veda_name.title()} tutor encountered an error.',
                 'details': str(e)
@@ -144,7 +316,9 @@ def create_api_routes(veda_name):
         
         try:
             data = request.json
-            session_id = data.get('session_id', 'default')
+            if session_token.enabled(data):
+                return generate_quiz_from_token(veda_name, veda_app, data)
+            session_id = session_store.resolve_session_id(data.get('session_id'))
             
             # Check if the veda app has the required functions
             if not hasattr(veda_app, 'conversations'):
@@ -153,11 +327,29 @@ def create_api_routes(veda_name):
             if session_id not in veda_app.conversations:
                 return jsonify({'error': 'No conversation history found'}), 400
             
-            topics = veda_app.extract_topics_from_conversation(veda_app.conversations[session_id])
-            if not topics:
-                return jsonify({'error': 'No topics found in conversation'}), 400
+            # Serve the quiz prepared ahead of time when there is one
+            prepared = veda_app.quiz_prefetcher.take(session_id)
+            if prepared:
+                metrics.cache_hit(veda_name, 'quiz_prefetch')
+                return jsonify({
+                    'quiz': prepared['quiz'],
+                    'topics': prepared['topics'],
+                    'session_id': session_id
+                })
+            
+            # Topics are normally already extracted in the background after each answer
+            topics = veda_app.topic_tracker.get(session_id)
+            if topics:
+                metrics.cache_hit(veda_name, 'topics')
             
-            quiz_data = veda_app.generate_mcq_quiz(topics, veda_app.conversations[session_id])
+            usage_ledger.check_quota(session_id)
+            with admission.admit(veda_name), usage_ledger.attribute(session_id):
+                if not topics:
+                    topics = veda_app.extract_topics_from_conversation(veda_app.conversations[session_id])
+                if not topics:
+                    return jsonify({'error': 'No topics found in conversation'}), 400
+                
+                quiz_data = veda_app.generate_mcq_quiz(topics, veda_app.conversations[session_id])
             if not quiz_data:
                 return jsonify({'error': 'Failed to generate quiz'}), 500
             
@@ -167,8 +359,12 @@ def create_api_routes(veda_name):
                 'session_id': session_id
             })
             
+        except admission.AdmissionRejected as e:
+            return too_busy_response(e)
+        except usage_ledger.QuotaExceeded as e:
+            return quota_exceeded_response(e)
         except Exception as e:
-            print(f"Error generating {veda_name} quiz: {e}")
+            log.exception("Error generating %s quiz: %s", veda_name, e)
             return jsonify({
                 'error': f'{veda_name.title()} quiz generation failed.',
                 'details': str(e)
@@ -179,7 +375,7 @@ def create_api_routes(veda_name):
         """API endpoint for submitting quiz"""
         try:
             data = request.json
-            session_id = data.get('session_id', 'default')
+            session_id = session_store.resolve_session_id(data.get('session_id'))
             answers = data.get('answers', {})
             quiz_questions = data.get('quiz_questions', [])
             
@@ -227,37 +423,86 @@ def create_api_routes(veda_name):
             })
             
         except Exception as e:
-            print(f"Error submitting {veda_name} quiz: {e}")
+            log.exception("Error submitting %s quiz: %s", veda_name, e)
             return jsonify({
                 'error': f'{veda_name.title()} quiz submission failed.',
                 'details': str(e)
             }), 500
 
 # Create API routes for all Vedas
-for veda in ['rigveda', 'samaveda', 'yajurveda', 'atharvaveda']:
+for veda in VEDAS:
     create_api_routes(veda)
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check for the main platform"""
+def build_health():
+    """Health payload; rebuilt at most every HEALTH_CACHE_SECONDS"""
     # Check which Vedas are available
     available_vedas = []
     unavailable_vedas = []
     
-    for veda in ['rigveda', 'samaveda', 'yajurveda', 'atharvaveda']:
-        app_module = load_veda_app(veda)
-        if app_module:
+    for veda in VEDAS:
+        if loader.available(veda):
             available_vedas.append(veda)
         else:
             unavailable_vedas.append(veda)
     
-    return jsonify({
+    return {
         'status': 'healthy',
         'platform': 'Vedic Wisdom Hub',
         'available_vedas': available_vedas,
         'unavailable_vedas': unavailable_vedas,
-        'total_vedas': 4
-    })
+        'total_vedas': 4,
+        'llm_admission': admission.stats(),
+        'sessions': session_store.stats(),
+        'loader': loader.status(),
+        'json_responses': json_responses.stats(),
+        'startup': startup_profile.report()
+    }
+
+health_payload = http_cache.CachedPayload(
+    build_health, version=lambda: loader.version, refresh_seconds=float(os.getenv('HEALTH_CACHE_SECONDS', 5))
+)
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check for the main platform"""
+    return http_cache.conditional_response(*health_payload.get())
+
+# READY_VEDAS names tutors a worker must have warm; unset, a worker is ready once its loaded tutors pass
+readiness_probe = readiness.ReadinessProbe(
+    loader, [v.strip() for v in os.getenv('READY_VEDAS', '').split(',') if v.strip() in VEDAS]
+)
+
+@app.route('/api/usage', methods=['GET'])
+def usage_report():
+    """OpenAI tokens and estimated cost by veda and call type, the costliest sessions and (?session_id=) one session"""
+    # Spend and session activity are operator data; without USAGE_TOKEN the endpoint does not exist
+    if not usage_ledger.USAGE_TOKEN:
+        abort(404)
+    if not usage_ledger.report_allowed(request.headers.get('X-Usage-Token') or request.args.get('token')):
+        abort(403)
+    session_id = request.args.get('session_id')
+    return jsonify(usage_ledger.report(session_id=session_id, top=request.args.get('top', 10, type=int)))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Per-stage latency histograms and cache, fallback, error and token counters of this worker (Prometheus text format)"""
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    response = jsonify({'status': 'alive'})
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: required tutors are loaded and pass the retrieval self-test within the SLO"""
+    result = readiness_probe.check()
+    response = jsonify(result)
+    response.status_code = 200 if result['ready'] else 503
+    response.cache_control.no_store = True
+    return response
 
 @app.route('/about')
 def about():
@@ -328,25 +573,38 @@ def about():
     </html>
     """
 
-@app.route('/api/veda-status')
-def veda_status():
-    """API endpoint to check status of all Vedas"""
+def build_veda_status():
+    """Status of all Vedas; rebuilt when a tutor's loading state changes or every STATUS_REFRESH_SECONDS"""
     status = {}
+    loading = loader.status()['vedas']
     
-    for veda in ['rigveda', 'samaveda', 'yajurveda', 'atharvaveda']:
-        app_module = load_veda_app(veda)
+    for veda in VEDAS:
+        app_available = loader.available(veda)
         template_exists = (
             os.path.exists(f'templates/{veda}/index.html') or 
             os.path.exists(f'templates/{veda}/enhanced_index.html')
         )
         
         status[veda] = {
-            'app_available': app_module is not None,
+            'app_available': app_available,
             'template_available': template_exists,
-            'fully_functional': app_module is not None and template_exists
+            'fully_functional': app_available and template_exists,
+            'state': loading[veda]['state']
         }
     
-    return jsonify(status)
+    return status
+
+veda_status_payload = http_cache.CachedPayload(
+    build_veda_status, version=lambda: loader.version, refresh_seconds=float(os.getenv('STATUS_REFRESH_SECONDS', 60))
+)
+
+@app.route('/api/veda-status')
+def veda_status():
+    """API endpoint to check status of all Vedas"""
+    # Landing pages poll this; browsers revalidate with If-None-Match and mostly get a 304
+    return http_cache.conditional_response(
+        *veda_status_payload.get(), max_age=int(os.getenv('STATUS_MAX_AGE', 10))
+    )
 
 if __name__ == '__main__':
     print("🕉️ Starting Vedic Wisdom Hub - All Vedas Platform...")
@@ -0,0 +1,25 @@
+import gc
+import os
+
+# Production entrypoint for a preforking WSGI server, from the servrside directory:
+#   gunicorn -c gunicorn.conf.py wsgi:application
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import startup_profile
+from vedas_main_app import app, preload_vedas
+
+application = app
+
+
+def preload():
+    """Load every tutor's index and verse store once, before the workers are forked"""
+    loaded = preload_vedas()
+    # Keep the loaded objects out of the collector so it does not touch (and copy) their pages in each worker
+    gc.freeze()
+    return loaded
+
+
+if os.getenv('WEB_PRELOAD', '1').lower() in ('1', 'true', 'yes'):
+    for veda, ok in preload().items():
+        print(f"{'✅' if ok else '❌'} {veda} preloaded")
+    startup_profile.print_report()
@@ -1,14 +1,26 @@
 from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
-import faiss
 import numpy as np
 import pickle
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
 import json
+import logging
+import time
 from datetime import datetime
 import uuid
+import background_tasks
+import quiz_bank
+import faq_store
+import http_cache
+import json_responses
+import metrics
+import prompt_budget
+import request_log
+import session_store
+import startup_profile
+
+log = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -16,17 +28,23 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+request_log.install(app)
+json_responses.install(app)
 
-# Initialize OpenAI client
-client = OpenAI()
+# OpenAI client, created by init()
+client = None
 
 # Global variables for loaded data
 index = None
 verses = None
 
-# In-memory conversation storage (in production, use a proper database)
-conversations = {}
-user_quiz_states = {}
+# Bounded session storage (message caps, idle TTL and LRU eviction under a memory budget),
+# optionally persisted (SESSION_BACKEND=sqlite) or shared between workers (SESSION_BACKEND=redis)
+conversations = session_store.create_store('yajurveda', 'conversations')
+user_quiz_states = session_store.create_store('yajurveda', 'quiz_states')
+
+# Bump when the tutor prompt changes so precomputed FAQ answers are rebuilt
+PROMPT_VERSION = "1"
 
 def load_data():
     """Load the FAISS index and verses metadata"""
@@ -43,30 +61,58 @@ def load_data():
         for index_path, meta_path in possible_paths:
             try:
                 if os.path.exists(index_path) and os.path.exists(meta_path):
-                    index = faiss.read_index(index_path)
-                    with open(meta_path, "rb") as f:
-                        verses = pickle.load(f)
-                    print(f"✅ Yajurveda index and metadata loaded successfully from {index_path}")
+                    with startup_profile.phase('imports faiss', 'yajurveda'):
+                        import faiss
+                    with startup_profile.phase('index read', 'yajurveda'):
+                        index = faiss.read_index(index_path)
+                    with startup_profile.phase('metadata load', 'yajurveda'):
+                        with open(meta_path, "rb") as f:
+                            verses = pickle.load(f)
+                        # Token counts normally come with the verse store (build_token_counts.py)
+                        prompt_budget.ensure_token_counts(verses)
+                    log.info("Yajurveda index and metadata loaded successfully from %s", index_path)
                     return True
             except Exception as e:
                 continue
         
-        print("⚠ Could not find database files in any expected location")
+        log.warning("Could not find database files in any expected location")
         return False
     except Exception as e:
-        print(f"⚠ Error loading data: {e}")
+        log.error("Error loading data: %s", e)
+        return False
+
+def init():
+    """Create the OpenAI client and load the index; nothing heavy happens at import time"""
+    global client
+    if client is None:
+        with startup_profile.phase('imports openai', 'yajurveda'):
+            from openai import OpenAI
+        with startup_profile.phase('client setup', 'yajurveda'):
+            client = OpenAI()
+    if index is None and not load_data():
+        log.warning("Could not load data files. App will run with limited functionality.")
         return False
+    return True
+
+def unload_data():
+    """Release the FAISS index and verses metadata (load_data() brings them back)"""
+    global index, verses
+    index = None
+    verses = None
 
 def embed(texts):
     """Create embeddings using OpenAI"""
     try:
-        response = client.embeddings.create(
-            model="text-embedding-3-large",
-            input=texts
-        )
+        with metrics.stage('yajurveda', 'embed'):
+            response = client.embeddings.create(
+                model="text-embedding-3-large",
+                input=texts
+            )
+        metrics.record_usage('yajurveda', 'embed', response)
         return np.array([d.embedding for d in response.data], dtype="float32")
     except Exception as e:
-        print(f"Error creating embeddings: {e}")
+        log.error("Error creating embeddings: %s", e)
+        metrics.fallback('yajurveda', 'embed')
         # Fallback with dummy embeddings for testing
         return np.random.rand(len(texts) if isinstance(texts, list) else 1, 3072).astype("float32")
 
@@ -75,10 +121,16 @@ def search(query, topk=5):
     if index is None or verses is None:
         raise Exception("Index not loaded")
     
+    # Hard cap, whatever the client asked for: prompt size (and latency) grows with every verse
+    topk = prompt_budget.cap_topk(topk)
     q = embed([query])
-    D, I = index.search(q, topk)
+    with metrics.stage('yajurveda', 'search'):
+        D, I = index.search(q, topk)
     return [(verses[i], float(D[0][j])) for j, i in enumerate(I[0])]
 
+# Prompt labels per message sender (older turns are folded into a 'summary' message)
+SPEAKERS = {'user': 'User', 'summary': 'Summary of earlier conversation'}
+
 def extract_topics_from_conversation(conversation_history):
     """Extract main topics discussed in the conversation using GPT"""
     if not conversation_history or len(conversation_history) < 2:
@@ -87,7 +139,7 @@ def extract_topics_from_conversation(conversation_history):
     # Get recent conversation for topic extraction
     recent_messages = conversation_history[-8:]  # Last 8 messages for better context
     context = "\n".join([
-        f"{'User' if msg['sender'] == 'user' else 'Tutor'}: {msg['text']}" 
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" 
         for msg in recent_messages
     ])
     
@@ -106,12 +158,14 @@ If no specific topics are clear, use: ritual procedures, sacred mantras, fire ce
 Topics discussed:"""
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": topic_extraction_prompt}],
-            max_tokens=100,
-            temperature=0.3
-        )
+        with metrics.stage('yajurveda', 'topic_extraction'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": topic_extraction_prompt}],
+                max_tokens=100,
+                temperature=0.3
+            )
+        metrics.record_usage('yajurveda', 'topics', response)
         
         topics_text = response.choices[0].message.content.strip()
         topics = [topic.strip() for topic in topics_text.split(',') if topic.strip()]
@@ -123,14 +177,64 @@ Topics discussed:"""
         return topics[:5]  # Max 5 topics
         
     except Exception as e:
-        print(f"Error extracting topics: {e}")
+        log.error("Error extracting topics: %s", e)
+        metrics.fallback('yajurveda', 'topic_extraction')
         return ["ritual procedures", "sacred mantras", "fire ceremonies"]  # Return default topics on error
 
-def generate_mcq_quiz(topics, conversation_context):
+# Hand-written quiz used when generation fails (also seeds the offline quiz bank)
+FALLBACK_QUIZ = {
+    "questions": [
+        {
+            "question": "What is the primary focus of Yajurveda?",
+            "options": {
+                "A": "Philosophical discussions",
+                "B": "Ritual procedures and sacrificial ceremonies",
+                "C": "Historical narratives",
+                "D": "Poetic compositions"
+            },
+            "correct_answer": "B",
+            "explanation": "Yajurveda primarily contains mantras and procedures for conducting sacrificial rituals and ceremonies."
+        },
+        {
+            "question": "What does 'yajna' refer to in Yajurveda?",
+            "options": {
+                "A": "Sacred texts",
+                "B": "Fire sacrifice or ritual offering",
+                "C": "Temple architecture",
+                "D": "Meditation practice"
+            },
+            "correct_answer": "B",
+            "explanation": "Yajna refers to fire sacrifices or ritual offerings, which are central to Yajurvedic practices."
+        },
+        {
+            "question": "Who typically performed Yajurvedic rituals?",
+            "options": {
+                "A": "Common people",
+                "B": "Kings only",
+                "C": "Trained priests",
+                "D": "Merchants"
+            },
+            "correct_answer": "C",
+            "explanation": "Yajurvedic rituals were typically performed by trained priests who knew the precise procedures and mantras."
+        }
+    ]
+}
+
+# Topics are kept fresh per session in the background after each answer
+topic_tracker = background_tasks.TopicTracker('yajurveda', extract_topics_from_conversation)
+
+def generate_mcq_quiz(topics, conversation_context, use_bank=True):
     """Generate MCQ quiz based on discussed topics"""
     if not topics:
         topics = ["ritual procedures", "sacred mantras", "fire ceremonies"]
     
+    # Serve from the precomputed question bank when it covers these topics
+    if use_bank:
+        bank_quiz = quiz_bank.sample('yajurveda', topics)
+        if bank_quiz:
+            metrics.cache_hit('yajurveda', 'quiz_bank')
+            return bank_quiz
+    
     topics_str = ", ".join(topics)
     
     quiz_prompt = f"""
@@ -190,12 +294,14 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
 """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": quiz_prompt}],
-            temperature=0.7,
-            max_tokens=1200
-        )
+        with metrics.stage('yajurveda', 'quiz_generation'):
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": quiz_prompt}],
+                temperature=0.7,
+                max_tokens=1200
+            )
+        metrics.record_usage('yajurveda', 'quiz', response)
         
         quiz_text = response.choices[0].message.content.strip()
         
@@ -223,98 +329,76 @@ Keep questions clear and educational. Avoid overly complex Sanskrit terms withou
         return quiz_data
         
     except Exception as e:
-        print(f"Error generating quiz: {e}")
+        log.error("Error generating quiz: %s", e)
+        metrics.fallback('yajurveda', 'quiz_generation')
         # Return a fallback quiz
-        return {
-            "questions": [
-                {
-                    "question": "What is the primary focus of Yajurveda?",
-                    "options": {
-                        "A": "Philosophical discussions",
-                        "B": "Ritual procedures and sacrificial ceremonies",
-                        "C": "Historical narratives",
-                        "D": "Poetic compositions"
-                    },
-                    "correct_answer": "B",
-                    "explanation": "Yajurveda primarily contains mantras and procedures for conducting sacrificial rituals and ceremonies."
-                },
-                {
-                    "question": "What does 'yajna' refer to in Yajurveda?",
-                    "options": {
-                        "A": "Sacred texts",
-                        "B": "Fire sacrifice or ritual offering",
-                        "C": "Temple architecture",
-                        "D": "Meditation practice"
-                    },
-                    "correct_answer": "B",
-                    "explanation": "Yajna refers to fire sacrifices or ritual offerings, which are central to Yajurvedic practices."
-                },
-                {
-                    "question": "Who typically performed Yajurvedic rituals?",
-                    "options": {
-                        "A": "Common people",
-                        "B": "Kings only",
-                        "C": "Trained priests",
-                        "D": "Merchants"
-                    },
-                    "correct_answer": "C",
-                    "explanation": "Yajurvedic rituals were typically performed by trained priests who knew the precise procedures and mantras."
-                }
-            ]
-        }
+        return FALLBACK_QUIZ
 
-def should_trigger_quiz(session_id):
-    """Check if quiz should be triggered based on conversation count"""
-    if session_id not in user_quiz_states:
-        user_quiz_states[session_id] = {
-            'message_count': 0,
-            'last_quiz_at': 0,
-            'quiz_frequency': 3  # Every 3 meaningful exchanges (matching Rigveda)
-        }
-    
-    state = user_quiz_states[session_id]
-    state['message_count'] += 1
-    
-    # Trigger quiz every 3 meaningful exchanges
-    if state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']:
-        state['last_quiz_at'] = state['message_count']
-        return True
-    
-    return False
+# The next quiz is prepared in the background one exchange before it is due
+quiz_prefetcher = background_tasks.QuizPrefetcher(topic_tracker.veda, topic_tracker, generate_mcq_quiz)
 
-def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None):
-    """Get answer using RAG with conversation tracking"""
-    
-    if is_intro:
-        # Special introduction message for Yajurveda
-        intro_response = """
-🔥 **Namaste and welcome, dear seeker of ritual wisdom!** 🔥
+def forget_session(session_id):
+    """Drop background state of a session evicted from the conversation store"""
+    topic_tracker.forget(session_id)
+    quiz_prefetcher.forget(session_id)
 
-I am your passionate Yajurveda tutor, and I'm absolutely thrilled that you've chosen to explore the most practical and ritualistic of all Vedas! The Yajurveda is like a comprehensive manual for sacred ceremonies, containing the precise procedures, mantras, and instructions that ancient priests used to conduct powerful fire sacrifices and religious rituals.
+conversations.on_evict = forget_session
 
-Think of me as your knowledgeable guide who will help you understand these sacred procedures, ritual significance, and ceremonial practices - whether you're interested in ancient traditions, spiritual practices, or religious studies!
+def summarize_conversation(previous_summary, messages):
+    """Fold older messages into the rolling summary of a long conversation"""
+    transcript = "\n".join(
+        f"{SPEAKERS.get(msg['sender'], 'Tutor')}: {msg['text']}" for msg in messages
+    )
+    
+    summary_prompt = f"""
+Update the running summary of this Yajurveda tutoring conversation.
 
-**What ritual journey shall we begin today?** Here are some fascinating topics we could explore:
+Summary so far:
+{previous_summary or "(none)"}
 
-🔥 **Fire Sacrifices** - Learn about yajna ceremonies and their spiritual significance
-📜 **Ritual Procedures** - Discover the precise steps in Vedic ceremonies  
-🛕 **Altar Construction** - Understand the sacred geometry of ritual spaces
-🕉️ **Sacred Mantras** - Explore the powerful chants used in rituals
-👨‍🔬 **Priestly Duties** - Meet the different types of ritual specialists
-🥄 **Offerings & Implements** - Learn about ceremonial tools and substances
-⚡ **Different Yajnas** - Discover various types of fire ceremonies
-🌟 **Ritual Symbolism** - Understand the deeper meanings behind ceremonies
+New messages:
+{transcript}
 
-Just click on any topic above, or ask me anything that sparks your curiosity about Vedic rituals! I love questions like "How were fire altars built?" or "What makes Yajurveda different from other Vedas?" - no question is too simple or too complex!
+Write the updated summary in at most 120 words. Keep the topics, deities, concepts and verses discussed and any questions the student still has.
 
-**What sacred ceremony shall we discover together today?** 🌟
-"""
-        return intro_response, [], False
+Updated summary:"""
     
-    # Initialize conversation tracking
-    if session_id and session_id not in conversations:
-        conversations[session_id] = []
+    with metrics.stage('yajurveda', 'summary'):
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": summary_prompt}],
+            max_tokens=220,
+            temperature=0.2
+        )
+    metrics.record_usage('yajurveda', 'summary', response)
+    return response.choices[0].message.content.strip()
+
+# Long conversations keep a constant size: older turns are summarized in the background
+conversation_summarizer = background_tasks.ConversationSummarizer('yajurveda', conversations, summarize_conversation)
+
+def should_trigger_quiz(session_id, state=None):
+    """Check if quiz should be triggered based on conversation count (or on `state` carried by a session token)"""
+    def advance(state):
+        state['message_count'] += 1
+        
+        # Trigger quiz every 3 meaningful exchanges
+        triggered = state['message_count'] - state['last_quiz_at'] >= state['quiz_frequency']
+        if triggered:
+            state['last_quiz_at'] = state['message_count']
+        return state, triggered
+    
+    if state is not None:
+        return advance(state)[1]
     
+    # Atomic read-modify-write, so concurrent requests of one session cannot lose a count
+    return user_quiz_states.update(session_id, advance, default=lambda: {
+        'message_count': 0,
+        'last_quiz_at': 0,
+        'quiz_frequency': 3  # Every 3 meaningful exchanges (matching Rigveda)
+    })
+
+def rag_answer(query, topk=5, model="gpt-4o-mini"):
+    """Retrieve relevant verses and generate the tutor's answer"""
     # Handle case when database is not loaded
     if index is None or verses is None:
         # Provide a general response without database search
@@ -324,16 +408,20 @@ Just click on any topic above, or ask me anything that sparks your curiosity abo
         # 1. Retrieve relevant verses
         try:
             results = search(query, topk=topk)
-            # 2. Create context
+            # 2. Create context, best verses first within the prompt token budget
+            fitted = prompt_budget.fit(results)
+            results = [(r, score) for r, score, _ in fitted]
             context = "\n".join([
-                f"YV {r.get('chapter', '?')}.{r.get('verse', '?')}: {r.get('text_sa', r.get('text', ''))}"
-                for r, _ in results
+                f"YV {r.get('chapter', '?')}.{r.get('verse', '?')}: {text}"
+                for r, _, text in fitted
             ])
         except Exception as e:
-            print(f"Search error: {e}")
+            log.error("Search error: %s", e)
+            metrics.fallback('yajurveda', 'search')
             results = []
             context = "General Yajurveda knowledge (database search unavailable)"
     
+    prompt_started = time.perf_counter()
     # 3. Create engaging tutor prompt for Yajurveda
     prompt = f"""
 You are a passionate and enthusiastic Yajurveda tutor who absolutely loves teaching about sacred rituals and ceremonial practices. Your goal is to make Yajurvedic knowledge accessible and exciting for everyone - from spiritual seekers to students of ancient traditions.
@@ -367,15 +455,20 @@ Relevant Context:
 Provide your enthusiastic, knowledgeable response:
 """
     
+    metrics.observe('yajurveda', 'prompt_build', time.perf_counter() - prompt_started)
+    
     # 4. Get response from OpenAI
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
+        with metrics.stage('yajurveda', 'completion'):
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}]
+            )
+        metrics.record_usage('yajurveda', 'answer', response)
         answer = response.choices[0].message.content
     except Exception as e:
-        print(f"OpenAI API error: {e}")
+        log.error("OpenAI API error: %s", e)
+        metrics.fallback('yajurveda', 'completion')
         # Fallback response
         answer = f"""
 I understand you're asking about "{query}" in relation to Yajurveda! While I'm experiencing some technical difficulties accessing my full knowledge base, I can share that Yajurveda is fundamentally about ritual procedures and sacred ceremonies.
@@ -388,30 +481,83 @@ The Yajurveda contains detailed instructions for conducting fire sacrifices (yaj
 • What role did priests play?
 """
     
+    return answer, results
+
+def ask(query, topk=5, model="gpt-4o-mini", is_intro=False, session_id=None, with_scores=False):
+    """Get answer using RAG with conversation tracking (verses as (verse, FAISS distance) pairs if with_scores)"""
+    
+    if is_intro:
+        # Special introduction message for Yajurveda
+        intro_response = """
+🔥 **Namaste and welcome, dear seeker of ritual wisdom!** 🔥
+
+I am your passionate Yajurveda tutor, and I'm absolutely thrilled that you've chosen to explore the most practical and ritualistic of all Vedas! The Yajurveda is like a comprehensive manual for sacred ceremonies, containing the precise procedures, mantras, and instructions that ancient priests used to conduct powerful fire sacrifices and religious rituals.
+
+Think of me as your knowledgeable guide who will help you understand these sacred procedures, ritual significance, and ceremonial practices - whether you're interested in ancient traditions, spiritual practices, or religious studies!
+
+**What ritual journey shall we begin today?** Here are some fascinating topics we could explore:
+
+🔥 **Fire Sacrifices** - Learn about yajna ceremonies and their spiritual significance
+📜 **Ritual Procedures** - Discover the precise steps in Vedic ceremonies  
+🛕 **Altar Construction** - Understand the sacred geometry of ritual spaces
+🕉️ **Sacred Mantras** - Explore the powerful chants used in rituals
+👨‍🔬 **Priestly Duties** - Meet the different types of ritual specialists
+🥄 **Offerings & Implements** - Learn about ceremonial tools and substances
+⚡ **Different Yajnas** - Discover various types of fire ceremonies
+🌟 **Ritual Symbolism** - Understand the deeper meanings behind ceremonies
+
+Just click on any topic above, or ask me anything that sparks your curiosity about Vedic rituals! I love questions like "How were fire altars built?" or "What makes Yajurveda different from other Vedas?" - no question is too simple or too complex!
+
+**What sacred ceremony shall we discover together today?** 🌟
+"""
+        return intro_response, [], False
+    
+    # Initialize conversation tracking
+    if session_id and session_id not in conversations:
+        conversations[session_id] = []
+    
+    # Canonical intro/FAQ questions are answered from the offline-built store
+    cached = faq_store.lookup('yajurveda', PROMPT_VERSION, query)
+    if cached:
+        metrics.cache_hit('yajurveda', 'faq')
+        answer, results = cached['answer'], [(v, None) for v in cached['verses']]
+    else:
+        answer, results = rag_answer(query, topk=topk, model=model)
+    
     # 5. Track conversation and check for quiz trigger
     quiz_triggered = False
     if session_id:
         # Add to conversation history
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'user',
-            'text': query
-        })
-        conversations[session_id].append({
-            'timestamp': datetime.now().isoformat(),
-            'sender': 'bot',
-            'text': answer
-        })
+        conversations.extend(session_id, [
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'user',
+                'text': query
+            },
+            {
+                'timestamp': datetime.now().isoformat(),
+                'sender': 'bot',
+                'text': answer
+            }
+        ])
+        
+        # Refresh the session's topics and fold older turns off the request path
+        history = conversations[session_id]
+        topic_tracker.refresh(session_id, history)
+        conversation_summarizer.maybe_fold(session_id, history)
         
         # Check if quiz should be triggered
         quiz_triggered = should_trigger_quiz(session_id)
+        
+        # Start preparing the quiz when the session is one exchange away from it
+        state = user_quiz_states[session_id]
+        if state['message_count'] - state['last_quiz_at'] == state['quiz_frequency'] - 1:
+            quiz_prefetcher.start(session_id, history)
+        else:
+            quiz_prefetcher.touch(session_id)
     
     # Return results (handle case when results might not exist)
-    return answer, [r for r, _ in results], quiz_triggered
-
-# Load data when the app starts
-if not load_data():
-    print("Warning: Could not load data files. App will run with limited functionality.")
+    return answer, (results if with_scores else [r for r, _ in results]), quiz_triggered
 
 @app.route('/')
 def home():
@@ -426,14 +572,10 @@ def home():
             'index.html'
         ]
         
-        for html_path in possible_html_paths:
-            try:
-                if os.path.exists(html_path):
-                    with open(html_path, 'r', encoding='utf-8') as f:
-                        print(f"✅ Serving HTML from: {html_path}")
-                        return f.read()
-            except Exception as e:
-                continue
+        # Kept in memory precompressed; missing locations are only looked up again every few seconds
+        page = http_cache.cached_page(*possible_html_paths)
+        if page:
+            return http_cache.file_response(page)
                 
         raise FileNotFoundError("HTML file not found in any expected location")
         
@@ -472,9 +614,9 @@ def api_ask():
         query = data.get('query', '').strip()
         topk = data.get('topk', 5)
         is_intro = data.get('is_intro', False)
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
-        print(f"✅ Received request - Query: '{query}', Intro: {is_intro}, Session: {session_id}")
+        log.debug("Received request - Query: '%s', Intro: %s, Session: %s", query, is_intro, session_id)
         
         if not query and not is_intro:
             return jsonify({'error': 'Query is required'}), 400
@@ -502,30 +644,28 @@ def api_ask():
         })
         
     except Exception as e:
-        print(f"❌ Error in API: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in API: %s", e)
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/api/yajurveda/generate-quiz', methods=['POST'])
 def api_generate_quiz():
     """API endpoint for generating quiz - Fixed to match Rigveda pattern"""
     try:
-        print("✅ Generate quiz endpoint called")
+        log.debug("Generate quiz endpoint called")
         
         # Validate request
         if not request.json:
             return jsonify({'error': 'No JSON data provided'}), 400
         
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         
-        print(f"🎯 Generating quiz for session: {session_id}")
-        print(f"📊 Available sessions: {list(conversations.keys())}")
+        log.debug("Generating quiz for session: %s", session_id)
+        log.debug("Sessions in memory: %s", len(conversations))
         
         # Check if session exists, if not create default
         if session_id not in conversations:
-            print("⚠ Creating default conversation for quiz")
+            log.debug("Creating default conversation for quiz")
             conversations[session_id] = [
                 {
                     'timestamp': datetime.now().isoformat(),
@@ -540,23 +680,33 @@ def api_generate_quiz():
             ]
         
         conversation_history = conversations[session_id]
-        print(f"💬 Conversation length: {len(conversation_history)}")
+        log.debug("Conversation length: %s", len(conversation_history))
+        
+        # Serve the quiz prepared ahead of time when there is one
+        prepared = quiz_prefetcher.take(session_id)
+        if prepared:
+            log.debug("Serving pre-generated quiz")
+            return jsonify({
+                'quiz': prepared['quiz'],
+                'topics': prepared['topics'],
+                'session_id': session_id
+            })
         
-        # Extract topics from conversation
-        topics = extract_topics_from_conversation(conversation_history)
-        print(f"🏷️ Extracted topics: {topics}")
+        # Use the topics extracted in the background, extracting now only if there are none yet
+        topics = topic_tracker.get(session_id) or extract_topics_from_conversation(conversation_history)
+        log.debug("Extracted topics: %s", topics)
         
         if not topics:
             topics = ["ritual procedures", "sacred mantras", "fire ceremonies"]
         
         # Generate quiz
-        print("🔥 Generating quiz...")
+        log.debug("Generating quiz...")
         quiz_data = generate_mcq_quiz(topics, conversation_history)
         
         if not quiz_data:
             return jsonify({'error': 'Failed to generate quiz'}), 500
         
-        print(f"🎉 Quiz successfully created with {len(quiz_data.get('questions', []))} questions")
+        log.debug("Quiz successfully created with %s questions", len(quiz_data.get('questions', [])))
         
         return jsonify({
             'quiz': quiz_data,
@@ -565,23 +715,21 @@ def api_generate_quiz():
         })
         
     except Exception as e:
-        print(f"💥 Error generating quiz: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error generating quiz: %s", e)
         return jsonify({'error': f'Failed to generate quiz: {str(e)}'}), 500
 
 @app.route('/api/yajurveda/submit-quiz', methods=['POST'])
 def api_submit_quiz():
     """API endpoint for submitting quiz answers - Fixed to match Rigveda pattern"""
     try:
-        print("✅ Submit quiz endpoint called")
+        log.debug("Submit quiz endpoint called")
         
         # Validate request has JSON data
         if not request.json:
             return jsonify({'error': 'No JSON data provided'}), 400
         
         data = request.json
-        session_id = data.get('session_id', 'default')
+        session_id = session_store.resolve_session_id(data.get('session_id'))
         answers = data.get('answers', {})
         quiz_questions = data.get('quiz_questions', [])
         
@@ -595,9 +743,9 @@ def api_submit_quiz():
         if not isinstance(answers, dict):
             return jsonify({'error': 'Answers must be a dictionary'}), 400
         
-        print(f"📝 Processing quiz submission for session: {session_id}")
-        print(f"❓ Number of questions: {len(quiz_questions)}")
-        print(f"✏️ Number of answers: {len(answers)}")
+        log.debug("Processing quiz submission for session: %s", session_id)
+        log.debug("Number of questions: %s", len(quiz_questions))
+        log.debug("Number of answers: %s", len(answers))
         
         # Calculate score
         correct_count = 0
@@ -641,7 +789,7 @@ def api_submit_quiz():
         else:
             feedback = "🕉️ Every ritual expert begins as a student! Let's continue our ceremonial journey together!"
         
-        print(f"🏆 Quiz completed: {correct_count}/{total_questions} ({score_percentage:.1f}%)")
+        log.debug("Quiz completed: %s/%s (%.1f%%)", correct_count, total_questions, score_percentage)
         
         return jsonify({
             'score': correct_count,
@@ -653,9 +801,7 @@ def api_submit_quiz():
         })
         
     except Exception as e:
-        print(f"❌ Error submitting quiz: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error submitting quiz: %s", e)
         return jsonify({'error': f'Failed to submit quiz: {str(e)}'}), 500
 
 @app.route('/api/health', methods=['GET'])
@@ -676,15 +822,11 @@ def health_check():
             'GET /api/health'
         ]
     }
-    print(f"🩺 Health check: {status['status']}")
+    log.debug("Health check: %s", status['status'])
     return jsonify(status)
 
-# Route debugging function
-@app.before_request
-def log_request_info():
-    print(f"🌐 {request.method} {request.path}")
-
 if __name__ == '__main__':
+    init()
     print("🚀 Starting Enhanced Yajurveda Chatbot Server with Quiz Feature...")
     print("🔥 Make sure your database files are in ./database/ directory")
     print("🌐 Frontend will be available at http://localhost:5000")